@@ -0,0 +1,134 @@
+"""
+Benchmark suite of the pyperator runtime. Benchmarks are registered with
+the :func:`benchmark` decorator in the modules listed in :data:`MODULES`;
+each returns a single number, for example packets per second. The suite is
+run and compared from the command line:
+
+.. code-block:: bash
+
+    python -m benchmarks run -o baseline.json
+    python -m benchmarks run -k chain -o current.json
+    python -m benchmarks compare baseline.json current.json --threshold 0.1
+
+`compare` exits with status 1 if any benchmark got worse by more than the threshold.
+Each module can also be run on its own, e.g. :code:`python -m benchmarks.fanin`.
+"""
+import collections as _coll
+import fnmatch as _fnmatch
+import importlib as _importlib
+import json as _json
+import platform as _platform
+import sys as _sys
+import time as _time
+
+# Modules registering benchmarks, in the order they are run
+MODULES = ['benchmarks.runtime', 'benchmarks.fanin', 'benchmarks.file_operator',
+           'benchmarks.packet_memory', 'benchmarks.zero_copy', 'benchmarks.logging_overhead',
+           'benchmarks.gui_overhead', 'benchmarks.shared_memory', 'benchmarks.process_executor']
+
+_registry = _coll.OrderedDict()
+
+
+class Benchmark(object):
+    """
+    A registered benchmark: `function` is called with `param`, if
+    given, and returns a value measured in `unit`.
+    """
+
+    def __init__(self, name, function, param=None, unit='s', higher_is_better=False):
+        self.name = name
+        self.function = function
+        self.param = param
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+
+    def __call__(self):
+        if self.param is None:
+            return self.function()
+        return self.function(self.param)
+
+    def best(self, values):
+        return max(values) if self.higher_is_better else min(values)
+
+
+def benchmark(name, params=None, unit='s', higher_is_better=False):
+    """
+    Registers the decorated function as the benchmark `name`, or
+    as one benchmark :code:`name[param]` for each of `params`.
+    """
+    def register(function):
+        for param in params or [None]:
+            full_name = name if param is None else '{}[{}]'.format(name, param)
+            _registry[full_name] = Benchmark(full_name, function, param, unit, higher_is_better)
+        return function
+
+    return register
+
+
+def collect(pattern='*'):
+    """
+    Imports the benchmark modules and returns the benchmarks
+    whose name matches the shell-style `pattern`. Modules whose
+    dependencies are not installed are skipped.
+    """
+    for module in MODULES:
+        try:
+            _importlib.import_module(module)
+        except ImportError as e:
+            print('Skipping {}: {}'.format(module, e), file=_sys.stderr)
+    if not any(char in pattern for char in '*?['):
+        pattern = '*{}*'.format(pattern)
+    return [bench for name, bench in _registry.items() if _fnmatch.fnmatchcase(name, pattern)]
+
+
+def run(benchmarks, repeat=3, out=_sys.stdout):
+    """
+    Runs each benchmark `repeat` times and returns
+    the results, keeping the best value of each.
+    """
+    results = _coll.OrderedDict()
+    for bench in benchmarks:
+        values = [bench() for i in range(repeat)]
+        results[bench.name] = {'value': bench.best(values), 'values': values, 'unit': bench.unit,
+                               'higher_is_better': bench.higher_is_better}
+        if out is not None:
+            print('{:<40} {:>14.6g} {}'.format(bench.name, results[bench.name]['value'], bench.unit), file=out)
+    return {'python': _platform.python_version(), 'platform': _platform.platform(),
+            'time': _time.time(), 'results': results}
+
+
+def run_module(module, repeat=1):
+    """
+    Runs the benchmarks registered by `module`, used
+    when a benchmark module is run on its own.
+    """
+    return run([bench for bench in collect() if bench.function.__module__ == module], repeat=repeat)
+
+
+def save(results, path):
+    with open(path, 'w') as results_file:
+        _json.dump(results, results_file, indent=2)
+
+
+def load(path):
+    with open(path) as results_file:
+        return _json.load(results_file)
+
+
+def compare(baseline, current, threshold=0.05):
+    """
+    Compares two results of :func:`run` and returns, for each benchmark
+    present in both, the relative change and whether it is a regression,
+    i.e. it got worse by more than `threshold`.
+
+    :return: list of (name, baseline value, current value, change, regression)
+    """
+    rows = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before, after = baseline['results'][name]['value'], result['value']
+        change = (after - before) / before if before else 0.0
+        worse = -change if result['higher_is_better'] else change
+        rows.append((name, before, after, change, worse > threshold))
+    return rows
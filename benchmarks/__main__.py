@@ -0,0 +1,46 @@
+"""
+Command line of the benchmark suite, see :mod:`benchmarks`.
+"""
+import argparse
+import sys
+
+import benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='pyperator benchmark suite')
+    commands = parser.add_subparsers(dest='command')
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-k', dest='pattern', default='*',
+                            help='run the benchmarks whose name matches this pattern')
+    run_parser.add_argument('-r', '--repeat', type=int, default=3, help='runs of each benchmark')
+    run_parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    commands.add_parser('list', help='list the benchmarks')
+    compare_parser = commands.add_parser('compare', help='compare two JSON results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.05,
+                                help='relative change counted as a regression')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = benchmarks.run(benchmarks.collect(args.pattern), repeat=args.repeat)
+        if args.output:
+            benchmarks.save(results, args.output)
+    elif args.command == 'list':
+        for bench in benchmarks.collect():
+            print(bench.name)
+    elif args.command == 'compare':
+        rows = benchmarks.compare(benchmarks.load(args.baseline), benchmarks.load(args.current), args.threshold)
+        for name, before, after, change, regression in rows:
+            print('{:<40} {:>14.6g} {:>14.6g} {:>+8.1%}{}'.format(
+                name, before, after, change, '  REGRESSION' if regression else ''))
+        if any(row[-1] for row in rows):
+            return 1
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the receive path of an input port
+fed by an increasing number of upstream connections.
+Run it as :code:`python -m benchmarks.fanin`.
+"""
+import asyncio
+import logging
+import time
+
+from benchmarks import benchmark
+from pyperator.DAG import Multigraph
+from pyperator.nodes import Component
+from pyperator.utils import InputPort, OutputPort
+from pyperator.IP import InformationPacket
+
+
+def build_fanin(n_upstream):
+    graph = Multigraph('fanin_{}'.format(n_upstream), log_level=logging.CRITICAL)
+    sink = Component('sink')
+    sink.inputs.add(InputPort('IN'))
+    graph.add_node(sink)
+    sources = []
+    for i in range(n_upstream):
+        source = Component('source_{}'.format(i))
+        source.outputs.add(OutputPort('OUT'))
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+        sources.append(source)
+    return sources, sink
+
+
+@benchmark('fanin', params=[1, 4, 16, 64], unit='packets/s', higher_is_better=True)
+def run_fanin(n_upstream, n_packets=20000):
+    """
+    Sends `n_packets` packets, evenly divided among `n_upstream`
+    sources, to a single input port and returns the
+    received packets per second.
+    """
+    sources, sink = build_fanin(n_upstream)
+    per_source = n_packets // n_upstream
+
+    async def produce(source):
+        for i in range(per_source):
+            await source.outputs.OUT.send_packet(InformationPacket(i))
+
+    async def consume():
+        for i in range(per_source * n_upstream):
+            await sink.inputs.IN.receive_packet()
+
+    async def run():
+        producers = [asyncio.ensure_future(produce(source)) for source in sources]
+        await consume()
+        await asyncio.gather(*producers)
+
+    loop = asyncio.new_event_loop()
+    try:
+        start = time.perf_counter()
+        loop.run_until_complete(run())
+        elapsed = time.perf_counter() - start
+    finally:
+        loop.close()
+    return per_source * n_upstream / elapsed
+
+
+def main():
+    for n_upstream in (1, 4, 16, 64):
+        rate = run_fanin(n_upstream)
+        print("{:>3} upstream connections: {:>10.0f} packets/s".format(n_upstream, rate))
+
+
+if __name__ == '__main__':
+    main()
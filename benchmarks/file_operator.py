@@ -0,0 +1,119 @@
+"""
+Benchmarks of the up-to-date checking of :class:`pyperator.shell.FileOperator`:
+100 000 input files are sent to a component whose outputs all exist and
+are newer than the inputs, so that nothing is run and the time is spent
+checking the files, and the checks of :func:`pyperator.shell.list_missing` and
+:func:`pyperator.shell.list_modified` are timed on their own with a
+:class:`pyperator.shell.StatCache`. Run them as :code:`python -m benchmarks.file_operator`.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks import benchmark
+from pyperator.DAG import Multigraph
+from pyperator.IP import InformationPacket
+from pyperator.decorators import component, outport
+from pyperator.shell import FileOperator, PacketRegister, StatCache, list_missing, list_modified
+from pyperator.utils import InputPort, OutputPort
+
+_graphs = itertools.count()
+
+
+@outport('OUT')
+@component
+async def Paths(self):
+    async with self.outputs.OUT:
+        for path in self.paths:
+            await self.outputs.OUT.send(path)
+
+
+class Touch(FileOperator):
+    """
+    Creates the output file `{input}.out` of each
+    input file, which is never needed here.
+    """
+
+    def __init__(self, name, **kwargs):
+        super(Touch, self).__init__(name, **kwargs)
+        self.inputs.add(InputPort('IN'))
+        self.outputs.add(OutputPort('OUT'))
+        self.DynamicFormatter('OUT', '{inputs.IN}.out')
+
+    async def produce_outputs(self, input_packets, output_packets, wildcards):
+        open(str(output_packets.OUT), 'w').close()
+
+
+def make_files(directory, n_files):
+    inputs = []
+    for i in range(n_files):
+        path = os.path.join(directory, 'file_{}'.format(i))
+        open(path, 'w').close()
+        inputs.append(path)
+    # The outputs are newer than the inputs
+    for path in inputs:
+        open(path + '.out', 'w').close()
+    return inputs
+
+
+@benchmark('file_operator', params=[100000], unit='files/s', higher_is_better=True)
+def check_files(n_files, check_older=True):
+    """
+    Returns the number of input files per second that a
+    :class:`pyperator.shell.FileOperator` finds up to date.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = make_files(directory, n_files)
+        graph = Multigraph('files_{}'.format(next(_graphs)), log_level=logging.CRITICAL,
+                           workdir=directory + os.sep)
+        source = Paths('files')
+        source.paths = inputs
+        touch = Touch('touch', check_older=check_older)
+        graph.connect(source.outputs.OUT, touch.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        start = time.perf_counter()
+        graph()
+        elapsed = time.perf_counter() - start
+        asyncio.get_event_loop().close()
+        touched = sum(1 for name in os.listdir(directory) if name.endswith('.out'))
+        assert touched == n_files, 'The command was run on up-to-date files'
+    return n_files / elapsed
+
+
+@benchmark('up_to_date', params=[100000], unit='s')
+def up_to_date(n_sets, n_shared=4, stats=True):
+    """
+    Seconds needed to check that the output of `n_sets` sets of input
+    packets are up to date, each set made of its own input file and of
+    `n_shared` files shared by all the sets, such as a reference genome.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        workdir = directory + os.sep
+        shared = [os.path.join(directory, 'shared_{}'.format(i)) for i in range(n_shared)]
+        for path in shared:
+            open(path, 'w').close()
+        inputs = make_files(directory, n_sets)
+        packet_sets = []
+        for path in inputs:
+            in_packets = {'IN': InformationPacket(path)}
+            in_packets.update({'REF_{}'.format(i): InformationPacket(ref) for i, ref in enumerate(shared)})
+            out_packets = {'OUT': InformationPacket(path + '.out')}
+            packet_sets.append((PacketRegister(in_packets), PacketRegister(out_packets)))
+        start = time.perf_counter()
+        cache = StatCache() if stats else None
+        for in_packets, out_packets in packet_sets:
+            assert not list_missing(out_packets, workdir, cache)
+            assert not list_modified(out_packets, in_packets, cache)[1]
+        return time.perf_counter() - start
+
+
+def main():
+    import benchmarks
+    benchmarks.run_module('benchmarks.file_operator')
+
+
+if __name__ == '__main__':
+    main()
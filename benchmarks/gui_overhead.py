@@ -0,0 +1,116 @@
+"""
+Benchmark of the cost of the live GUI: packets flow through a chain
+of components without the GUI, then with the GUI attached and a client
+connected to its WebSocket receiving updates.
+Run it as :code:`python -m benchmarks.gui_overhead`.
+"""
+import asyncio
+import itertools
+import logging
+import socket
+import time
+
+import aiohttp
+
+from benchmarks import benchmark
+from pyperator.DAG import Multigraph
+from pyperator.gui import GUI
+from pyperator.nodes import Component
+from pyperator.utils import InputPort, OutputPort
+from pyperator.IP import InformationPacket
+
+_runs = itertools.count()
+
+
+class Relay(Component):
+
+    def __init__(self, name):
+        super(Relay, self).__init__(name)
+        self.inputs.add(InputPort('IN'))
+        self.outputs.add(OutputPort('OUT'))
+
+    async def __call__(self):
+        async with self.outputs.OUT:
+            async for packet in self.inputs.IN:
+                await self.outputs.OUT.send_packet(self.forward_copy(packet))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_chain(gui=None, length=5, n_packets=20000):
+    """
+    Returns the packets per second through a chain
+    of `length` components, with `gui` attached if given.
+    """
+    graph = Multigraph('gui_{}'.format(next(_runs)), log_level=logging.CRITICAL, gui=gui)
+    source = Component('source')
+    source.outputs.add(OutputPort('OUT'))
+    sink = Component('sink')
+    sink.inputs.add(InputPort('IN'))
+    previous = source.outputs.OUT
+    for i in range(length):
+        relay = Relay('relay_{}'.format(i))
+        graph.connect(previous, relay.inputs.IN)
+        previous = relay.outputs.OUT
+    graph.connect(previous, sink.inputs.IN)
+
+    async def produce():
+        async with source.outputs.OUT:
+            for i in range(n_packets):
+                await source.outputs.OUT.send_packet(InformationPacket(i))
+
+    async def consume():
+        async for packet in sink.inputs.IN:
+            pass
+
+    async def watch(session):
+        async with session.ws_connect('http://127.0.0.1:{}/ws'.format(gui.port)) as ws:
+            async for message in ws:
+                pass
+
+    async def run():
+        relays = [node for node in graph.iternodes() if isinstance(node, Relay)]
+        client = None
+        if gui is not None:
+            await gui.start()
+            session = aiohttp.ClientSession()
+            client = asyncio.ensure_future(watch(session))
+            await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        await asyncio.gather(produce(), consume(), *[relay() for relay in relays])
+        elapsed = time.perf_counter() - start
+        if gui is not None:
+            await gui.stop()
+            await asyncio.gather(client, return_exceptions=True)
+            await session.close()
+        return elapsed
+
+    loop = asyncio.new_event_loop()
+    elapsed = loop.run_until_complete(run())
+    loop.close()
+    return n_packets / elapsed
+
+
+@benchmark('gui', params=['off', 'on'], unit='packets/s', higher_is_better=True)
+def gui_throughput(mode):
+    if mode == 'on':
+        return run_chain(GUI(port=free_port(), interval=0.5))
+    return run_chain()
+
+
+def main(repeat=7):
+    # Alternate the runs so that both see the same machine load
+    without = with_gui = 0
+    for i in range(repeat):
+        without = max(without, run_chain())
+        with_gui = max(with_gui, run_chain(GUI(port=free_port(), interval=0.5)))
+    print("without GUI: {:.0f} packets/s".format(without))
+    print("with GUI: {:.0f} packets/s ({:+.1f}%)".format(with_gui, 100 * (with_gui - without) / without))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of the cost of logging on the packet path: packets are
+sent through a connection with the graph logging at DEBUG (written to
+/dev/null directly or through a :class:`pyperator.logging.LogSink`), at WARNING
+and in production mode, where the per-packet messages are skipped altogether.
+Run it as :code:`python -m benchmarks.logging_overhead`.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+
+from benchmarks import benchmark
+import pyperator.logging
+from pyperator.DAG import Multigraph
+from pyperator.nodes import Component
+from pyperator.utils import InputPort, OutputPort
+from pyperator.IP import InformationPacket
+
+_runs = itertools.count()
+
+
+def run_transfer(level, n_packets=20000, background=False):
+    """
+    Returns the packets per second sent from
+    a source to a sink with the graph logging at `level`,
+    written from a background thread if `background` is True.
+    """
+    graph = Multigraph('logging_{}_{}'.format(logging.getLevelName(level), next(_runs)), log_level=level)
+    devnull = open(os.devnull, 'w')
+    handler = logging.StreamHandler(devnull)
+    if background:
+        log_sink = pyperator.logging.LogSink()
+        log_sink.add_handler(handler)
+        graph.log.handlers = [log_sink.queue_handler]
+    else:
+        graph.log.handlers = [handler]
+    source = Component('source')
+    source.outputs.add(OutputPort('OUT'))
+    sink = Component('sink')
+    sink.inputs.add(InputPort('IN'))
+    graph.connect(source.outputs.OUT, sink.inputs.IN)
+    payload = list(range(100))
+
+    async def produce():
+        for i in range(n_packets):
+            await source.outputs.OUT.send_packet(InformationPacket(payload))
+
+    async def consume():
+        for i in range(n_packets):
+            await sink.inputs.IN.receive_packet()
+
+    async def run():
+        await asyncio.gather(produce(), consume())
+
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+    loop.run_until_complete(run())
+    if background:
+        log_sink.stop()
+    elapsed = time.perf_counter() - start
+    loop.close()
+    devnull.close()
+    return n_packets / elapsed
+
+
+@benchmark('logging', params=['DEBUG', 'WARNING', 'production'], unit='packets/s', higher_is_better=True)
+def logging_throughput(mode):
+    """
+    Returns the packets per second with the graph logging at
+    level `mode` or in production mode.
+    """
+    if mode == 'production':
+        pyperator.logging.set_production()
+        try:
+            return run_transfer(logging.DEBUG)
+        finally:
+            pyperator.logging.set_production(False)
+    return run_transfer(getattr(logging, mode))
+
+
+def main():
+    print("DEBUG: {:.0f} packets/s".format(run_transfer(logging.DEBUG)))
+    print("DEBUG, log sink: {:.0f} packets/s".format(run_transfer(logging.DEBUG, background=True)))
+    print("WARNING: {:.0f} packets/s".format(run_transfer(logging.WARNING)))
+    pyperator.logging.set_production()
+    try:
+        print("production (DEBUG level): {:.0f} packets/s".format(run_transfer(logging.DEBUG)))
+    finally:
+        pyperator.logging.set_production(False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Memory benchmark of in-flight packets: 100 000 packets are
+buffered across the connections of a graph and the memory
+allocated for them is reported per packet.
+Run it as :code:`python -m benchmarks.packet_memory`.
+"""
+import asyncio
+import logging
+import sys
+import tracemalloc
+
+from benchmarks import benchmark
+from pyperator.DAG import Multigraph
+from pyperator.nodes import Component
+from pyperator.utils import InputPort, OutputPort
+from pyperator.IP import InformationPacket
+
+
+def build_arcs(n_arcs, size):
+    graph = Multigraph('memory', log_level=logging.CRITICAL)
+    sink = Component('sink')
+    graph.add_node(sink)
+    connections = []
+    for i in range(n_arcs):
+        source = Component('source_{}'.format(i))
+        source.outputs.add(OutputPort('OUT'))
+        sink.inputs.add(InputPort('IN_{}'.format(i)))
+        graph.add_node(source)
+        source.outputs.OUT.connect(sink.inputs['IN_{}'.format(i)], size=size)
+        connections.append(source.outputs.OUT.connections[0])
+    return connections
+
+
+@benchmark('buffered_packet_memory', unit='bytes')
+def buffered_bytes(n_packets=100000, n_arcs=1000):
+    """
+    Fills `n_arcs` connections with a total of `n_packets` packets
+    and returns the number of bytes allocated per buffered packet.
+    """
+    per_arc = n_packets // n_arcs
+    connections = build_arcs(n_arcs, per_arc)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for conn in connections:
+        for i in range(per_arc):
+            conn.queue.put_nowait(InformationPacket(None))
+            conn.destination.inbox.notify(conn)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / (per_arc * n_arcs)
+
+
+@benchmark('packet_memory', unit='bytes')
+def packet_bytes(n_packets=100000):
+    """
+    Returns the number of bytes allocated for each packet
+    when `n_packets` packets are kept alive.
+    """
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    packets = [InformationPacket(None) for i in range(n_packets)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before - sys.getsizeof(packets)) / n_packets
+
+
+def main():
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    print("allocated per packet object: {:.1f} bytes".format(packet_bytes()))
+    print("allocated per buffered packet: {:.1f} bytes".format(buffered_bytes()))
+
+
+if __name__ == '__main__':
+    main()
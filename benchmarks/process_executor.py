@@ -0,0 +1,70 @@
+"""
+Benchmark of :class:`pyperator.process.ProcessExecutor` on a CPU-heavy
+pipeline: a source broadcasts packets to 8 components that each burn CPU
+on every packet. The run time on a single event loop is compared with the
+run time on an increasing number of worker processes.
+Run it as :code:`python -m benchmarks.process_executor`.
+"""
+import logging
+import multiprocessing as _mp
+import time
+
+from benchmarks import benchmark
+from pyperator.DAG import Multigraph
+from pyperator.decorators import component, inport, outport
+from pyperator.process import ProcessExecutor, Placement
+
+
+@outport('OUT')
+@component
+async def Numbers(self):
+    async with self.outputs.OUT:
+        for i in range(self.n_packets):
+            await self.outputs.OUT.send(i)
+
+
+@inport('IN')
+@component
+async def Burn(self):
+    async for packet in self.inputs.IN:
+        sum(i * i for i in range(self.work))
+
+
+def build(n_burners, n_packets, work, executor=None):
+    graph = Multigraph('burn', log_level=logging.CRITICAL, executor=executor)
+    source = Numbers('numbers')
+    source.n_packets = n_packets
+    for i in range(n_burners):
+        burner = Burn('burn_{}'.format(i))
+        burner.work = work
+        graph.connect(source.outputs.OUT, burner.inputs.IN)
+    return graph
+
+
+@benchmark('process_executor', params=[0, 2, 4, 8], unit='s')
+def run(workers=None, n_burners=8, n_packets=200, work=20000):
+    """
+    Returns the time needed to run the pipeline, on
+    the current process if `workers` is None or 0.
+    """
+    if workers:
+        executor = ProcessExecutor(workers=workers, placement=Placement(spread=['Burn']))
+    else:
+        executor = None
+    graph = build(n_burners, n_packets, work, executor=executor)
+    start = time.perf_counter()
+    graph()
+    return time.perf_counter() - start
+
+
+def main():
+    serial = run()
+    print("single process: {:.2f} s".format(serial))
+    for workers in (2, 4, 8):
+        elapsed = run(workers)
+        print("{} workers: {:.2f} s, speedup {:.2f} ({} cores available)".format(
+            workers, elapsed, serial / elapsed, _mp.cpu_count()))
+
+
+if __name__ == '__main__':
+    main()
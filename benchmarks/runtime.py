@@ -0,0 +1,247 @@
+"""
+Benchmarks of the packet path of the runtime: throughput of a single
+connection, fan-out to many sinks, deep linear chains, nested subnets, bracket
+substreams through :class:`pyperator.components.Product` and
+:class:`pyperator.components.Split` and the time to build a large graph.
+Run them as :code:`python -m benchmarks run -k <name>` or all
+at once as :code:`python -m benchmarks.runtime`.
+"""
+import asyncio
+import itertools
+import logging
+import time
+
+from benchmarks import benchmark
+from pyperator import components
+from pyperator.DAG import Multigraph
+from pyperator.decorators import component, inport, outport
+from pyperator.nodes import Component
+from pyperator.subnet import Subnet, SubIn
+from pyperator.utils import InputPort, OutputPort
+from pyperator.IP import InformationPacket
+
+_graphs = itertools.count()
+
+
+def new_graph(name):
+    # Unique names, every graph has its own logger
+    return Multigraph('{}_{}'.format(name, next(_graphs)), log_level=logging.CRITICAL)
+
+
+@outport('OUT')
+@component
+async def Numbers(self):
+    async with self.outputs.OUT:
+        for i in range(self.n_packets):
+            await self.outputs.OUT.send(i)
+
+
+@inport('IN')
+@component
+async def Count(self):
+    async for packet in self.inputs.IN:
+        self.received += 1
+
+
+def numbers(name, n_packets):
+    source = Numbers(name)
+    source.n_packets = n_packets
+    return source
+
+
+def count(name):
+    sink = Count(name)
+    sink.received = 0
+    return sink
+
+
+def run_graph(graph):
+    """
+    Runs `graph` on a new event loop and returns the elapsed time.
+    """
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    start = time.perf_counter()
+    graph()
+    elapsed = time.perf_counter() - start
+    asyncio.get_event_loop().close()
+    return elapsed
+
+
+@benchmark('throughput', unit='packets/s', higher_is_better=True)
+def throughput(n_packets=50000):
+    """
+    Packets per second through a single connection,
+    without the scheduling of a graph.
+    """
+    graph = new_graph('throughput')
+    source = Component('source')
+    source.outputs.add(OutputPort('OUT'))
+    sink = Component('sink')
+    sink.inputs.add(InputPort('IN'))
+    graph.connect(source.outputs.OUT, sink.inputs.IN)
+
+    async def produce():
+        async with source.outputs.OUT:
+            for i in range(n_packets):
+                await source.outputs.OUT.send_packet(InformationPacket(i))
+
+    async def consume():
+        async for packet in sink.inputs.IN:
+            pass
+
+    async def run():
+        await asyncio.gather(produce(), consume())
+
+    loop = asyncio.new_event_loop()
+    start = time.perf_counter()
+    loop.run_until_complete(run())
+    elapsed = time.perf_counter() - start
+    loop.close()
+    return n_packets / elapsed
+
+
+@benchmark('fanout', params=[1, 10, 100], unit='packets/s', higher_is_better=True)
+def fanout(n_sinks, n_packets=20000):
+    """
+    Packets per second sent by a source
+    connected to `n_sinks` sinks.
+    """
+    graph = new_graph('fanout')
+    source = numbers('source', n_packets // n_sinks)
+    for i in range(n_sinks):
+        graph.connect(source.outputs.OUT, count('sink_{}'.format(i)).inputs.IN)
+    return source.n_packets / run_graph(graph)
+
+
+@benchmark('chain', params=[10, 100, 1000], unit='packets/s', higher_is_better=True)
+def chain(length, hops=200000):
+    """
+    Packets per second through a chain of `length` components,
+    sending the same total number of packets over all connections.
+    """
+    graph = new_graph('chain')
+    n_packets = hops // length
+    source = numbers('source', n_packets)
+    previous = source.outputs.OUT
+    for i in range(length):
+        relay = SubIn('relay_{}'.format(i))
+        graph.connect(previous, relay.inputs.IN)
+        previous = relay.outputs.OUT
+    graph.connect(previous, count('sink').inputs.IN)
+    return n_packets / run_graph(graph)
+
+
+def nested_graph(depth):
+    """
+    Returns a graph containing a relay nested in `depth` levels of
+    subnets, to be added with :meth:`pyperator.subnet.Subnet.from_graph`.
+    """
+    with new_graph('level_0') as graph:
+        relay = SubIn('relay')
+        graph.inputs.export(relay.inputs.IN, 'IN')
+        graph.outputs.export(relay.outputs.OUT, 'OUT')
+    for level in range(1, depth):
+        with new_graph('level_{}'.format(level)) as outer:
+            inner = Subnet.from_graph(graph)
+            outer.inputs.export(inner.inputs.IN, 'IN')
+            outer.outputs.export(inner.outputs.OUT, 'OUT')
+        graph = outer
+    return graph
+
+
+@benchmark('subnet', params=[1, 4, 16], unit='packets/s', higher_is_better=True)
+def subnet(depth, n_packets=5000):
+    """
+    Packets per second through a relay
+    nested in `depth` levels of subnets.
+    """
+    inner = nested_graph(depth)
+    with new_graph('subnet') as graph:
+        source = numbers('source', n_packets)
+        sink = count('sink')
+        nested = Subnet.from_graph(inner)
+        source.outputs.OUT >> nested.inputs.IN
+        nested.outputs.OUT >> sink.inputs.IN
+    return n_packets / run_graph(graph)
+
+
+@benchmark('brackets', unit='substreams/s', higher_is_better=True)
+def brackets(n_packets=100):
+    """
+    Substreams per second of the cartesian product of two sources
+    of `n_packets` packets, split back into two streams.
+    """
+    graph = new_graph('brackets')
+    product = components.Product('product')
+    product.inputs.add(InputPort('IN1'))
+    product.inputs.add(InputPort('IN2'))
+    split = components.Split('split')
+    split.outputs.add(OutputPort('OUT1'))
+    split.outputs.add(OutputPort('OUT2'))
+    graph.connect(numbers('source_1', n_packets).outputs.OUT, product.inputs.IN1)
+    graph.connect(numbers('source_2', n_packets).outputs.OUT, product.inputs.IN2)
+    graph.connect(product.outputs.OUT, split.inputs.IN)
+    graph.connect(split.outputs.OUT1, count('sink_1').inputs.IN)
+    graph.connect(split.outputs.OUT2, count('sink_2').inputs.IN)
+    return n_packets ** 2 / run_graph(graph)
+
+
+def chain_graph(n_components):
+    """
+    Returns a graph with a chain of `n_components` components.
+    """
+    graph = new_graph('construction')
+    previous = numbers('source', 0).outputs.OUT
+    for i in range(n_components - 2):
+        relay = SubIn('relay_{}'.format(i))
+        graph.connect(previous, relay.inputs.IN)
+        previous = relay.outputs.OUT
+    graph.connect(previous, count('sink').inputs.IN)
+    return graph
+
+
+@benchmark('construction', params=[1000, 10000, 50000], unit='s')
+def construction(n_components):
+    """
+    Seconds needed to create and connect a
+    chain of `n_components` components.
+    """
+    start = time.perf_counter()
+    chain_graph(n_components)
+    return time.perf_counter() - start
+
+
+@benchmark('queries', params=[50000], unit='s')
+def queries(n_components):
+    """
+    Seconds needed to list the nodes and the arcs of a chain of
+    `n_components` components and to look up each arc and its successors.
+    """
+    graph = chain_graph(n_components)
+    start = time.perf_counter()
+    for node in graph.iternodes():
+        list(graph.adjacent(node))
+    for outport, inport in graph.iterarcs():
+        assert graph.hasarc(outport.component, inport.component, outport.name, inport.name)
+    return time.perf_counter() - start
+
+
+@benchmark('compile', params=[50000], unit='s')
+def compile_graph(n_components):
+    """
+    Seconds needed to validate a chain of `n_components`
+    components and to find its topological levels.
+    """
+    graph = chain_graph(n_components)
+    start = time.perf_counter()
+    graph.compile()
+    return time.perf_counter() - start
+
+
+def main():
+    import benchmarks
+    benchmarks.run_module('benchmarks.runtime')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of the connections crossing the process boundary: packets of
+1 KB and 1 MB are sent from the current process to a forked
+process through a :class:`pyperator.process.SharedMemoryConnection`,
+a :class:`pyperator.process.PipeConnection` and, as a reference,
+a plain :class:`multiprocessing.Queue`.
+Run it as :code:`python -m benchmarks.shared_memory`.
+"""
+import asyncio
+import multiprocessing as _mp
+import time
+
+from benchmarks import benchmark
+from pyperator import IP
+from pyperator.process import SharedMemoryConnection, PipeConnection
+from pyperator.utils import InputPort
+
+_fork = _mp.get_context('fork')
+
+
+def _consume_connection(conn, n_packets):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def consume():
+        pump = asyncio.ensure_future(conn.pump())
+        for i in range(n_packets):
+            await conn.destination.inbox.get()
+        await pump
+
+    loop.run_until_complete(consume())
+    loop.close()
+
+
+def _consume_queue(queue, n_packets):
+    for i in range(n_packets + 1):
+        queue.get()
+
+
+def run_connection(connection, payload, n_packets):
+    conn = connection(size=100)
+    conn.destination = InputPort('IN')
+    # Also receive the end of stream, which stops the pump
+    consumer = _fork.Process(target=_consume_connection, args=(conn, n_packets + 1))
+    consumer.start()
+    loop = asyncio.new_event_loop()
+
+    async def produce():
+        for i in range(n_packets):
+            await conn.send(IP.InformationPacket(payload))
+        await conn.send(IP.EndOfStream())
+        await conn.join()
+
+    start = time.perf_counter()
+    loop.run_until_complete(produce())
+    consumer.join()
+    elapsed = time.perf_counter() - start
+    loop.close()
+    conn.release()
+    return elapsed
+
+
+def run_queue(payload, n_packets):
+    queue = _fork.Queue(maxsize=100)
+    consumer = _fork.Process(target=_consume_queue, args=(queue, n_packets))
+    consumer.start()
+    start = time.perf_counter()
+    for i in range(n_packets):
+        queue.put(IP.InformationPacket(payload))
+    queue.put(IP.EndOfStream())
+    consumer.join()
+    return time.perf_counter() - start
+
+
+@benchmark('process_connection', params=['shared_memory', 'pipe'], unit='MB/s', higher_is_better=True)
+def connection_bandwidth(connection, size=1024 ** 2, n_packets=200):
+    """
+    Returns the bandwidth of sending packets of `size` bytes
+    to another process through `connection`.
+    """
+    connection = {'shared_memory': SharedMemoryConnection, 'pipe': PipeConnection}[connection]
+    elapsed = run_connection(connection, bytes(size), n_packets)
+    return size * n_packets / 1024 ** 2 / elapsed
+
+
+def main():
+    for size, n_packets in ((1024, 20000), (1024 ** 2, 200)):
+        payload = bytes(size)
+        megabytes = size * n_packets / 1024 ** 2
+        timings = [('shared memory', run_connection(SharedMemoryConnection, payload, n_packets)),
+                   ('pipe', run_connection(PipeConnection, payload, n_packets)),
+                   ('multiprocessing.Queue', run_queue(payload, n_packets))]
+        for name, elapsed in timings:
+            print("{} B x {}, {}: {:.3f} s, {:.0f} packets/s, {:.1f} MB/s".format(
+                size, n_packets, name, elapsed, n_packets / elapsed, megabytes / elapsed))
+
+
+if __name__ == '__main__':
+    main()
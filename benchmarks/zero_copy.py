@@ -0,0 +1,59 @@
+"""
+Benchmark of :meth:`pyperator.IP.InformationPacket.copy` on
+100 MB payloads, comparing zero-copy sharing with eager copies
+over a chain of hops. A numpy array is used when numpy is installed.
+Run it as :code:`python -m benchmarks.zero_copy`.
+"""
+import time
+import tracemalloc
+
+from benchmarks import benchmark
+from pyperator.IP import InformationPacket
+
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+
+def copy_chain(payload, hops=10, share=True):
+    """
+    Copies a packet `hops` times, as it would be by a chain of
+    :class:`pyperator.subnet.SubIn` components and returns the elapsed
+    time and the peak of memory allocated in the process.
+    """
+    packet = InformationPacket(payload)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(hops):
+        packet = packet.copy(share=share)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+@benchmark('copy_peak', params=['shared', 'eager'], unit='MB')
+def copy_peak(mode, size=100 * 2 ** 20):
+    """
+    Returns the peak memory in MB of copying a packet
+    of `size` bytes over a chain of hops.
+    """
+    elapsed, peak = copy_chain(bytearray(size), share=mode == 'shared')
+    return peak / 2 ** 20
+
+
+def main():
+    size = 100 * 2 ** 20
+    payloads = [('bytearray', bytearray(size))]
+    if _np:
+        payloads.append(('numpy', _np.zeros(size, dtype=_np.uint8)))
+    for name, payload in payloads:
+        for share in (True, False):
+            elapsed, peak = copy_chain(payload, share=share)
+            print("{:<10} {:<10} {:>10.4f} s {:>10.1f} MB peak".format(
+                name, 'zero-copy' if share else 'eager', elapsed, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import asyncio
+import collections as _coll
 import logging
 import os as _os
 import shutil
@@ -7,9 +8,14 @@ import textwrap as _tw
 import __main__ as main
 from pyperator import context
 from pyperator import nodes
+from pyperator import replicas as _replicas
 
 from pyperator import exceptions
 from pyperator import logging as _log
+from pyperator import metrics as _metrics
+from pyperator import utils as _utils
+from pyperator import cache as _cache
+from pyperator import store as _store
 
 
 from threading import Thread
@@ -55,6 +61,59 @@ import itertools as _iter
 
 
 
+#: Result of :meth:`Multigraph.compile`: the nodes grouped by topological
+#: level, the cycles of the graph and the warnings found while validating it
+CompiledGraph = _coll.namedtuple('CompiledGraph', ['levels', 'cycles', 'warnings'])
+
+
+def strongly_connected(nodes, successors):
+    """
+    Returns the strongly connected components of the graph formed by `nodes`,
+    with arcs given by the function `successors`, in reverse topological order.
+    This is Tarjan's algorithm without recursion, so that it works on long chains.
+
+    :return: list of lists of nodes
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(successors(root)))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member is node:
+                            break
+                    components.append(component)
+    return components
+
+
 def run_in_different_thread(tasks):
     # loop.run_until_complete(asyncio.gather(*tasks))
     second_loop = asyncio.new_event_loop()
@@ -98,11 +157,65 @@ class Multigraph(nodes.Component):
         print("a")
     """
 
-    def __init__(self, name, log=None, log_level=logging.DEBUG, workdir=None):
+    def __init__(self, name, log=None, log_level=logging.DEBUG, workdir=None, executor=None, capacity=100,
+                 overflow='block', metrics=False, metrics_file=None, metrics_interval=1.0, gui=None,
+                 tracer=None, profiler=None, subprocesses=None, cache=False, store=None, share_payloads=None):
         super(Multigraph, self).__init__(name)
         self._nodes = set()
+        # Arcs by source and destination node, each a dict of
+        # {(outport name, inport name): (outport, inport)}
+        self._arcs = {}
+        # Flattened nodes, see :meth:`iternodes`
+        self._flat_nodes = None
+        # Task running each node while the graph runs, nodes
+        # added meanwhile are started at once, see :meth:`add_node`
+        self._tasks = None
+        # Result of :meth:`compile`, until the graph changes
+        self._compiled = None
         self._name = name
         self.workdir = workdir or './'
+        # Default capacity and overflow policy of the
+        # connections, see :meth:`pyperator.utils.Port.connect`
+        self.capacity = capacity
+        self.overflow = overflow
+        # Runtime metrics, see :meth:`snapshot`. If `metrics_file` is
+        # given, they are appended to it every `metrics_interval` seconds
+        self.metrics = _metrics.GraphMetrics(self) if metrics or metrics_file else None
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        # Live view served while the graph
+        # runs, see :class:`pyperator.gui.GUI`
+        self.gui = gui
+        if gui is not None:
+            gui.attach(self)
+        # Subnet running the nodes of this graph,
+        # see :meth:`pyperator.subnet.Subnet.from_graph`
+        self.subnet = None
+        # Packet tracer, see :class:`pyperator.tracing.Tracer`
+        self.tracer = tracer
+        # Whether the components forwarding packets unchanged share their payloads
+        # read-only, see :meth:`pyperator.nodes.Component.forward_copy`
+        self.share_payloads = share_payloads
+        # CPU profiler, see :class:`pyperator.profiling.Profiler`
+        self.profiler = profiler
+        # Pool limiting the commands run at the same time by the shell
+        # components, or its number of slots, see :class:`pyperator.shell.SubprocessPool`
+        self.subprocesses = subprocesses
+        # Content-hash build cache of the file operators, see :mod:`pyperator.cache`
+        if cache is True:
+            cache = _cache.BuildCache(_os.path.join(self.workdir, _cache.INDEX_NAME))
+        self.build_cache = cache or None
+        # Artifact store shared by graphs, or the directory
+        # of one, see :mod:`pyperator.store`
+        if isinstance(store, str):
+            store = _store.ArtifactStore(_store.DirectoryBackend(store))
+        self.store = store
+        # Modification times of the files checked during
+        # a run, see :class:`pyperator.shell.StatCache`
+        self.stat_cache = None
+        # Executor used to run the graph on several processes,
+        # see :class:`pyperator.process.ProcessExecutor`
+        self.executor = executor
         self._log_path = None or log
         self._log = _log.setup_custom_logger(self.name, file=self._log_path, level=log_level)
         self.log.info("Created DAG {} with workdir {}".format(self.name, self.workdir))
@@ -121,21 +234,34 @@ class Multigraph(nodes.Component):
 
 
 
-    def connect(self, port1, port2):
+    def connect(self, port1, port2, size=None, overflow=None):
+        """
+        Connects `port1` to `port2`, adding their components to the graph.
+        `size` and `overflow` set the capacity, 0 for an unbounded connection,
+        and the overflow policy of this connection, by default those of the graph are used.
+        """
         # Add nodes that are not in the node list
         self.log.debug("DAG {}: Connecting {} to {}".format(self.name, port1, port2))
         for port in [port1, port2]:
             try:
+                # Components inside a node of the graph
+                # (e.g. a replica pool or a subnet) are run by that node
+                owner = port.component.dag
+                owner = getattr(owner, 'subnet', None) or owner
+                if owner is not None and owner is not self and self.hasnode(owner):
+                    continue
                 # Add log to every component
                 port.component.dag = self
                 port.component._log = self.log
                 if not self.hasnode(port.component):
-                    self._nodes.add(port.component)
+                    self.add_node(port.component)
             except:
                 raise exceptions.PortNotExistingError('Port {} does not exist'.format(port))
                 self.log.ERROR("Port {} does not exist".format(port))
-        port1.connect(port2)
-        # self._arcs.update(port1.connect_dict)
+        # The arc is indexed by the port, see :meth:`_index_arc`
+        if size is None:
+            size = self.capacity
+        port1.connect(port2, size=size, overflow=overflow or self.overflow)
 
     def set_initial_packet(self, port, value):
         port.set_initial_packet(value)
@@ -143,11 +269,37 @@ class Multigraph(nodes.Component):
     def set_kickstarter(self, port):
         port.kickstart()
 
-    def add_node(self, node):
+    def add_node(self, node, replicas=None):
+        """
+        Adds a node to the graph. If `replicas` is given, `replicas` copies
+        of the node run in parallel in a :class:`pyperator.replicas.ReplicaPool`,
+        which is added instead and returned; it must be connected in place of the node.
+
+        :param node: :class:`pyperator.nodes.Component`
+        :param replicas: number of parallel replicas
+        :return: the added node
+        """
+        if replicas is not None:
+            self._nodes.discard(node)
+            node = _replicas.ReplicaPool(node, replicas)
         node.dag = self
         node._log = self._log
 
         self._nodes.add(node)
+        self._changed()
+        if self._tasks is not None:
+            for flat in node.iternodes():
+                if flat not in self._tasks:
+                    self._tasks[flat] = self.loop.create_task(self.run_node(flat))
+        # Arcs connected before the node was added, initial
+        # packets are connections without a source
+        for port in node.outputs.values():
+            for conn in port.iterends():
+                self._index_arc(port, conn.destination)
+        for port in node.inputs.values():
+            for conn in port.iterends():
+                if getattr(conn, 'source', None) is not None:
+                    self._index_arc(conn.source, port)
         return node
 
     def __radd__(self, other):
@@ -158,15 +310,295 @@ class Multigraph(nodes.Component):
         self.add_node(other)
         return self
 
-    def hasarc(self, node1, node2, outport, inport):
-        return node1 in self._arcs and {node2: (outport, inport)} in self._arcs[node1]
+    def _owner(self, component):
+        """
+        Returns the node of this graph containing `component`, that is the
+        component itself or the subnet, replica pool or nested graph running
+        it, or None if `component` is not in this graph.
+        """
+        node = component
+        while node is not None:
+            parent = getattr(node, 'dag', None)
+            parent = getattr(parent, 'subnet', None) or parent
+            if parent is self:
+                return node
+            node = parent
+        return None
+
+    def _index_arc(self, port1, port2):
+        """
+        Adds the arc from `port1` to `port2` to the index if both
+        components are in this graph, called by :meth:`pyperator.utils.Port.connect`.
+
+        :return: True if the arc was indexed
+        """
+        node1 = self._owner(port1.component)
+        node2 = self._owner(port2.component)
+        if node1 is None or node2 is None:
+            return False
+        # Arcs inside a subnet or a nested graph are indexed there
+        if node1 is node2 and (port1.component is not node1 or port2.component is not node2):
+            return False
+        arcs = self._arcs.setdefault(node1, {}).setdefault(node2, {})
+        arcs[(port1.name, port2.name)] = (port1, port2)
+        self._changed()
+        return True
+
+    def _unindex_arc(self, port1, port2):
+        """
+        Removes the arc from `port1` to `port2` from the index,
+        called by :meth:`pyperator.utils.Port.disconnect`.
+
+        :return: True if the arc was indexed
+        """
+        node1 = self._owner(port1.component)
+        node2 = self._owner(port2.component)
+        targets = self._arcs.get(node1, {})
+        arcs = targets.get(node2, {})
+        if arcs.get((port1.name, port2.name)) != (port1, port2):
+            return False
+        del arcs[(port1.name, port2.name)]
+        if not arcs:
+            del targets[node2]
+        if not targets:
+            del self._arcs[node1]
+        self._changed()
+        return True
+
+    def _changed(self):
+        # The graphs containing this one change too
+        graph = self
+        while isinstance(graph, Multigraph):
+            graph._flat_nodes = None
+            graph._compiled = None
+            graph = getattr(graph, 'subnet', None) or graph
+            graph = graph.dag
+
+    def _components(self, nodes=None):
+        # All the components, including those inside subnets
+        for node in self._nodes if nodes is None else nodes:
+            for flat in node.iternodes():
+                yield flat
+                yield from self._components(getattr(flat, 'nodes', ()))
+
+    def _release_connections(self):
+        for node in self._components():
+            for port in node.outputs.values():
+                if port.component is node:
+                    for conn in port.connections:
+                        conn.release()
+
+    def compile(self):
+        """
+        Validates the graph before it runs and returns its :class:`CompiledGraph`,
+        which is kept until the graph changes. The graph is not valid if
+
+        - an input port is neither connected nor has an initial packet
+        - an input port with an initial packet is connected too, as it would never
+          receive the packets sent to it
+        - there is a cycle whose connections all block the sender when they are
+          full, which deadlocks as soon as they fill up: use the 'drop_newest',
+          'drop_oldest' or 'spill' overflow policy for one of them
+
+        Output ports that are not connected are only reported as warnings, as
+        their packets are dropped. Nodes in a cycle share the same topological level.
+
+        :raises: :class:`pyperator.exceptions.GraphValidationError` listing the problems
+        :return: :class:`CompiledGraph`
+        """
+        if self._compiled is not None:
+            return self._compiled
+        problems = []
+        warnings = []
+        seen = set()
+        for component in self._components():
+            for port in component.inputs.values():
+                if port in seen:
+                    continue
+                seen.add(port)
+                connected = any(getattr(conn, 'source', None) is not None for conn in port.connections)
+                if port._iip is None and not connected and not port.optional:
+                    problems.append('Input port {} of {} is not connected and has no initial packet'.format(
+                        port.name, port.component.name))
+                elif port._iip is not None and connected:
+                    problems.append('Input port {} of {} has an initial packet and is connected too'.format(
+                        port.name, port.component.name))
+            for port in component.outputs.values():
+                if port in seen:
+                    continue
+                seen.add(port)
+                if not port.is_connected and not port.optional:
+                    warnings.append('Output port {} of {} is not connected, its packets are dropped'.format(
+                        port.name, port.component.name))
+        nodes = list(self._nodes)
+        components = strongly_connected(nodes, self.adjacent)
+        cycles = [component for component in components
+                  if len(component) > 1 or self.hasarc(component[0], component[0])]
+
+        in_cycles = {node for cycle in cycles for node in cycle}
+
+        def blocking(node):
+            for target, arcs in self._arcs.get(node, {}).items():
+                if target in in_cycles and any(conn.destination is inport and not isinstance(conn, non_blocking)
+                                               for outport, inport in arcs.values() for conn in outport.connections):
+                    yield target
+
+        non_blocking = (_utils.DropNewestConnection, _utils.SpillConnection)
+        for component in strongly_connected(in_cycles, blocking):
+            if len(component) > 1 or component[0] in blocking(component[0]):
+                problems.append('Cycle {} can deadlock, all its connections block when full'.format(
+                    ' -> '.join(sorted(node.name for node in component))))
+        if problems:
+            raise exceptions.GraphValidationError(self.name, problems)
+        for warning in warnings:
+            self.log.warning(warning)
+        # Longest path from a source, components are found downstream first
+        level = {}
+        for component in reversed(components):
+            members = set(component)
+            current = level.get(component[0], 0)
+            for node in component:
+                current = max(current, level.get(node, 0))
+            for node in component:
+                level[node] = current
+                for target in self.adjacent(node):
+                    if target not in members:
+                        level[target] = max(level.get(target, 0), current + 1)
+        levels = [[] for i in range(max(level.values(), default=-1) + 1)]
+        for node in nodes:
+            levels[level[node]].append(node)
+        for nodes_in_level in levels:
+            nodes_in_level.sort(key=lambda node: node.name)
+        self._compiled = CompiledGraph(levels, cycles, warnings)
+        return self._compiled
+
+    def hasarc(self, node1, node2, outport=None, inport=None):
+        """
+        Returns True if `node1` is connected to `node2`, through the ports
+        named `outport` and `inport` if given, in constant time.
+        """
+        arcs = self._arcs.get(node1, {}).get(node2)
+        if not arcs:
+            return False
+        if outport is None and inport is None:
+            return True
+        if outport is not None and inport is not None:
+            return (outport, inport) in arcs
+        return any(outport in (None, out) and inport in (None, in_) for out, in_ in arcs)
 
     def hasnode(self, node):
         return node in self._nodes
 
-    def disconnect(self, node1: nodes.Component, node2: nodes.Component ):
-        # TODO implement it
-        pass
+    def disconnect(self, node1: nodes.Component, node2: nodes.Component, outport=None, inport=None):
+        """
+        Removes the arcs from `node1` to `node2`, only those from the port named
+        `outport` and to the port named `inport` if given. The packets already
+        sent can still be received by `node2` as long as the port has other
+        connections, see :meth:`pyperator.utils.Port.disconnect`.
+
+        :return: list of the removed connections
+        """
+        removed = []
+        for port1, port2 in list(self._arcs.get(node1, {}).get(node2, {}).values()):
+            if outport in (None, port1.name) and inport in (None, port2.name):
+                removed.extend(port1.disconnect(port2))
+        return removed
+
+    def move_arc(self, outport, inport, new_inport):
+        """
+        Moves the arc from `outport` to `inport` so that it ends in `new_inport`
+        instead, together with the packets buffered in it, adding the component
+        of `new_inport` to the graph. It can be used while the graph runs.
+
+        :return: list of the moved connections
+        """
+        if self._owner(new_inport.component) is None:
+            self.add_node(new_inport.component)
+        return outport.reconnect(inport, new_inport)
+
+    async def remove_node(self, node):
+        """
+        Removes `node` from the running graph without losing packets. The
+        arcs to `node` are disconnected, so the upstream components must have been
+        connected elsewhere first, and `node` receives the end of stream once it has
+        received the packets buffered in them. Its output ports are then disconnected
+        from the ports that receive packets from other components too, the others
+        receive the end of stream when `node` stops. Returns when `node` has stopped.
+        """
+        inbound = []
+        for port in node.inputs.values():
+            for conn in list(port.connections):
+                if getattr(conn, 'source', None) is not None:
+                    # A new list, the source may be sending
+                    conn.source.connections = [other for other in conn.source.connections if other is not conn]
+                    inbound.append(conn)
+        if self._tasks is not None and node in self._tasks:
+            # Let the node receive the packets already sent
+            for conn in inbound:
+                while True:
+                    await conn.join()
+                    # A sender blocked on the full connection puts its packet now
+                    await asyncio.sleep(0)
+                    if not conn.depth():
+                        break
+        for conn in inbound:
+            conn.destination.connections = [other for other in conn.destination.connections if other is not conn]
+            _utils._update_index(conn.source, conn.destination, '_unindex_arc')
+        await self._stop_node(node)
+
+    async def replace(self, old, new):
+        """
+        Hot-swaps the node `old` for `new`, which must have ports with the same
+        names, while the graph runs. The arcs to `old` are moved to `new` with the
+        packets buffered in them and `new` is connected to the destinations of
+        `old`, then `old` is stopped once it has finished the packet it is working on,
+        as in :meth:`remove_node`. Packets sent by `old` after receiving the end
+        of stream are dropped, and the packets `old` is working on can arrive
+        after the first ones sent by `new`. Returns when `old` has stopped.
+        """
+        if self._owner(new) is None:
+            self.add_node(new)
+        policies = {cls: name for name, cls in _utils.overflow_policies.items()}
+        for port in old.inputs.values():
+            for conn in list(port.connections):
+                if getattr(conn, 'source', None) is not None:
+                    self.move_arc(conn.source, port, new.inputs[port.name])
+        for port in old.outputs.values():
+            for conn in list(port.connections):
+                self.connect(new.outputs[port.name], conn.destination, size=conn.capacity(),
+                             overflow=policies.get(type(conn)))
+        await self._stop_node(old)
+
+    async def _stop_node(self, node):
+        # Ends the input streams of `node`, waits for it to stop and removes it
+        def detach():
+            # The destinations that also receive packets from
+            # other components must not receive the end of stream
+            for port in node.outputs.values():
+                for conn in list(port.connections):
+                    if any(getattr(other, 'source', None) is not None and other.source.component is not node
+                           for other in conn.destination.connections):
+                        port.disconnect(conn.destination)
+
+        task = self._tasks.get(node) if self._tasks is not None else None
+        if task is not None and not task.done():
+            for port in node.inputs.values():
+                if port._iip is None and port.open:
+                    end = _utils.EndOfStreamConnection(port, on_end=detach)
+                    port.connections = port.connections + [end]
+                    port.inbox.notify(end)
+            await asyncio.wait([task])
+        for port in node.inputs.values():
+            port.connections = [conn for conn in port.connections if conn is port._iip]
+        for port in node.outputs.values():
+            for conn in list(port.connections):
+                port.disconnect(conn.destination)
+        if self._tasks is not None:
+            self._tasks.pop(node, None)
+        self._nodes.discard(node)
+        self._arcs.pop(node, None)
+        self._changed()
+        self.log.info('Removed node {}'.format(node.name))
 
     def iternodes(self) -> nodes.Component:
         """
@@ -176,23 +608,34 @@ class Multigraph(nodes.Component):
         it is very easy to recursively flatten
         subnets.
         
+        The flattened list is kept until
+        a node is added.
+
         :yields: `pyperator.nodes.Component` 
         """
-        for node in self._nodes:
-            yield from node.iternodes()
+        if self._flat_nodes is None:
+            self._flat_nodes = [flat for node in self._nodes for flat in node.iternodes()]
+        return iter(self._flat_nodes)
 
     def iterarcs(self):
-        for source in self.iternodes():
-            for port in list(source.outputs.values()):
-                for dest in port.iterends():
-                    yield (port, dest)
+        """
+        Iterates the arcs of the graph, including those
+        inside nested graphs and replica pools.
 
+        :yields: pairs of `(outport, inport)`
+        """
+        for targets in self._arcs.values():
+            for arcs in targets.values():
+                yield from arcs.values()
+        for node in self._nodes:
+            if hasattr(node, 'iterarcs'):
+                yield from node.iterarcs()
 
     def adjacent(self, node):
-        if node in self._arcs:
-            yield from self._arcs[node]
-        else:
-            return
+        """
+        Iterates the nodes `node` is connected to.
+        """
+        return iter(self._arcs.get(node, ()))
 
     # Context manager
     def __enter__(self):
@@ -227,7 +670,7 @@ class Multigraph(nodes.Component):
         # List of nodes
         nodes_gen = (node.gv_node() for node in self.iternodes())
         # List of arcs
-        arc_str = ("{} -> {} [arrowType=normal]".format(k.gv_string(), v.gv_string(), v.size) for k, v in
+        arc_str = ("{} -> {} [arrowType=normal]".format(k.gv_string(), v.gv_string()) for k, v in
                    self.iterarcs())
         # IIPs as additional nodes
         iip_nodes = "\n".join(
@@ -254,18 +697,72 @@ class Multigraph(nodes.Component):
             """.format(graph_table=self.graph_dot_table())
         return _tw.dedent(graph_str)
 
+    def snapshot(self):
+        """
+        Returns the runtime metrics of the graph, collected if it was
+        created with :code:`metrics=True`, see :mod:`pyperator.metrics`.
+
+        :return: dict with the metrics of each component and connection
+        """
+        if self.metrics is None:
+            raise ValueError('DAG {} does not collect metrics, create it with metrics=True'.format(self.name))
+        return self.metrics.snapshot()
+
+    def run_node(self, node):
+        """
+        Returns the coroutine running `node`, measured
+        by the metrics and the profiler of the graph.
+
+        :param node: :class:`pyperator.nodes.Component`
+        """
+        coro = self.metrics.run(node) if self.metrics is not None else node()
+        if self.profiler is not None:
+            coro = self.profiler.profile(node, coro)
+        return coro
+
+    async def _run_tasks(self):
+        # Waits for the nodes, including those added while the
+        # graph runs, stopping at the first exception
+        while True:
+            for task in list(self._tasks.values()):
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+            pending = [task for task in self._tasks.values() if not task.done()]
+            if not pending:
+                break
+            await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+
     def __call__(self):
+        # Fail before running anything
+        compiled = self.compile()
         # Add code to the repository
         loop = asyncio.get_event_loop()
         self.loop = loop
         self.log.info('Starting DAG')
         self.log.info('has following nodes {}'.format(list(self.iternodes())))
+        exporter = None
         try:
-            tasks = [loop.create_task(node()) for node in self.iternodes()]
-            loop.run_until_complete(asyncio.gather(*tasks))
+            if self.executor is not None:
+                # The workers run the nodes, the finally block cleans up here
+                return self.executor.run(self)
+            if self.tracer is not None:
+                self.tracer.attach(self)
+            if self.profiler is not None:
+                self.profiler.attach(self)
+                self.profiler.start()
+            if self.gui is not None:
+                loop.run_until_complete(self.gui.start())
+            if self.metrics is not None and self.metrics_file:
+                exporter = loop.create_task(self.metrics.export(self.metrics_file, self.metrics_interval))
+            # Upstream nodes are started first
+            self._tasks = {flat: loop.create_task(self.run_node(flat))
+                           for level in compiled.levels for node in level for flat in node.iternodes()}
+            loop.run_until_complete(self._run_tasks())
         except StopAsyncIteration as e:
             self.log.info('Received EOS')
         except Exception as e:
+            if self.executor is not None:
+                raise
             self.log.exception(e)
             self.log.info('Stopping DAG by cancelling scheduled tasks')
             if not loop.is_closed():
@@ -273,7 +770,30 @@ class Multigraph(nodes.Component):
                 future = asyncio.gather(*(task))
                 future.cancel()
         finally:
+            self._tasks = None
             if loop.is_running():
                 loop.stop()
                 self.log.info('Stopping DAG')
+            if exporter is not None:
+                exporter.cancel()
+                if not loop.is_closed():
+                    loop.run_until_complete(asyncio.gather(exporter, return_exceptions=True))
+                self.metrics.write(self.metrics_file)
+            if self.gui is not None and not loop.is_closed():
+                loop.run_until_complete(self.gui.stop())
+            if self.profiler is not None:
+                self.profiler.stop()
+            for node in self._components():
+                node.shutdown_policy()
+            if self.executor is None:
+                # e.g. the files of packets spilled to disk when the graph failed,
+                # the workers release their connections themselves
+                self._release_connections()
+            self.stat_cache = None
+            if self.build_cache is not None:
+                self.build_cache.save()
+                self.log.info('Build cache hits and misses: {}'.format(self.build_cache.report()))
+            if self.store is not None:
+                self.log.info('Artifact store files restored and published: {}'.format(self.store.stats))
             self.log.info('Stopped')
+            _log.shutdown(self.name)
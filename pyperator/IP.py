@@ -1,11 +1,62 @@
 # Based on https://github.com/LumaPictures/pflow/blob/master/pflow/packet.py
+import copy as _copy
 
 
+def readonly_view(value):
+    """
+    Returns a read-only view sharing the memory of `value`.
+    Arrays exposing `flags` and `view` (i.e numpy arrays) are viewed
+    as non-writeable arrays, other mutable objects supporting the
+    buffer protocol as a read-only :class:`memoryview`.
+    Immutable and non-buffer objects are returned unchanged.
+
+    :param value: packet payload
+    :return: the shared payload
+    """
+    if isinstance(value, memoryview):
+        return value.toreadonly()
+    flags = getattr(value, 'flags', None)
+    if flags is not None and hasattr(value, 'view'):
+        if not flags.writeable:
+            return value
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    try:
+        view = memoryview(value)
+    except TypeError:
+        return value
+    if view.readonly:
+        return value
+    else:
+        return view.toreadonly()
+
+
+def private_copy(value):
+    """
+    Returns a writable copy of `value` that
+    does not share memory with it.
+
+    :param value: packet payload
+    :return: the copied payload
+    """
+    if isinstance(value, (memoryview, bytes)):
+        return bytearray(value)
+    if getattr(value, 'flags', None) is not None and hasattr(value, 'copy'):
+        return value.copy()
+    return _copy.copy(value)
+
 
 class InformationPacket(object):
+    __slots__ = ('_value', '_owner', '_shared', '_trace')
+
     def __init__(self, value, owner=None):
         self._value = value
         self._owner = owner
+        self._shared = False
+        # Set to a :class:`pyperator.tracing.TraceContext`
+        # when the packet is traced
+        self._trace = None
 
     def drop(self):
         del self
@@ -40,17 +91,109 @@ class InformationPacket(object):
     def open(self):
         pass
 
-    def copy(self):
-        return InformationPacket(self.value, owner=None)
+    def __reduce__(self):
+        # The owner is not pickled: a packet
+        # sent to another process is unowned there
+        value = self._value
+        if isinstance(value, memoryview):
+            value = private_copy(value)
+        if self._trace is not None:
+            return (type(self), (value,), self._trace)
+        return (type(self), (value,))
+
+    def __setstate__(self, trace):
+        self._trace = trace
+
+    def writable_value(self):
+        """
+        Returns the payload of the packet for modification.
+        If the payload is shared with other packets, a private
+        copy is made the first time this is called.
+        """
+        if self._shared:
+            self._value = private_copy(self._value)
+            self._shared = False
+        return self._value
 
+    def copy(self, share=None):
+        """
+        Copies the packet. By default the copy refers to the same
+        payload as this packet. With `share=True` the copy is zero-copy and
+        read-only: its payload shares the memory of this packet's payload through
+        a read-only view (see :func:`readonly_view`), e.g. a :class:`memoryview`
+        instead of a :class:`bytearray`, and is only copied when :meth:`writable_value`
+        is called. With `share=False` the payload is copied immediately, keeping
+        its type; immutable payloads are not duplicated. Components forwarding packets unchanged share their payloads
+        if asked to, see :meth:`pyperator.nodes.Component.forward_copy`.
+
+        :param share: share the payload read-only, or copy it
+        :return: unowned :class:`InformationPacket`
+        """
+        if share is None:
+            packet = InformationPacket(self._value, owner=None)
+            packet._shared = self._shared
+        elif share:
+            packet = InformationPacket(readonly_view(self._value), owner=None)
+            packet._shared = True
+        elif isinstance(self._value, memoryview):
+            packet = InformationPacket(private_copy(self._value), owner=None)
+        else:
+            packet = InformationPacket(_copy.copy(self._value), owner=None)
+        packet._trace = self._trace
+        return packet
 
 
-class EndOfStream(InformationPacket):
+
+class MarkerPacket(InformationPacket):
+    """
+    Base class for packets without payload that only
+    mark a position in a stream. Markers created without an
+    owner are interned: a single instance for each type
+    is shared by all ports and cannot be owned.
+    """
+    __slots__ = ()
+    _interned = None
+
+    def __new__(cls, owner=None):
+        if owner is None:
+            if cls.__dict__.get('_interned') is None:
+                cls._interned = super(MarkerPacket, cls).__new__(cls)
+            return cls._interned
+        else:
+            return super(MarkerPacket, cls).__new__(cls)
+
+    def __init__(self, owner=None):
+        super(MarkerPacket, self).__init__(None, owner=owner)
+
+    @property
+    def is_interned(self):
+        return self is type(self).__dict__.get('_interned')
+
+    @property
+    def owner(self):
+        return self._owner
+
+    @owner.setter
+    def owner(self, value):
+        if self.is_interned:
+            raise ValueError('{} is shared by all ports, create a new one to set its owner'.format(self))
+        InformationPacket.owner.fset(self, value)
+
+    def copy(self, share=None):
+        return type(self)()
+
+    def __reduce__(self):
+        return (type(self), ())
+
+
+class EndOfStream(MarkerPacket):
     """
     End of stream packet, to signal end of computation
     """
+    __slots__ = ()
+
     def __init__(self):
-        super(EndOfStream, self).__init__(None)
+        super(EndOfStream, self).__init__()
 
     @property
     def is_eos(self):
@@ -64,18 +207,15 @@ class Bracket(InformationPacket):
     """
     This is a bracket IP, composed of a list of IPs
     """
+    __slots__ = ()
 
     def __init__(self, owner=None):
         super(Bracket, self).__init__(value=None, owner=owner)
 
 
-class OpenBracket(InformationPacket):
+class OpenBracket(MarkerPacket):
+    __slots__ = ()
 
-    def __init__(self, owner=None):
-        super(OpenBracket, self).__init__(value=None, owner=owner)
-
-
-class CloseBracket(InformationPacket):
-    def __init__(self, owner=None):
-        super(CloseBracket, self).__init__(value=None, owner=owner)
 
+class CloseBracket(MarkerPacket):
+    __slots__ = ()
@@ -0,0 +1,170 @@
+"""
+Content-hash build cache of :class:`pyperator.shell.FileOperator` components.
+A component decides whether to run its command from the hash of the command
+and of the contents of its input files, instead of their modification times,
+so that touched, copied or restored files do not cause recomputation and
+changed contents always do. For each set of outputs, the cache records the
+hash of the work that produced them and the hashes of the files produced;
+the outputs are up to date if the hash of the work is the same and the
+files are unchanged. The index is a small JSON file in the workdir of the graph.
+Use it with :code:`Multigraph('g', cache=True)`.
+"""
+import hashlib as _hl
+import json as _json
+import os as _os
+
+#: Name of the index file in the workdir of the graph
+INDEX_NAME = '.pyperator_cache.json'
+
+
+def hash_file(path, chunk_size=1024 ** 2):
+    """
+    Returns the SHA-256 hex digest of the file at `path`,
+    read in chunks of `chunk_size` bytes.
+    """
+    digest = _hl.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as hashed_file:
+        while True:
+            n_read = hashed_file.readinto(buffer)
+            if not n_read:
+                break
+            digest.update(view[:n_read])
+    return digest.hexdigest()
+
+
+def _hash_if_file(path):
+    try:
+        return hash_file(path) if _os.path.isfile(path) else None
+    except (OSError, ValueError):
+        return None
+
+
+def work_key(command, inputs, file_hash=None):
+    """
+    Returns the hash of the work of a component: its `command` and its
+    `inputs`, a dict of {port name: value}; input values that are paths of
+    existing files are hashed by content, with `file_hash` if given, which returns
+    None for other values, the others by their representation.
+    """
+    file_hash = file_hash or _hash_if_file
+    digest = _hl.sha256(str(command).encode('utf-8'))
+    for name in sorted(inputs):
+        value = inputs[name]
+        content = file_hash(str(value))
+        digest.update('\0{}\0{}'.format(name, content or repr(value)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class BuildCache(object):
+    """
+    This class keeps the index of a build cache stored at `path`: the work
+    that produced each set of outputs and the hash of each file, which is only
+    computed again when the size, modification time or inode of the file
+    change. Hits and misses are counted for each component.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # {output paths: {'key': hash of the work, 'outputs': {path: hash}}}
+        self.entries = {}
+        # {path: [size, mtime in ns, inode, hash]}
+        self.files = {}
+        # {component name: [hits, misses]}
+        self.stats = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as index_file:
+                index = _json.load(index_file)
+        except (OSError, ValueError):
+            return
+        self.entries = index.get('entries', {})
+        self.files = index.get('files', {})
+
+    def save(self):
+        """
+        Writes the index if it changed, replacing
+        the old one atomically.
+        """
+        if not self._dirty:
+            return
+        temp_path = '{}.{}.tmp'.format(self.path, _os.getpid())
+        with open(temp_path, 'w') as index_file:
+            _json.dump({'entries': self.entries, 'files': self.files}, index_file)
+        _os.replace(temp_path, self.path)
+        self._dirty = False
+
+    def file_hash(self, path):
+        """
+        Returns the hash of the file at `path`, or None if it is not a file.
+        """
+        try:
+            stat = _os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not _os.path.isfile(path):
+            return None
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        known = self.files.get(path)
+        if known is not None and known[:3] == signature:
+            return known[3]
+        digest = hash_file(path)
+        self.files[path] = signature + [digest]
+        self._dirty = True
+        return digest
+
+    def key(self, command, inputs):
+        """
+        Returns the :func:`work_key` of `command` and `inputs`, hashing
+        the input files only when they changed.
+        """
+        return work_key(command, inputs, self.file_hash)
+
+    def _entry_name(self, outputs):
+        return '\0'.join(sorted(str(path) for path in outputs))
+
+    def known(self, outputs):
+        """
+        Returns True if the cache knows the work producing `outputs`.
+        """
+        return self._entry_name(outputs) in self.entries
+
+    def lookup(self, key, outputs):
+        """
+        Returns True if the `outputs` paths were produced by
+        the work with hash `key` and are unchanged since.
+        """
+        entry = self.entries.get(self._entry_name(outputs))
+        return (entry is not None and entry['key'] == key and
+                all(self.file_hash(str(path)) == entry['outputs'].get(str(path)) for path in outputs))
+
+    def count(self, component, hit):
+        """
+        Counts a hit, when the work of `component` is
+        skipped, or a miss, when its command is run.
+        """
+        counts = self.stats.setdefault(component.name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+    def record(self, key, outputs):
+        """
+        Records that the work with hash `key` produced the `outputs` paths.
+        """
+        self.entries[self._entry_name(outputs)] = {
+            'key': key, 'outputs': {str(path): self.file_hash(str(path)) for path in outputs}}
+        self._dirty = True
+
+    def hit_rate(self, component):
+        hits, misses = self.stats.get(component.name, (0, 0))
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def report(self):
+        """
+        Returns the hits, misses and hit rate of each component.
+        """
+        return {name: {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+                for name, (hits, misses) in self.stats.items() if hits + misses}
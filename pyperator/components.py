@@ -105,7 +105,7 @@ class Product(Component):
         async with self.outputs.OUT:
             for it, p in enumerate(self._fun(all_packets.values())):
                 # Create substream
-                substream = [IP.OpenBracket()] + [p1.copy() for p1 in p] + [IP.CloseBracket()]
+                substream = [IP.OpenBracket()] + [self.forward_copy(p1) for p1 in p] + [IP.CloseBracket()]
                 # Send packets in substream
                 for p1 in substream:
                     await self.outputs.OUT.send_packet(p1)
@@ -175,14 +175,13 @@ class Split(Component):
                 data = []
             elif isinstance(packet, IP.CloseBracket):
                 packet.drop()
-                self._log.debug(
-                    "Splitting '{}'".format(data))
+                self._log.debug("Splitting '%s'", data)
                 for (output_port_name, output_port), out_packet in zip(self.outputs.items(), data):
-                    await output_port.send_packet(out_packet.copy())
+                    await output_port.send_packet(self.forward_copy(out_packet))
             else:
                 data.append(packet)
                 await asyncio.sleep(0)
-        await asyncio.sleep(0)
+        await self.close_downstream()
 
 
 # class IterSource(Component):
@@ -254,7 +253,7 @@ class Repeat(Component):
         self.inputs.IN.close()
         with self.outputs.OUT:
             while True:
-                self.outputs.OUT.send_packet(packet.copy())
+                self.outputs.OUT.send_packet(self.forward_copy(packet))
 
 
 class Filter(Component):
@@ -287,20 +286,52 @@ class Filter(Component):
 class BroadcastApplyFunction(Component):
     """
     This component computes a function of the inputs
-    and sends it to all outputs
+    and sends it to all outputs. The function is run
+    according to the execution `policy` (see :mod:`pyperator.policies`);
+    with a pool, up to `policy.workers` calls run concurrently and the
+    results are sent in the order the inputs were received.
     """
 
-    def __init__(self, name, function):
+    def __init__(self, name, function, policy=None):
         super(BroadcastApplyFunction, self).__init__(name)
         self.function = function
+        if policy:
+            self.policy = policy
+
+    async def submit_calls(self, pending, slots):
+        try:
+            while True:
+                data = await self.receive()
+                # At most `policy.workers` calls run or wait to be sent
+                await slots.acquire()
+                await pending.put(self.execute(self.function, **data))
+                await asyncio.sleep(0)
+        except StopAsyncIteration:
+            await pending.put(None)
+
+    async def send_results(self, pending, slots):
+        # Results are sent in the order
+        # the calls were submitted
+        while True:
+            call = await pending.get()
+            if call is None:
+                return
+            transformed = await call
+            slots.release()
+            await asyncio.wait(self.send_to_all(transformed))
 
     @log_schedule
     async def __call__(self):
-        while True:
-            data = await self.receive()
-            transformed = self.function(**data)
-            self.send_to_all(transformed)
-            await asyncio.sleep(0)
+        pending = asyncio.Queue()
+        slots = asyncio.Semaphore(self.policy.workers)
+        submit = asyncio.ensure_future(self.submit_calls(pending, slots))
+        send = asyncio.ensure_future(self.send_results(pending, slots))
+        try:
+            await asyncio.gather(submit, send)
+        finally:
+            submit.cancel()
+            send.cancel()
+        raise StopAsyncIteration
 
 
 class OneOffProcess(BroadcastApplyFunction):
@@ -309,15 +340,15 @@ class OneOffProcess(BroadcastApplyFunction):
     broadcasting the result to the outputs
     """
 
-    def __init__(self, name, function):
-        super(OneOffProcess, self).__init__(name, function)
+    def __init__(self, name, function, policy=None):
+        super(OneOffProcess, self).__init__(name, function, policy=policy)
 
     @log_schedule
     async def __call__(self):
         # wait once for the data
         data = await self.receive()
         while True:
-            transformed = self.function(**data)
+            transformed = await self.execute(self.function, **data)
             data = transformed
             await asyncio.wait(self.send_to_all(data))
             await asyncio.sleep(0)
@@ -347,7 +378,7 @@ async def Once(self):
     :return: 
     """
     in_packet = await self.inputs.IN.receive_packet()
-    await self.outputs.OUT.send_packet(in_packet.copy())
+    await self.outputs.OUT.send_packet(self.forward_copy(in_packet))
     self.inputs.IN.close()
 
 
@@ -365,7 +396,7 @@ async def Repeat(self):
     in_packet= await self.inputs.IN.receive_packet()
     async with self.outputs.OUT as out:
         while True:
-            await out.send_packet(in_packet.copy())
+            await out.send_packet(self.forward_copy(in_packet))
             await asyncio.sleep(0)
 
 
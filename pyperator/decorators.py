@@ -80,21 +80,30 @@ def repeat_out(port_name):
 
 
 
-def component(func):
+def component(func=None, policy=None):
     """
     Using this decorator, any coroutine_
     function can be turned into a :class:`pyperator.nodes.components` component.
     The function should take an argument only, whose attribute will be `inputs`,
     `outputs` and `log`.
+    When used as :code:`@component(policy=ThreadPool(4))`, the synchronous functions
+    called through :code:`await self.execute(function, ...)` run according to `policy`
+    (see :mod:`pyperator.policies`).
     
     :param func: coroutine function
+    :param policy: :class:`pyperator.policies.ExecutionPolicy`
     :return: 
     
     .. _coroutine: https://docs.python.org/3/library/asyncio-task.html
     """
+    if func is None:
+        return lambda func: component(func, policy=policy)
     if  asyncio.iscoroutinefunction(func):
+        attributes = {'__call__':func, "__doc__":func.__doc__}
+        if policy:
+            attributes['policy'] = policy
         def inner(*args, **kwargs):
-            new_c = type(func.__name__,(Component,), {'__call__':func, "__doc__":func.__doc__})
+            new_c = type(func.__name__,(Component,), attributes)
             return new_c(*args, **kwargs)
         return inner
     else:
@@ -136,5 +145,5 @@ async def Once(self):
     :return: 
     """
     in_packet = await self.inputs.IN.receive_packet()
-    await self.outputs.OUT.send_packet(in_packet.copy())
+    await self.outputs.OUT.send_packet(self.forward_copy(in_packet))
     await self.inputs.IN.close()
\ No newline at end of file
@@ -90,3 +90,15 @@ class NotCoroutineError(Exception):
     def __init__(self, fun, *args, **kwargs):
         base_message = "Function {name} is not a coroutine".format(name=fun.__name__)
         BaseException.__init__(self,base_message, *args, **kwargs)
+
+
+class ExecutorError(Exception):
+    def __init__(self, *args, **kwargs):
+        BaseException.__init__(self, *args, **kwargs)
+
+
+class GraphValidationError(Exception):
+    def __init__(self, graph, problems, *args):
+        self.problems = problems
+        message = "Graph {} is not valid:\n{}".format(graph, "\n".join(problems))
+        super(GraphValidationError, self).__init__(message, *args)
@@ -1,14 +1,154 @@
-import aiohttp
+"""
+A web page showing a running :class:`pyperator.DAG.Multigraph` live. The
+server runs on the same event loop as the graph and pushes, over a WebSocket,
+the throughput and the fraction of time blocked of each component and the fill of
+each connection, together with the :meth:`pyperator.DAG.Multigraph.dot` rendering
+of the graph where components are coloured by saturation: from green
+when their input connections are empty to red when they are full, which
+marks the bottlenecks. Requires `aiohttp`.
+Use it with :code:`Multigraph('g', gui=GUI(port=8080))`.
+"""
+import asyncio
 import json
-from aiohttp import web
+import os as _os
+import time as _time
 
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
 
+from pyperator import metrics as _metrics
 
-def create_gui(page_coro):
-    #Create gui
-    gui = web.Application()
-    #
-    gui.router.add_get('/', page_coro)
-    return gui
 
-web.run_app(gui)
\ No newline at end of file
+def saturation_color(saturation):
+    """
+    Returns a colour from green (0) to red (1)
+    as a hexadecimal RGB string.
+    """
+    saturation = min(max(saturation, 0.0), 1.0)
+    return '#{:02x}{:02x}00'.format(int(255 * saturation), int(200 * (1 - saturation)))
+
+
+class GUI(object):
+    """
+    This class serves the live view of a graph on `host`:`port`,
+    sending an update every `interval` seconds to the connected pages.
+    The state is only computed while pages are connected.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8080, interval=1.0):
+        if web is None:
+            raise ImportError('The GUI requires aiohttp')
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.graph = None
+        self.sockets = set()
+        self._runner = None
+        self._pusher = None
+        self._previous = None
+
+    def attach(self, graph):
+        """
+        Makes the graph collect the metrics shown by the GUI.
+        """
+        self.graph = graph
+        if graph.metrics is None:
+            graph.metrics = _metrics.GraphMetrics(graph)
+
+    def application(self):
+        app = web.Application()
+        app.router.add_get('/', self.page)
+        app.router.add_get('/state', self.state_handler)
+        app.router.add_get('/ws', self.websocket)
+        return app
+
+    async def page(self, request):
+        path = _os.path.join(_os.path.dirname(__file__), 'gui.html')
+        return web.FileResponse(path)
+
+    async def state_handler(self, request):
+        return web.json_response(self.state())
+
+    async def websocket(self, request):
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        self.sockets.add(socket)
+        try:
+            async for message in socket:
+                pass
+        finally:
+            self.sockets.discard(socket)
+        return socket
+
+    def state(self):
+        """
+        Returns the state of the graph since the previous call: throughput in packets
+        per second and fraction of time blocked for each component, fill of each
+        connection and the dot source of the graph coloured by saturation.
+        """
+        snapshot = self.graph.snapshot()
+        now = _time.perf_counter()
+        previous, self._previous = self._previous, (now, snapshot)
+        elapsed = now - previous[0] if previous else None
+        old = {c['name']: c for c in previous[1]['components']} if previous else {}
+        saturation = {}
+        arcs = []
+        for arc in snapshot['arcs']:
+            fill = min(arc['depth'] / arc['capacity'], 1.0) if arc['capacity'] else 0.0
+            arcs.append(dict(arc, fill=fill))
+            node_name = arc['destination'].rsplit('.', 1)[0]
+            saturation[node_name] = max(saturation.get(node_name, 0.0), fill)
+        nodes = []
+        for component in snapshot['components']:
+            name = component['name']
+            packets = sum(p['packets'] for p in component['ports'].values())
+            blocked = component['blocked_receive'] + component['blocked_send']
+            throughput = blocked_fraction = 0.0
+            if name in old and elapsed:
+                packets_before = sum(p['packets'] for p in old[name]['ports'].values())
+                blocked_before = old[name]['blocked_receive'] + old[name]['blocked_send']
+                throughput = (packets - packets_before) / elapsed
+                blocked_fraction = min((blocked - blocked_before) / elapsed, 1.0)
+            nodes.append({'name': name, 'type': component['type'], 'packets': packets,
+                          'throughput': throughput, 'blocked': blocked_fraction,
+                          'saturation': saturation.get(name, 0.0)})
+        for node in self.graph.iternodes():
+            node.color = saturation_color(saturation.get(node.name, 0.0))
+        return {'graph': snapshot['graph'], 'nodes': nodes, 'arcs': arcs, 'dot': self.graph.dot()}
+
+    async def push(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.sockets:
+                try:
+                    message = json.dumps(self.state())
+                except Exception as e:
+                    self.graph.log.exception(e)
+                    continue
+                for socket in list(self.sockets):
+                    try:
+                        await socket.send_str(message)
+                    except ConnectionError:
+                        self.sockets.discard(socket)
+
+    async def start(self):
+        """
+        Starts serving on the running event loop.
+        """
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self._pusher = asyncio.ensure_future(self.push())
+        self.graph.log.info('GUI of DAG {} at http://{}:{}/'.format(self.graph.name, self.host, self.port))
+
+    async def stop(self):
+        if self._pusher is not None:
+            self._pusher.cancel()
+            await asyncio.gather(self._pusher, return_exceptions=True)
+        for socket in list(self.sockets):
+            await socket.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
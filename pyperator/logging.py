@@ -1,17 +1,188 @@
+import atexit as _atexit
 import logging as _log
+import logging.handlers as _handlers
+import os as _os
+import queue as _queue
+import threading as _threading
+
+#: If False, the log calls made for every packet by ports and
+#: components are skipped before even checking the log level,
+#: see :func:`set_production`
+trace_packets = not _os.environ.get('PYPERATOR_PRODUCTION')
+
+# Child loggers by (parent, name)
+_children = {}
 
 
 def setup_custom_logger(name , level=_log.DEBUG, file=None):
+    """
+    Configures the logger `name` to write to the standard error, and to
+    `file` if given, through a :class:`LogSink`. Calling it again for the same
+    name sets the level and adds `file` if it is new, without duplicating handlers.
+    """
     formatter = _log.Formatter(fmt='%(asctime)s  %(levelname)s- %(name)s - %(message)s')
 
-    handler = _log.StreamHandler()
-    handler.setFormatter(formatter)
-
     logger = _log.getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(handler)
-    if file:
+    sink = _sinks.get(name)
+    if sink is None:
+        sink = _sinks[name] = LogSink()
+        handler = _log.StreamHandler()
+        handler.setFormatter(formatter)
+        sink.add_handler(handler)
+        logger.addHandler(sink.queue_handler)
+    if file and _os.path.abspath(file) not in [getattr(h, 'baseFilename', None) for h in sink.handlers]:
         file_handler = _log.FileHandler(file, mode='w+')
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    return logger
\ No newline at end of file
+        sink.add_handler(file_handler)
+    return logger
+
+
+def shutdown(name=None):
+    """
+    Writes the pending records of the logger `name`, or
+    of all loggers, and stops their background threads.
+    """
+    for sink_name, sink in list(_sinks.items()):
+        if name is None or sink_name == name:
+            sink.stop()
+
+
+def get_child(parent, name):
+    """
+    Returns the child logger `name` of `parent`, like
+    :meth:`logging.Logger.getChild` but without going
+    through the logging manager after the first call.
+    """
+    try:
+        return _children[(parent, name)]
+    except KeyError:
+        child = _children[(parent, name)] = parent.getChild(name)
+        return child
+
+
+def set_production(production=True):
+    """
+    Switches the production mode on or off. In production mode the per-packet
+    debug messages are never formatted nor emitted, regardless of the log level.
+    It can also be switched on by setting the environment
+    variable `PYPERATOR_PRODUCTION`.
+    """
+    global trace_packets
+    trace_packets = not production
+
+
+class LogSink(object):
+    """
+    This class writes the log records of a logger from a background
+    thread, so that logging does not block the event loop on I/O.
+    The records are put in a queue of at most `capacity` records by a
+    :class:`logging.handlers.QueueHandler` attached to the logger and are
+    written in batches by the thread; when the queue is full the records are
+    dropped and counted. The thread is started when the first record is logged
+    and stopped by :meth:`stop`, which writes all the pending records.
+    """
+
+    def __init__(self, capacity=10000, batch_size=256):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.handlers = []
+        self.dropped = 0
+        self.queue_handler = _SinkHandler(self)
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = _threading.Lock()
+
+    def add_handler(self, handler):
+        self.handlers.append(handler)
+
+    def put(self, record):
+        if self._pid != _os.getpid():
+            # Not started yet or in a forked process, where
+            # the thread and the queue of the parent are not usable
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except _queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid != _os.getpid():
+                self._queue = _queue.Queue(self.capacity)
+                self._thread = _threading.Thread(target=self._run, name='pyperator_log_sink', daemon=True)
+                self._pid = _os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except _queue.Empty:
+                pass
+            stop = _STOP in batch
+            self._write([record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def _write(self, records):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            records.append(_log.makeLogRecord({'name': records[0].name if records else 'pyperator',
+                                               'levelno': _log.WARNING, 'levelname': 'WARNING',
+                                               'msg': '{} log records were dropped'.format(dropped)}))
+        for handler in self.handlers:
+            batch = [record for record in records if record.levelno >= handler.level]
+            if not batch:
+                continue
+            try:
+                if isinstance(handler, _log.StreamHandler):
+                    # A single write and flush for the whole batch
+                    text = "".join(handler.format(record) + handler.terminator for record in batch)
+                    with handler.lock:
+                        handler.stream.write(text)
+                        handler.flush()
+                else:
+                    for record in batch:
+                        handler.handle(record)
+            except Exception:
+                handler.handleError(batch[0])
+
+    def stop(self):
+        """
+        Writes the pending records and stops the thread.
+        """
+        with self._lock:
+            if self._pid == _os.getpid() and self._thread.is_alive():
+                self._queue.put(_STOP)
+                self._thread.join()
+            self._pid = None
+
+
+class _SinkHandler(_handlers.QueueHandler):
+
+    def __init__(self, sink):
+        super(_SinkHandler, self).__init__(None)
+        self.sink = sink
+
+    def prepare(self, record):
+        # Only merge the arguments, which could change before
+        # the record is written; formatting is left to the thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self.sink.put(record)
+
+
+# Marks the end of the records
+_STOP = object()
+
+# Sinks by logger name
+_sinks = {}
+
+_atexit.register(shutdown)
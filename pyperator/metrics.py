@@ -0,0 +1,123 @@
+"""
+Runtime metrics of a :class:`pyperator.DAG.Multigraph`: the number of packets
+and the estimated payload bytes through each port, the time each port spent
+blocked waiting for packets or for room in a full connection, the queue depth,
+high-water mark and blocked time of each connection and, for each component,
+the time spent blocked on receive, blocked on send and computing.
+Metrics are collected when the graph is created with :code:`metrics=True`,
+read with :meth:`pyperator.DAG.Multigraph.snapshot` and optionally exported
+periodically to a JSON lines file.
+"""
+import asyncio
+import json as _json
+import sys as _sys
+import time as _time
+
+
+def payload_size(value):
+    """
+    Returns an estimate of the size of
+    a packet payload in bytes.
+    """
+    if isinstance(value, memoryview):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        # numpy arrays
+        return nbytes
+    return _sys.getsizeof(value)
+
+
+class GraphMetrics(object):
+    """
+    This class collects the metrics of the components of a graph.
+    The counters are kept by the connections and the inboxes of the
+    input ports; :meth:`run` measures the lifetime of the components.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.started = {}
+        self.finished = {}
+
+    def nodes(self):
+        # Imported here to avoid a circular import
+        from pyperator.process import iter_owned
+        for node in self.graph.iternodes():
+            yield from iter_owned(node)
+
+    async def run(self, node):
+        """
+        Runs the component `node`, recording
+        when it starts and when it finishes.
+        """
+        self.started[node] = _time.perf_counter()
+        try:
+            return await node()
+        finally:
+            self.finished[node] = _time.perf_counter()
+
+    def component_snapshot(self, node, now):
+        ports = {}
+        blocked = {}
+        for direction, register in (('receive', node.inputs), ('send', node.outputs)):
+            blocked[direction] = 0.0
+            for port_name, port in register.items():
+                if port.component is not node:
+                    continue
+                connections = list(port.connections)
+                if direction == 'send':
+                    # Each packet goes through all the connections
+                    packets = max((conn.packets for conn in connections), default=0)
+                    payload = max((conn.payload_bytes() for conn in connections), default=0)
+                    port_blocked = sum(conn.blocked for conn in connections)
+                else:
+                    packets = sum(conn.packets for conn in connections)
+                    payload = sum(conn.payload_bytes() for conn in connections)
+                    port_blocked = port.inbox.blocked
+                ports[port_name] = {'packets': packets, 'bytes': payload, 'blocked': port_blocked}
+                blocked[direction] += port_blocked
+        snapshot = {'name': node.name, 'type': node.type_str(), 'ports': ports,
+                    'blocked_receive': blocked['receive'], 'blocked_send': blocked['send'],
+                    'computing': None}
+        if node in self.started:
+            elapsed = self.finished.get(node, now) - self.started[node]
+            snapshot['computing'] = max(elapsed - blocked['receive'] - blocked['send'], 0.0)
+        return snapshot
+
+    def arc_snapshot(self, port, conn):
+        destination = conn.destination
+        return {'source': '{}.{}'.format(port.component, port.name),
+                'destination': '{}.{}'.format(destination.component, destination.name),
+                'depth': conn.depth(), 'capacity': conn.capacity(), 'high_water': conn.high_water,
+                'blocked': conn.blocked}
+
+    def snapshot(self):
+        """
+        Returns the current metrics as a dictionary.
+        """
+        now = _time.perf_counter()
+        nodes = list(self.nodes())
+        arcs = [self.arc_snapshot(port, conn) for node in nodes for port in node.outputs.values()
+                for conn in port.connections if port.component is node]
+        return {'graph': self.graph.name, 'time': _time.time(),
+                'components': [self.component_snapshot(node, now) for node in nodes],
+                'arcs': arcs}
+
+    def write(self, path):
+        """
+        Appends a snapshot to the JSON lines file `path`.
+        """
+        with open(path, 'a') as metrics_file:
+            metrics_file.write(_json.dumps(self.snapshot()) + '\n')
+
+    async def export(self, path, interval):
+        """
+        Appends a snapshot to the JSON lines file
+        `path` every `interval` seconds, until cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.write(path)
@@ -1,8 +1,10 @@
 import asyncio
+import copy as _copy
 from abc import ABCMeta, abstractmethod
 
 from pyperator import IP
 from pyperator import context
+from pyperator import policies
 from pyperator.utils import PortRegister, FilePort
 import pyperator.logging as _log
 
@@ -21,6 +23,12 @@ class AbstractComponent(metaclass=ABCMeta):
 
 
 class Component(AbstractComponent):
+    # Policy used to run synchronous functions, see :meth:`execute`
+    policy = policies.Inline()
+    # Whether the packets forwarded unchanged share their payloads
+    # read-only, see :meth:`forward_copy`; None to use the setting of the graph
+    share_payloads = None
+
     def __init__(self, name):
         self.name = name
         # Input and output ports
@@ -58,12 +66,12 @@ class Component(AbstractComponent):
     @property
     def log(self):
         if self.dag:
-            return self.dag.log.getChild(self.name)
+            return _log.get_child(self.dag.log, self.name)
         else:
-            if self._log:
+            if getattr(self, '_log', None):
                 return self._log
             else:
-                return log.setup_custom_logger('buttavia')
+                return _log.setup_custom_logger('buttavia')
 
     def port_table(self):
 
@@ -129,11 +137,74 @@ class Component(AbstractComponent):
 
     def send_to_all(self, data):
         # Send
-        self.log.debug("Sending '{}' to all output ports".format(data))
+        if _log.trace_packets:
+            self.log.debug("Sending '%s' to all output ports", data)
         packets = {p: IP.InformationPacket(data, owner=self) for p, v in self.outputs.items()}
         futures = self.outputs.send_packets(packets)
         return futures
 
+    def forward_copy(self, packet):
+        """
+        Returns the copy of `packet` sent by a component forwarding it
+        unchanged. The copy refers to the same payload, unless
+        `share_payloads` is set on the component or on a graph containing it:
+        then it shares the payload through a read-only view, copied only if it is
+        modified, see :meth:`pyperator.IP.InformationPacket.copy`.
+
+        :param packet: :class:`pyperator.IP.InformationPacket`
+        :return: unowned :class:`pyperator.IP.InformationPacket`
+        """
+        share = self.share_payloads
+        graph = self.dag
+        while share is None and graph is not None:
+            share = getattr(graph, 'share_payloads', None)
+            graph = getattr(getattr(graph, 'subnet', None) or graph, 'dag', None)
+        return packet.copy(share=True) if share else packet.copy()
+
+    def execute(self, function, *args, **kwargs):
+        """
+        Runs a synchronous function according to
+        the execution policy of the component and returns
+        an :class:`asyncio.Future` of its result.
+        """
+        bound = self.__dict__.get('_bound_policy')
+        if bound is None or bound[0] is not self.policy:
+            # The pool of this component, see :meth:`pyperator.policies.ExecutionPolicy.bind`
+            bound = self._bound_policy = (self.policy, self.policy.bind())
+        return bound[1].submit(function, *args, **kwargs)
+
+    def shutdown_policy(self):
+        """
+        Shuts down the pool used by :meth:`execute`, if any;
+        it is created again if a function is executed later.
+        """
+        bound = self.__dict__.pop('_bound_policy', None)
+        if bound is not None:
+            bound[1].shutdown()
+
+    def replicate(self, name):
+        """
+        Returns a copy of the component named `name`, with the same
+        attributes and unconnected copies of its ports. Used to run
+        several replicas of the component in parallel, see
+        :class:`pyperator.replicas.ReplicaPool`. Components holding
+        mutable state should override it.
+
+        :param name: name of the replica
+        :return: :class:`pyperator.nodes.Component`
+        """
+        replica = _copy.copy(self)
+        replica.name = name
+        # Replicas do not share the pool of the component
+        replica.__dict__.pop('_bound_policy', None)
+        replica.inputs = PortRegister(replica)
+        replica.outputs = PortRegister(replica)
+        for port_name, port in self.inputs.items():
+            replica.inputs.add_as(port.replicate(), port_name)
+        for port_name, port in self.outputs.items():
+            replica.outputs.add_as(port.replicate(), port_name)
+        return replica
+
     async def active(self):
         self.color = 'green'
 
@@ -0,0 +1,107 @@
+"""
+Execution policies decide where the synchronous functions
+called by components run: inline on the event loop, on a pool of threads
+or on a pool of processes. Running them off the loop lets the
+other components progress while a slow function is computed.
+"""
+import asyncio
+import concurrent.futures as _futures
+import copy as _copy
+import functools as _ft
+from abc import ABCMeta, abstractmethod
+
+
+class ExecutionPolicy(metaclass=ABCMeta):
+    """
+    Common interface for all policies. `workers` is the
+    maximum number of calls that can usefully run concurrently.
+    """
+    workers = 1
+
+    @abstractmethod
+    def submit(self, function, *args, **kwargs):
+        """
+        Schedules `function(*args, **kwargs)` and
+        returns an :class:`asyncio.Future` of its result.
+        """
+        pass
+
+    async def run(self, function, *args, **kwargs):
+        return await self.submit(function, *args, **kwargs)
+
+    def bind(self):
+        """
+        Returns the policy used by one component, see
+        :meth:`pyperator.nodes.Component.execute`.
+        """
+        return self
+
+    def shutdown(self):
+        pass
+
+
+class Inline(ExecutionPolicy):
+    """
+    Calls the function directly on the event loop
+    """
+
+    def submit(self, function, *args, **kwargs):
+        future = asyncio.get_event_loop().create_future()
+        try:
+            future.set_result(function(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class PoolPolicy(ExecutionPolicy):
+    """
+    Base class for policies running the function
+    on a :class:`concurrent.futures.Executor`, created
+    the first time a function is submitted. Every component
+    using the policy gets a pool of its own, unless `shared`.
+    """
+    executor_type = None
+
+    def __init__(self, workers=4, shared=False):
+        self.workers = workers
+        self.shared = shared
+        self._executor = None
+
+    def bind(self):
+        if self.shared:
+            return self
+        policy = _copy.copy(self)
+        policy._executor = None
+        return policy
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = self.executor_type(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, function, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, _ft.partial(function, *args, **kwargs))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class ThreadPool(PoolPolicy):
+    """
+    Runs the function on a pool of `workers` threads. Suited
+    for blocking I/O and for functions releasing the GIL.
+    """
+    executor_type = _futures.ThreadPoolExecutor
+
+
+class ProcessPool(PoolPolicy):
+    """
+    Runs the function on a pool of `workers` processes. The function,
+    its arguments and its result must be picklable (no lambdas).
+    """
+    executor_type = _futures.ProcessPoolExecutor
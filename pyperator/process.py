@@ -0,0 +1,617 @@
+"""
+Execution of a :class:`pyperator.DAG.Multigraph` on several
+worker processes. Components are placed on workers by a :class:`Placement`;
+connections between components placed on different workers are replaced by
+connections that cross the process boundary, so that components keep using
+the same :class:`pyperator.utils.InputPort` and :class:`pyperator.utils.OutputPort` API.
+"""
+import asyncio
+import concurrent.futures as _futures
+import logging as _logging
+import multiprocessing as _mp
+import multiprocessing.connection as _mpc
+import os as _os
+import pickle as _pickle
+import struct as _struct
+import time as _time
+
+try:
+    from multiprocessing import shared_memory as _shm
+except ImportError:
+    # Python < 3.8
+    _shm = None
+
+from pyperator import logging as _log
+from pyperator.utils import ConnectionInterface, Connection
+from pyperator.exceptions import PortClosedError, ExecutorError
+
+
+def iter_owned(node):
+    """
+    Yields all the components that own ports in `node`,
+    recursively flattening graphs and subnets.
+
+    :param node: :class:`pyperator.nodes.Component`
+    """
+    for inner in node.iternodes():
+        yield inner
+        for nested in getattr(inner, 'nodes', ()):
+            yield from iter_owned(nested)
+
+
+class Placement(object):
+    """
+    This class decides on which worker process each component runs.
+    Components (or whole subnets) can be pinned to a worker with :meth:`pin`.
+    The remaining components are placed automatically on the least loaded worker,
+    counting the components already placed on it; among equally loaded workers,
+    the one running the fewest instances of the same type is chosen, so that several
+    instances of the same (typically CPU-bound) component run in parallel.
+    If `spread` is given, only instances of these types (classes or type names, as
+    returned by :meth:`pyperator.nodes.Component.type_str`) are distributed and
+    all other components run on worker 0.
+    """
+
+    def __init__(self, spread=None):
+        self.spread = tuple(spread) if spread is not None else None
+        self.pinned = {}
+
+    def is_spread(self, node):
+        if self.spread is None:
+            return True
+        classes = tuple(t for t in self.spread if isinstance(t, type))
+        return isinstance(node, classes) or node.type_str() in self.spread
+
+    def pin(self, node, worker):
+        for inner in iter_owned(node):
+            self.pinned[inner] = worker
+
+    def assign(self, nodes, n_workers):
+        """
+        Assigns a worker to each node.
+
+        :param nodes: list of :class:`pyperator.nodes.Component`
+        :param n_workers: number of worker processes
+        :return: dict of {node: worker}
+        """
+        workers = {}
+        # Number of nodes on each worker, in total and by type
+        loads = [0] * n_workers
+        type_loads = {}
+        # The pinned nodes are placed first, whatever their order
+        fixed = [node for node in nodes if node in self.pinned or not self.is_spread(node)]
+        spread = [node for node in nodes if node not in self.pinned and self.is_spread(node)]
+        for node in fixed + spread:
+            counts = type_loads.setdefault(node.type_str(), [0] * n_workers)
+            if node in self.pinned:
+                worker = self.pinned[node] % n_workers
+            elif self.is_spread(node):
+                worker = min(range(n_workers), key=lambda w: (loads[w], counts[w]))
+            else:
+                worker = 0
+            loads[worker] += 1
+            counts[worker] += 1
+            workers[node] = worker
+        assignment = {}
+        for node in nodes:
+            for inner in iter_owned(node):
+                assignment.setdefault(inner, workers[node])
+        return assignment
+
+
+class PipeConnection(ConnectionInterface):
+    """
+    This class represent a limited capacity connection between two
+    :class:`pyperator.utils.Port` living in different processes.
+    Packets are pickled through a pipe; the capacity is
+    enforced by a semaphore shared by both processes.
+    The owner of the packets is not transferred. Packets are written by
+    a thread of the sending process, so that a write blocked on a full pipe
+    does not stop the event loop of the sender from reading its own inputs.
+    """
+
+    def __init__(self, size=100):
+        self.size = size
+        self._reader, self._writer = _mp.Pipe(duplex=False)
+        self._slots = _mp.BoundedSemaphore(size)
+        # Thread writing to the pipe, created in the sending process
+        self._writer_thread = None
+        self.queue = None
+        self.source = None
+        self.destination = None
+
+    def _acquire_slot(self):
+        self._slots.acquire()
+
+    def _release_slot(self):
+        self._slots.release()
+
+    def _write(self, packet):
+        self._writer.send_bytes(_pickle.dumps(packet, protocol=_pickle.HIGHEST_PROTOCOL))
+
+    def _writing_thread(self):
+        # A single thread keeps the packets in order
+        if self._writer_thread is None:
+            self._writer_thread = _futures.ThreadPoolExecutor(max_workers=1)
+        return self._writer_thread
+
+    def _read(self):
+        return _pickle.loads(self._reader.recv_bytes())
+
+    def _poll(self):
+        return self._reader.poll()
+
+    def _fileno(self):
+        return self._reader.fileno()
+
+    async def send(self, packet):
+        if self.destination:
+            if self.destination.open:
+                if not self._slots.acquire(False):
+                    loop = asyncio.get_event_loop()
+                    start = _time.perf_counter()
+                    await loop.run_in_executor(None, self._acquire_slot)
+                    self.blocked += _time.perf_counter() - start
+                await asyncio.get_event_loop().run_in_executor(self._writing_thread(), self._write, packet)
+                self.count(packet)
+            else:
+                raise PortClosedError(self.destination)
+
+    async def send_many(self, packets):
+        for packet in packets:
+            await self.send(packet)
+
+    def capacity(self):
+        return self.size
+
+    async def pump(self):
+        """
+        Runs in the process of the destination port and moves
+        the received packets to a local queue, announcing them
+        to the inbox of the port. Returns after the end of stream.
+        """
+        loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue()
+        readable = asyncio.Event()
+        loop.add_reader(self._fileno(), readable.set)
+        try:
+            while True:
+                while self._poll():
+                    packet = self._read()
+                    self.queue.put_nowait(packet)
+                    self.destination.inbox.notify(self)
+                    if packet.is_eos:
+                        return
+                readable.clear()
+                await readable.wait()
+        finally:
+            loop.remove_reader(self._fileno())
+
+    async def receive(self):
+        packet = await self.queue.get()
+        self._release_slot()
+        return packet
+
+    def receive_nowait(self):
+        packet = self.queue.get_nowait()
+        self._release_slot()
+        return packet
+
+    def close_ends(self):
+        """
+        Closes the ends of the pipe in this process, called by the
+        process creating the connection once the workers have forked.
+        """
+        self._reader.close()
+        self._writer.close()
+
+    def release(self):
+        if self._writer_thread is not None:
+            self._writer_thread.shutdown()
+            self._writer_thread = None
+        self.close_ends()
+
+    async def join(self):
+        # Wait until all packets have been received
+        try:
+            while self._slots.get_value() < self.size:
+                await asyncio.sleep(0.01)
+        except NotImplementedError:
+            pass
+
+
+class SharedMemoryConnection(ConnectionInterface):
+    """
+    This class represent a limited capacity connection between two
+    :class:`pyperator.utils.Port` living in different processes, backed by
+    a ring buffer of `size` fixed-size slots in shared memory.
+    The sender pickles each packet directly into the next free slot, packets
+    that do not fit in a slot of `slot_size` bytes are spilled into a shared memory
+    block of their own, whose name is stored in the slot. There is a single writer
+    and a single reader, so that the ring needs no lock: the writer only advances the
+    tail and the reader only advances the head. A pipe is only used to wake up the
+    reader when it is waiting for packets. Requires Python 3.8.
+    """
+    # Offsets of tail, head and the reader waiting flag
+    # in the header, on separate cache lines
+    _TAIL, _HEAD, _WAITING = 0, 8, 16
+    _HEADER_SIZE = 192
+    # Length and flags of the packet stored in a slot
+    _SLOT_HEADER = _struct.Struct('<II')
+    _SPILLED = 1
+    _EOS = 2
+
+    def __init__(self, size=100, slot_size=8192):
+        if _shm is None:
+            raise ExecutorError('Shared memory connections require Python 3.8 or newer')
+        self.size = size
+        self.slot_size = slot_size
+        self._memory = _shm.SharedMemory(create=True, size=self._HEADER_SIZE + size * slot_size)
+        self._index = self._memory.buf[:self._HEADER_SIZE].cast('Q')
+        self._index[self._TAIL // 8] = self._index[self._HEAD // 8] = self._index[self._WAITING // 8] = 0
+        self._bell_reader, self._bell_writer = _os.pipe()
+        _os.set_blocking(self._bell_reader, False)
+        _os.set_blocking(self._bell_writer, False)
+        self._announced = 0
+        self._creator = _os.getpid()
+        self.source = None
+        self.destination = None
+
+    @property
+    def _tail(self):
+        return self._index[self._TAIL // 8]
+
+    @property
+    def _head(self):
+        return self._index[self._HEAD // 8]
+
+    def _slot(self, position):
+        start = self._HEADER_SIZE + (position % self.size) * self.slot_size
+        return self._memory.buf[start:start + self.slot_size]
+
+    def full(self):
+        return self._tail - self._head >= self.size
+
+    def depth(self):
+        return self._tail - self._head
+
+    def capacity(self):
+        return self.size
+
+    def _ring(self):
+        try:
+            _os.write(self._bell_writer, b'\0')
+        except BlockingIOError:
+            # The reader has not consumed the previous
+            # wake ups yet, it will be woken up anyway
+            pass
+
+    def _write(self, packet):
+        data = _pickle.dumps(packet, protocol=_pickle.HIGHEST_PROTOCOL)
+        flags = self._EOS if packet.is_eos else 0
+        header = self._SLOT_HEADER.size
+        slot = self._slot(self._tail)
+        try:
+            if len(data) > self.slot_size - header:
+                block = _shm.SharedMemory(create=True, size=len(data))
+                block.buf[:len(data)] = data
+                block.close()
+                data = block.name.encode()
+                flags |= self._SPILLED
+            self._SLOT_HEADER.pack_into(slot, 0, len(data), flags)
+            slot[header:header + len(data)] = data
+        finally:
+            slot.release()
+        # Publish the packet
+        self._index[self._TAIL // 8] = self._tail + 1
+        if self._index[self._WAITING // 8]:
+            self._index[self._WAITING // 8] = 0
+            self._ring()
+
+    def _read(self):
+        header = self._SLOT_HEADER.size
+        slot = self._slot(self._head)
+        try:
+            length, flags = self._SLOT_HEADER.unpack_from(slot, 0)
+            data = bytes(slot[header:header + length])
+        finally:
+            slot.release()
+        if flags & self._SPILLED:
+            block = _shm.SharedMemory(name=data.decode())
+            try:
+                data = bytes(block.buf[:block.size])
+            finally:
+                block.close()
+                block.unlink()
+        # Free the slot, once a spilled block is gone, see :meth:`release`
+        self._index[self._HEAD // 8] = self._head + 1
+        return _pickle.loads(data)
+
+    def _spilled_name(self, position):
+        """
+        Returns the name of the shared memory block of the packet
+        at `position` in the ring, or None if it was not spilled.
+        """
+        header = self._SLOT_HEADER.size
+        slot = self._slot(position)
+        try:
+            length, flags = self._SLOT_HEADER.unpack_from(slot, 0)
+            if flags & self._SPILLED:
+                return bytes(slot[header:header + length]).decode()
+            return None
+        finally:
+            slot.release()
+
+    def _is_eos(self, position):
+        slot = self._slot(position)
+        try:
+            return bool(self._SLOT_HEADER.unpack_from(slot, 0)[1] & self._EOS)
+        finally:
+            slot.release()
+
+    async def _wait_for_slot(self):
+        delay = 0.0001
+        while self.full():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+    async def send(self, packet):
+        if self.destination:
+            if self.destination.open:
+                if self.full():
+                    start = _time.perf_counter()
+                    await self._wait_for_slot()
+                    self.blocked += _time.perf_counter() - start
+                self._write(packet)
+                self.count(packet)
+            else:
+                raise PortClosedError(self.destination)
+
+    async def send_many(self, packets):
+        for packet in packets:
+            await self.send(packet)
+
+    async def pump(self):
+        """
+        Runs in the process of the destination port and announces
+        the packets published by the sender to the inbox of the port.
+        The packets stay in the ring until they are received. Returns after the end of stream.
+        """
+        loop = asyncio.get_event_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self._bell_reader, readable.set)
+        try:
+            while True:
+                while self._announced < self._tail:
+                    eos = self._is_eos(self._announced)
+                    self._announced += 1
+                    self.destination.inbox.notify(self)
+                    if eos:
+                        return
+                readable.clear()
+                self._index[self._WAITING // 8] = 1
+                if self._announced < self._tail:
+                    continue
+                try:
+                    # The timeout covers a wake up lost between
+                    # setting the flag and checking the tail
+                    await asyncio.wait_for(readable.wait(), 0.01)
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    while _os.read(self._bell_reader, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+        finally:
+            loop.remove_reader(self._bell_reader)
+
+    async def receive(self):
+        delay = 0.0001
+        while self._head >= self._tail:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.01)
+        return self._read()
+
+    def receive_nowait(self):
+        if self._head >= self._tail:
+            raise asyncio.QueueEmpty()
+        return self._read()
+
+    async def join(self):
+        # Wait until all packets have been received
+        while self._head < self._tail:
+            await asyncio.sleep(0.01)
+
+    def close_ends(self):
+        """
+        Closes the ends of the wake up pipe in this process, called by
+        the process creating the connection once the workers have forked.
+        """
+        for fd in (self._bell_reader, self._bell_writer):
+            if fd is not None:
+                try:
+                    _os.close(fd)
+                except OSError:
+                    pass
+        self._bell_reader = self._bell_writer = None
+
+    def release(self):
+        if _os.getpid() == self._creator:
+            # The packets left in the ring by a reader that failed
+            # or was cancelled own the blocks they were spilled to
+            for position in range(self._head, self._tail):
+                name = self._spilled_name(position)
+                if name is None:
+                    continue
+                try:
+                    block = _shm.SharedMemory(name=name)
+                except FileNotFoundError:
+                    continue
+                block.close()
+                block.unlink()
+        self._index.release()
+        self._memory.close()
+        if _os.getpid() == self._creator:
+            self._memory.unlink()
+        self.close_ends()
+
+
+def _replace_connection(port, old, new):
+    port.connections[port.connections.index(old)] = new
+
+
+def _failure(task):
+    """
+    Returns the exception a component task failed with, if any.
+    """
+    if not task.done() or task.cancelled():
+        return None
+    e = task.exception()
+    return e if isinstance(e, Exception) and not isinstance(e, StopAsyncIteration) else None
+
+
+async def _wait_components(tasks):
+    # Waits for the components, stopping at the first failure: the
+    # components of this worker may wait for the failed one forever
+    pending = set(tasks)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+        if any(_failure(task) for task in done):
+            break
+    return pending
+
+
+def _run_worker(graph, nodes, incoming):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    graph.loop = loop
+    pumps = [loop.create_task(conn.pump()) for conn in incoming]
+    tasks = [loop.create_task(node()) for node in nodes]
+    pending = loop.run_until_complete(_wait_components(tasks))
+    for task in list(pending) + pumps:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*pending, *pumps, return_exceptions=True))
+    loop.close()
+    # The connections between the components of this worker, those
+    # crossing processes are released by the executor
+    for node in nodes:
+        for owner in iter_owned(node):
+            for port in owner.outputs.values():
+                if port.component is owner:
+                    for conn in port.connections:
+                        if isinstance(conn, Connection):
+                            conn.release()
+    failed = False
+    for node, task in zip(nodes, tasks):
+        e = _failure(task)
+        if e is not None:
+            graph.log.error("Component {} failed: {!r}".format(node, e))
+            failed = True
+    return failed
+
+
+def _worker_main(graph, nodes, incoming):
+    try:
+        failed = _run_worker(graph, nodes, incoming)
+    except BaseException as e:
+        graph.log.exception(e)
+        failed = True
+    # Exit without running the cleanup inherited from the parent
+    _log.shutdown()
+    _logging.shutdown()
+    _os._exit(1 if failed else 0)
+
+
+class ProcessExecutor(object):
+    """
+    This executor runs a :class:`pyperator.DAG.Multigraph` on a pool of
+    `workers` processes, created by forking the current process once the graph is built.
+    Each worker runs its components on its own event loop; connections between components
+    placed on different workers are replaced by instances of `connection`
+    (by default :class:`PipeConnection`, or :class:`SharedMemoryConnection`) with the same capacity;
+    they must use the 'block' overflow policy and a bounded capacity. A worker stops its
+    components as soon as one of them fails; if a worker fails, the other workers are terminated.
+    Use it by passing it to the graph: :code:`Multigraph('g', executor=ProcessExecutor(8))`.
+    """
+
+    def __init__(self, workers=None, placement=None, connection=PipeConnection):
+        self.workers = workers or _mp.cpu_count()
+        self.placement = placement or Placement()
+        self.connection = connection
+
+    def pin(self, node, worker):
+        self.placement.pin(node, worker)
+
+    def split(self, graph):
+        """
+        Places the nodes of the graph on the workers and replaces
+        the connections crossing between workers.
+
+        :return: list of (nodes, incoming connections) for each worker
+        """
+        nodes = list(graph.iternodes())
+        assignment = self.placement.assign(nodes, self.workers)
+        plan = [([], []) for i in range(self.workers)]
+        for node in nodes:
+            plan[assignment[node]][0].append(node)
+        for owner, worker in assignment.items():
+            for port in owner.outputs.values():
+                for conn in list(port.connections):
+                    if not isinstance(conn, Connection):
+                        continue
+                    destination = conn.destination
+                    dest_worker = assignment.get(destination.component, 0)
+                    if dest_worker != worker:
+                        if type(conn) is not Connection or not conn.queue.maxsize:
+                            raise ExecutorError(
+                                'The connection from {} to {} cannot cross worker processes, only bounded '
+                                "connections with the 'block' overflow policy can, place both components "
+                                'on the same worker'.format(port, destination))
+                        new_conn = self.connection(size=conn.queue.maxsize)
+                        new_conn.source = conn.source
+                        new_conn.destination = destination
+                        _replace_connection(port, conn, new_conn)
+                        _replace_connection(destination, conn, new_conn)
+                        plan[dest_worker][1].append(new_conn)
+        return plan
+
+    def run(self, graph):
+        try:
+            context = _mp.get_context('fork')
+        except ValueError:
+            raise ExecutorError('The process executor requires the "fork" start method')
+        plan = self.split(graph)
+        graph.log.info('Starting DAG on {} worker processes'.format(self.workers))
+        processes = []
+        for worker, (nodes, incoming) in enumerate(plan):
+            if nodes:
+                graph.log.info('Worker {} runs {}'.format(worker, nodes))
+                process = context.Process(target=_worker_main, args=(graph, nodes, incoming),
+                                          name='{}_worker_{}'.format(graph.name, worker))
+                process.start()
+                processes.append(process)
+        # Only the workers use the connections
+        for nodes, incoming in plan:
+            for conn in incoming:
+                conn.close_ends()
+        failed = []
+        running = {process.sentinel: process for process in processes}
+        while running and not failed:
+            for sentinel in _mpc.wait(list(running)):
+                process = running.pop(sentinel)
+                process.join()
+                if process.exitcode != 0:
+                    failed.append(process.name)
+        # The other workers may wait for the failed one forever
+        for process in running.values():
+            process.terminate()
+        for process in running.values():
+            process.join()
+        for nodes, incoming in plan:
+            for conn in incoming:
+                conn.release()
+        if failed:
+            e = ExecutorError('Worker processes {} failed'.format(failed))
+            graph.log.error(e)
+            raise e
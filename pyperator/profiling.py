@@ -0,0 +1,188 @@
+"""
+Attribution of CPU time to the components of a :class:`pyperator.DAG.Multigraph`.
+All the components share one event loop, so a profiler sees their work interleaved;
+the :class:`Profiler` instead wraps the coroutine of each component and measures
+the CPU time of the thread between two of its awaits, charging it to the component
+and to the subnets and replica pools containing it. Optionally, the stack is also
+sampled at regular intervals of CPU time to record which functions the running component
+is executing: with a profiling timer signal on the main thread of Unix systems,
+else with a thread, which only takes samples when the event loop lets it run.
+The result is written as collapsed stacks, one :code:`graph;subnet;component count`
+line per stack, the input format of flame graph tools such as `flamegraph.pl`_ or `speedscope`_.
+Use it with :code:`Multigraph('g', profiler=Profiler('profile.folded'))`.
+
+.. _flamegraph.pl: https://github.com/brendangregg/FlameGraph
+.. _speedscope: https://www.speedscope.app
+"""
+import signal as _signal
+import sys as _sys
+import threading as _threading
+import time as _time
+
+
+class _Profiled(object):
+    """
+    Awaitable running the coroutine `coro` step by step,
+    charging the CPU time of each step to `stack`.
+    """
+
+    def __init__(self, profiler, stack, coro):
+        self.profiler = profiler
+        self.stack = stack
+        self.coro = coro
+
+    def __await__(self):
+        profiler, stack, coro = self.profiler, self.stack, self.coro
+        value, error = None, None
+        while True:
+            profiler._running = stack
+            start = _time.thread_time()
+            try:
+                if error is None:
+                    future = coro.send(value)
+                else:
+                    future = coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                profiler.cpu[stack] = profiler.cpu.get(stack, 0.0) + _time.thread_time() - start
+                profiler._running = None
+            try:
+                value, error = (yield future), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+
+class Profiler(object):
+    """
+    This class measures the CPU time spent by each component of a graph. If
+    `interval` is given, the stack of the running component is sampled every
+    `interval` seconds of CPU time. The collapsed stacks are written to `path`, if given, when
+    the graph stops.
+    """
+
+    def __init__(self, path=None, interval=None):
+        self.path = path
+        self.interval = interval
+        # CPU seconds by stack of graph, subnet and component names
+        self.cpu = {}
+        # Number of samples by stack, extended with the sampled functions
+        self.samples = {}
+        self.stacks = {}
+        self._running = None
+        self._sampler = None
+        self._handler = None
+        self._stopped = _threading.Event()
+
+    def attach(self, graph):
+        """
+        Finds the stack of each component of `graph`, recursing
+        into subnets and replica pools.
+        """
+        for node in graph.iternodes():
+            names = []
+            parent = node.dag
+            # Replica pools containing the component
+            while parent is not None and parent is not graph:
+                names.append(parent.name)
+                parent = getattr(parent, 'dag', None)
+            self._attach(node, (graph.name,) + tuple(reversed(names)))
+
+    def _attach(self, node, parents):
+        stack = parents + (node.name,)
+        self.stacks[node] = stack
+        # Subnets run their nodes themselves
+        for inner in getattr(node, 'nodes', ()):
+            for flat in inner.iternodes():
+                self._attach(flat, stack)
+
+    async def profile(self, node, coro):
+        """
+        Runs the coroutine `coro` of `node`, charging its CPU time to `node`.
+        """
+        stack = self.stacks.get(node, (node.name,))
+        return await _Profiled(self, stack, coro)
+
+    def start(self):
+        """
+        Starts sampling the current thread, if an interval was given.
+        """
+        if self.interval is None or self._sampler is not None or self._handler is not None:
+            return
+        if hasattr(_signal, 'setitimer') and _threading.current_thread() is _threading.main_thread():
+            self._handler = _signal.signal(_signal.SIGPROF, self._on_signal)
+            _signal.setitimer(_signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self._stopped.clear()
+            target = _threading.get_ident()
+            self._sampler = _threading.Thread(target=self._sample_thread, args=(target,),
+                                              name='pyperator-profiler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        """
+        Stops sampling and writes the collapsed stacks to `path`.
+        """
+        if self._handler is not None:
+            _signal.setitimer(_signal.ITIMER_PROF, 0)
+            _signal.signal(_signal.SIGPROF, self._handler)
+            self._handler = None
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+            self._sampler = None
+        if self.path:
+            self.write(self.path)
+
+    def _on_signal(self, signum, frame):
+        self._sample(frame)
+
+    def _sample_thread(self, target):
+        while not self._stopped.wait(self.interval):
+            self._sample(_sys._current_frames().get(target))
+
+    def _sample(self, frame):
+        stack = self._running
+        if stack is None or frame is None:
+            return
+        boundary = _Profiled.__await__.__code__
+        functions = []
+        while frame is not None and frame.f_code is not boundary:
+            functions.append(frame.f_code.co_name)
+            frame = frame.f_back
+        if frame is None:
+            # The component stopped running while sampling
+            return
+        key = stack + tuple(reversed(functions))
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+    def inclusive(self):
+        """
+        Returns the CPU seconds of every component and of every
+        subnet or graph, including the components they contain.
+        """
+        totals = {}
+        for stack, seconds in self.cpu.items():
+            for depth in range(1, len(stack) + 1):
+                totals[stack[:depth]] = totals.get(stack[:depth], 0.0) + seconds
+        return totals
+
+    def collapsed(self):
+        """
+        Returns the collapsed stacks: the sampled stacks with their number
+        of samples if the sampler ran, else the stacks of the components with
+        their CPU time in microseconds.
+        """
+        if self.samples:
+            counts = self.samples
+        else:
+            counts = {stack: int(seconds * 1e6) for stack, seconds in self.cpu.items()}
+        return ['{} {}'.format(';'.join(stack), count) for stack, count in sorted(counts.items()) if count]
+
+    def write(self, path):
+        with open(path, 'w') as profile_file:
+            for line in self.collapsed():
+                profile_file.write(line + '\n')
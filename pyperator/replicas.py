@@ -0,0 +1,146 @@
+"""
+Parallel processes: a component is replicated several times,
+the incoming packets are balanced among the replicas and the
+outputs are merged back in the original order.
+"""
+import asyncio
+import collections as _coll
+import itertools as _iter
+
+from pyperator import context
+from pyperator.nodes import Component
+from pyperator.utils import InputPort, OutputPort
+
+
+class Dispatch(Component):
+    """
+    This component receives a packet from each of its input ports, assigns
+    the set of packets a sequence number and sends it to the replica with the
+    fewest outstanding sets. The sequence numbers are recorded in
+    the :class:`Merge` components so that the outputs can be reordered.
+    """
+
+    def __init__(self, name, n_replicas, merges):
+        super(Dispatch, self).__init__(name)
+        self.n_replicas = n_replicas
+        self.merges = merges
+
+    def replica_port(self, port_name, replica):
+        return self.outputs['{}_{}'.format(port_name, replica)]
+
+    def choose_replica(self, seq):
+        if self.merges:
+            outstanding = self.merges[0].outstanding
+            return min(range(self.n_replicas), key=lambda i: len(outstanding[i]))
+        else:
+            return seq % self.n_replicas
+
+    async def __call__(self):
+        try:
+            for seq in _iter.count():
+                packets = await self.receive_packets()
+                replica = self.choose_replica(seq)
+                for merge in self.merges:
+                    merge.outstanding[replica].append(seq)
+                for port_name, packet in packets.items():
+                    await self.replica_port(port_name, replica).send_packet(self.forward_copy(packet))
+                await asyncio.sleep(0)
+        except StopAsyncIteration:
+            self.log.debug("Dispatched all packets, closing replicas")
+            await self.close_downstream()
+
+
+class Merge(Component):
+    """
+    This component receives the outputs of the replicas on the ports
+    `IN_0`, `IN_1`, ... and sends them to `OUT` in the order of the
+    sequence numbers assigned by :class:`Dispatch`.
+    """
+
+    def __init__(self, name, n_replicas):
+        super(Merge, self).__init__(name)
+        # Sequence numbers dispatched to each replica
+        # and not yet received back
+        self.outstanding = [_coll.deque() for i in range(n_replicas)]
+        for i in range(n_replicas):
+            self.inputs.add(InputPort('IN_{}'.format(i)))
+        self.outputs.add(OutputPort('OUT'))
+        self._next = 0
+        self._done = {}
+        self._lock = None
+
+    async def collect(self, replica):
+        async for packet in self.inputs['IN_{}'.format(replica)]:
+            seq = self.outstanding[replica].popleft()
+            self._done[seq] = packet
+            async with self._lock:
+                while self._next in self._done:
+                    await self.outputs.OUT.send_packet(self.forward_copy(self._done.pop(self._next)))
+                    self._next += 1
+
+    async def __call__(self):
+        self._lock = asyncio.Lock()
+        async with self.outputs.OUT:
+            await asyncio.gather(*[self.collect(i) for i in range(len(self.outstanding))])
+
+
+class ReplicaPool(Component):
+    """
+    This component runs `n_replicas` copies of `node` in parallel (the FBP
+    "parallel process" pattern). It exposes the same ports as `node`: the sets
+    of input packets are balanced among the replicas by a :class:`Dispatch` and
+    the outputs of each port are restored to the original order by a :class:`Merge`.
+    The replicated component must send exactly one packet to each output
+    port for each set of input packets it receives.
+    The replicas are obtained with :meth:`pyperator.nodes.Component.replicate`,
+    `node` itself being the first one. Ports with an initial packet are
+    not dispatched, every replica receives the initial packet.
+    Usually created with :code:`graph.add_node(node, replicas=n)`.
+    """
+
+    def __init__(self, node, n_replicas):
+        super(ReplicaPool, self).__init__(node.name)
+        if not any(port._iip is None for port in node.inputs.values()):
+            raise ValueError('Component {} has no input ports to dispatch, it cannot be replicated'.format(node))
+        # Do not add the inner components to the
+        # graph defined by the context manager
+        old_dag = context._global_dag
+        context._global_dag = None
+        try:
+            self.replicas = [node] + [node.replicate('{}_{}'.format(node.name, i)) for i in range(1, n_replicas)]
+            self.merges = {}
+            for port_name in node.outputs.keys():
+                merge = Merge('{}_merge_{}'.format(node.name, port_name), n_replicas)
+                self.merges[port_name] = merge
+            self.dispatch = Dispatch('{}_dispatch'.format(node.name), n_replicas, list(self.merges.values()))
+        finally:
+            context._global_dag = old_dag
+        for port_name, port in node.inputs.items():
+            if port._iip:
+                continue
+            self.dispatch.inputs.add(InputPort(port_name))
+            self.inputs.export(self.dispatch.inputs[port_name], port_name)
+            for i, replica in enumerate(self.replicas):
+                out = OutputPort('{}_{}'.format(port_name, i))
+                self.dispatch.outputs.add(out)
+                out.connect(replica.inputs[port_name])
+        for port_name, merge in self.merges.items():
+            self.outputs.export(merge.outputs.OUT, port_name)
+            for i, replica in enumerate(self.replicas):
+                replica.outputs[port_name].connect(merge.inputs['IN_{}'.format(i)])
+        for inner in self.iternodes():
+            inner.dag = self
+
+    def iternodes(self):
+        yield self.dispatch
+        for replica in self.replicas:
+            yield from replica.iternodes()
+        yield from self.merges.values()
+
+    def iterarcs(self):
+        # Arcs between the dispatch, the replicas and the merges
+        for node in self.iternodes():
+            for port in node.outputs.values():
+                for conn in port.iterends():
+                    if conn.destination.component.dag is self:
+                        yield (port, conn.destination)
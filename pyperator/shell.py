@@ -1,21 +1,21 @@
 import asyncio
+import collections as _coll
 import collections.abc as _collabc
 import hashlib as _hl
 import os
 import pathlib as _path
-import shutil
 import subprocess as _sub
-import tempfile as _temp
+import uuid as _uuid
 import re as _re
 
 
 from pyperator import IP
+from pyperator import cache as _cache
 from pyperator.decorators import log_schedule
 from pyperator.exceptions import FormatterError, FileNotExistingError, CommandFailedError
 from pyperator.nodes import Component
 from pyperator.utils import Wildcards, InputPort,OutputPort
 
-import itertools as _iter
 
 port_pattern = _re.compile(r"\{(?P<type>inputs|outputs|params)\.(?P<port_name>\w+)(\.\w+)*\}")
 
@@ -72,6 +72,95 @@ def make_async_call(cmd, stderr, stdout):
     return asyncio.create_subprocess_shell(cmd, stdout=stdout, stderr=stderr)
 
 
+def find_graph(component, attribute):
+    """
+    Returns the innermost graph containing `component` whose `attribute`
+    is set, else the outermost graph containing it, used for settings shared
+    by all the components of a graph. Returns None outside of a graph.
+    """
+    graph = component.dag
+    outermost = None
+    while graph is not None:
+        if getattr(graph, attribute, None) is not None:
+            return graph
+        if hasattr(graph, attribute):
+            outermost = graph
+        graph = getattr(getattr(graph, 'subnet', None) or graph, 'dag', None)
+    return outermost
+
+
+def physical_memory():
+    """
+    Returns the physical memory of the machine in
+    bytes, or None if it cannot be determined.
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class SubprocessPool(object):
+    """
+    This class limits the commands run at the same time by the :class:`Shell`
+    components of a graph, see :meth:`Shell.subprocess_pool`. Each command takes
+    `cores` of the `slots` of the pool, by default the number of CPU cores, and
+    `memory` bytes of its `memory`, by default the physical memory of the machine.
+    A command waits until enough slots and memory are free; a command asking
+    for more than the whole pool runs alone.
+    """
+
+    def __init__(self, slots=None, memory=None):
+        self.slots = slots or os.cpu_count() or 1
+        self.memory = memory if memory is not None else physical_memory()
+        self.used_slots = 0
+        self.used_memory = 0
+        self.running = 0
+        # Most commands that ran at the same time
+        self.peak = 0
+        self._condition = None
+        self._loop = None
+
+    @property
+    def condition(self):
+        # Conditions belong to an event loop, a graph can be run more than once
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _fits(self, cores, memory):
+        if self.used_slots + cores > self.slots:
+            return False
+        return self.memory is None or self.used_memory + memory <= self.memory
+
+    async def acquire(self, cores=1, memory=None):
+        """
+        Waits until `cores` slots and `memory` bytes are free and takes them.
+
+        :return: the slots and memory taken, to be given to :meth:`release`
+        """
+        cores = min(cores, self.slots)
+        memory = memory or 0
+        if self.memory is not None:
+            memory = min(memory, self.memory)
+        async with self.condition:
+            await self.condition.wait_for(lambda: self._fits(cores, memory))
+            self.used_slots += cores
+            self.used_memory += memory
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        return cores, memory
+
+    async def release(self, cores, memory):
+        async with self.condition:
+            self.used_slots -= cores
+            self.used_memory -= memory
+            self.running -= 1
+            self.condition.notify_all()
+
+
 def normalize_path_to_workdir(path, workdir):
     """
     Normalizes a path and returns an output path relative
@@ -84,8 +173,88 @@ def normalize_path_to_workdir(path, workdir):
     return os.path.normpath(workdir + os.path.basename(path))
 
 
-def check_missing(path, workdir):
-    return not os.path.exists(normalize_path_to_workdir(path, workdir))
+class StatCache(object):
+    """
+    This class caches the modification times of the files checked by the
+    :class:`FileOperator` components of a graph during a run, so that files
+    used by many components or packets are only checked once. Once
+    `scan_after` paths of a directory have been checked, the directory is
+    listed with :func:`os.scandir` and files that are not in the listing are
+    known to be missing without checking them. The paths written by a
+    command must be given to :meth:`invalidate`.
+    """
+    #: Paths checked in a directory before it is listed
+    scan_after = 64
+
+    def __init__(self):
+        # {path: modification time, None if missing}
+        self._mtimes = {}
+        # {directory: names in the directory, None if not listed yet}
+        self._listings = {}
+        self._checked = {}
+
+    def _listing(self, directory):
+        if directory in self._listings:
+            return self._listings[directory]
+        checked = self._checked.get(directory, 0) + 1
+        self._checked[directory] = checked
+        if checked < self.scan_after:
+            return None
+        try:
+            with os.scandir(directory or os.curdir) as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            names = None
+        self._listings[directory] = names
+        return names
+
+    def mtime(self, path):
+        """
+        Returns the modification time of `path`, or None if it does not exist.
+        """
+        try:
+            return self._mtimes[path]
+        except KeyError:
+            pass
+        directory, name = os.path.split(path)
+        names = self._listing(directory)
+        if names is not None and name not in names:
+            mtime = None
+        else:
+            try:
+                mtime = os.stat(path).st_mtime
+            except (OSError, ValueError):
+                mtime = None
+        self._mtimes[path] = mtime
+        return mtime
+
+    def exists(self, path):
+        return self.mtime(path) is not None
+
+    def invalidate(self, paths):
+        """
+        Forgets what is known about `paths`, which have been written.
+        """
+        for path in paths:
+            self._mtimes.pop(path, None)
+            directory, name = os.path.split(path)
+            names = self._listings.get(directory)
+            if names is not None:
+                # The file may exist now, it will be checked
+                names.add(name)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    #If it is not a file, there is no time
+    except (OSError, ValueError):
+        return None
+
+
+def check_missing(path, workdir, stats=None):
+    path = normalize_path_to_workdir(path, workdir)
+    return not (stats.exists(path) if stats is not None else os.path.exists(path))
 
 def check_older(ancestor, current):
     try:
@@ -97,17 +266,30 @@ def check_older(ancestor, current):
         return False
 
 
-def list_missing(out_packets, workdir):
+def list_missing(out_packets, workdir, stats=None):
     return {port: packet for port, packet in out_packets.items() if
-            check_missing(str(packet), workdir)}
+            check_missing(str(packet), workdir, stats)}
 
-def list_modified(out_packets, in_packets):
-    new_ancestors = set()
+def list_modified(out_packets, in_packets, stats=None):
+    """
+    Returns the input packets newer than any of the output packets,
+    and the output packets older than any input packet. Each file is only
+    checked once, with the :class:`StatCache` `stats` if given.
+    """
+    mtime = stats.mtime if stats is not None else _mtime
+    in_mtimes = [(in_packet, mtime(str(in_packet))) for in_port, in_packet in in_packets.items()]
+    newest = max((in_mtime for in_packet, in_mtime in in_mtimes if in_mtime is not None), default=None)
     to_redo = {}
-    for (out_port, out_packet), (in_port, in_packet) in _iter.product(out_packets.items(), in_packets.items()):
-        if check_older(str(in_packet), str(out_packet)):
-            new_ancestors.add(in_packet)
+    if newest is None:
+        return set(), to_redo
+    oldest = None
+    for out_port, out_packet in out_packets.items():
+        out_mtime = mtime(str(out_packet))
+        if out_mtime is not None and out_mtime < newest:
             to_redo[out_port] = out_packet
+            oldest = out_mtime if oldest is None else min(oldest, out_mtime)
+    new_ancestors = {in_packet for in_packet, in_mtime in in_mtimes
+                     if in_mtime is not None and oldest is not None and in_mtime > oldest}
     return new_ancestors, to_redo
 
 
@@ -126,30 +308,45 @@ class PacketRegister(_collabc.Mapping):
 
     def copy_temp(self):
         """
-        Create a temporary copy of
-        each input and output
-        packet and returns a copied :class:`PacketRegister`.
-        Each packet that behaves in a "path-like"
-        manner will receive a new tempfile attached.
+        Returns a :class:`PacketRegister` with a temporary path for each
+        packet, a hidden file in the directory of the path of the packet,
+        so that it is on the same filesystem and :meth:`finalize_temp` can rename
+        it. The name of the file is kept at the end of the temporary path,
+        for commands that decide the format of a file from its extension.
         
         :return: 
         """
-        # Create temporary file
         paths = {}
         for k, v in self._packets.items():
-            paths[k] = IP.InformationPacket(_path.Path(_temp.NamedTemporaryFile(delete=True).name))
+            directory, name = os.path.split(str(v.value))
+            temp_path = os.path.join(directory, '.pyperator-{}.{}'.format(_uuid.uuid4().hex[:12], name))
+            paths[k] = IP.InformationPacket(_path.Path(temp_path), owner=None)
         self._temp_packets = PacketRegister(paths)
         return self._temp_packets
 
     def finalize_temp(self):
         """
-        This is used to copy the temporary files
-        to the final destination
+        Moves the temporary files to the paths of the packets with
+        :func:`os.replace`, which is atomic and does not copy them.
+        If any temporary file is missing, none of them is moved.
         :return: 
         """
-        for (k_temp, v_temp), (k_final, v_final) in zip(self._temp_packets.items(), self.items()):
-            if not os.path.exists(str(v_final)):
-                shutil.copy(str(v_temp), str(v_final))
+        missing = [self[k] for k, v_temp in self._temp_packets.items() if not os.path.exists(str(v_temp))]
+        if missing:
+            self.discard_temp()
+            raise FileNotExistingError("Following files are missing {}, check the command".format(missing))
+        for k, v_temp in self._temp_packets.items():
+            os.replace(str(v_temp), str(self[k]))
+        self._temp_packets = {}
+
+    def discard_temp(self):
+        """
+        Removes the temporary files, leaving the paths of the packets as they were.
+        """
+        for k, v_temp in self._temp_packets.items():
+            if os.path.lexists(str(v_temp)):
+                os.unlink(str(v_temp))
+        self._temp_packets = {}
 
     def __getitem__(self, item):
         if item in self._packets:
@@ -175,16 +372,14 @@ class PacketRegister(_collabc.Mapping):
     def __str__(self):
         return self._packets.__str__()
 
-    # Context manager: creates temporary files
+    # Context manager: creates temporary files, moved to
+    # the paths of the packets only if no exception is raised
     def __enter__(self):
         return self.copy_temp()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if exc_val:
-            print(exc_val)
-            for name, packet in self._temp_packets.items():
-                del packet
-            raise (exc_val)
+        if exc_val is not None:
+            self.discard_temp()
         else:
             self.finalize_temp()
 
@@ -201,14 +396,24 @@ class FileOperator(Component):
     If check_older=True, the modification date of files
     are compared and things are redone whenever an input file is
     newer than any existing output.
+    Up to `concurrency` sets of input packets are processed at the
+    same time, their outputs are still sent in the order of the inputs.
+    If staging=True, `produce_outputs` writes to temporary files next to the
+    outputs, which replace them only if it succeeds, so that a failed or
+    interrupted command never leaves partial outputs that look up to date.
     """
 
-    def __init__(self, name, check_older=False):
+    def __init__(self, name, check_older=False, concurrency=1, staging=False):
         super(FileOperator, self).__init__(name)
         self.output_formatters = {}
         # Input ports may have wildcard expressions attached
         self.wildcard_expressions = {}
         self.check_older = check_older
+        self.concurrency = concurrency
+        self.staging = staging
+        # Output ports sending packets while the outputs are
+        # produced, which have no path, see :class:`Shell`
+        self.stream_ports = set()
 
 
     def FixedFormatter(self, port, path):
@@ -261,6 +466,8 @@ class FileOperator(Component):
         out_paths = {}
         wildcards = self.parse_wildcards(received_data)
         for out, out_port in self.outputs.items():
+            if out in self.stream_ports:
+                continue
             try:
                 current_formatter = self.output_formatters[out]
             except KeyError:
@@ -296,22 +503,88 @@ class FileOperator(Component):
     def produce_outputs(self, input_packets, output_packets, wildcards):
         pass
 
-    @log_schedule
-    async def __call__(self):
-        while True:
-            # Wait for all upstram to be completed
-            received_packets = await self.receive_packets()
-            # Generate output paths
-            out_paths, wildcards = self.generate_output_paths(received_packets)
-            out_packets = self.generate_packets(out_paths)
+    def command(self, input_packets, output_packets, wildcards):
+        """
+        Returns a description of the work done to produce the outputs,
+        hashed by the build cache together with the inputs.
+        """
+        return '{}.{}'.format(type(self).__module__, type(self).__qualname__)
+
+    def cache(self):
+        """
+        Returns the :class:`pyperator.cache.BuildCache` of the graph, if it has one.
+        """
+        graph = find_graph(self, 'build_cache')
+        return graph.build_cache if graph is not None else None
+
+    def artifact_store(self):
+        """
+        Returns the :class:`pyperator.store.ArtifactStore` of the graph, if it has one.
+        """
+        graph = find_graph(self, 'store')
+        return graph.store if graph is not None else None
+
+    def artifact_key(self, input_packets, output_packets, wildcards):
+        """
+        Returns the hash of the work of a set of input packets in an artifact
+        store: the :meth:`command` and the inputs, the files by content, with the
+        workdir left out of the paths so that graphs with different workdirs
+        share the outputs of the same work.
+        """
+        root = os.path.normpath(self.dag.workdir)
+        relative = lambda value: str(value).replace(root + os.sep, '') if root != os.curdir else str(value)
+        inputs = {port: value for port, value in input_packets.items()}
+        inputs.update({'outputs.{}'.format(port): relative(value) for port, value in output_packets.items()})
+        cache = self.cache()
+        return _cache.work_key(relative(self.command(input_packets, output_packets, wildcards)), inputs,
+                               cache.file_hash if cache is not None else None)
+
+    def stat_cache(self):
+        """
+        Returns the :class:`StatCache` of the current run of the graph.
+        """
+        graph = find_graph(self, 'stat_cache')
+        if graph is None:
+            return None
+        if graph.stat_cache is None:
+            graph.stat_cache = StatCache()
+        return graph.stat_cache
+
+    async def process(self, received_packets):
+        """
+        Produces the outputs of a set of input packets, unless they
+        are up to date, and returns the output packets. With a build cache,
+        outputs it knows are up to date if the work producing them is the
+        same, see :mod:`pyperator.cache`, otherwise if they exist and,
+        with `check_older`, are newer than the inputs. With an artifact
+        store, outputs that are not up to date are restored from it if the same
+        work was published, else produced and published, see :mod:`pyperator.store`.
+        """
+        # Generate output paths
+        out_paths, wildcards = self.generate_output_paths(received_packets)
+        out_packets = self.generate_packets(out_paths)
+        inputs_obj = PacketRegister(received_packets)
+        cache = self.cache()
+        if cache is not None:
+            key = cache.key(self.command(inputs_obj, out_packets, wildcards), dict(inputs_obj))
+            outputs = list(out_packets.values())
+        if cache is not None and cache.known(outputs):
+            # The contents decide, whatever the modification times
+            run = not cache.lookup(key, outputs)
+            if run:
+                self.log.warn("Inputs or outputs changed since '{}' were produced, command will be run".format(
+                    outputs))
+        else:
+            stats = self.stat_cache()
             # Check for missing packet
-            missing = list_missing(out_packets, self.dag.workdir)
+            missing = list_missing(out_packets, self.dag.workdir, stats)
             #Check for modified ancestors
             if self.check_older:
-                modified_ancestors, to_redo = list_modified(out_packets, PacketRegister(received_packets))
+                modified_ancestors, to_redo = list_modified(out_packets, inputs_obj, stats)
             else:
                 to_redo = {}
-            if missing or to_redo:
+            run = bool(missing or to_redo)
+            if run:
                 self.log.warn("Output files '{}' do not exist not exist, command will be run".format(
                     [
                         packet
@@ -326,37 +599,116 @@ class FileOperator(Component):
                         packet
                         in
                         to_redo.values()]))
-                inputs_obj = PacketRegister(received_packets)
-                # Produce the outputs using the tempfile
-                # context manager
-                # with out_packets as temp_out:
-                new_out = await self.produce_outputs(inputs_obj, out_packets, wildcards)
-
-                # Check if the output files exist
-                missing_after = list_missing(out_packets, self.dag.workdir)
-                if missing_after:
-                    missing_err = "Following files are missing {}, check the command".format(
-                        [packet for packet in missing_after.values()])
-                    self.log.error(missing_err)
-                    raise FileNotExistingError(missing_err)
-
+        if not out_paths:
+            # No files to be up to date, e.g. only the stdout is used
+            run = True
+        store = self.artifact_store()
+        if run and store is not None and out_paths:
+            store_key = self.artifact_key(inputs_obj, out_packets, wildcards)
+            if store.restore(store_key, out_paths):
+                self.log.info("Outputs '{}' restored from the artifact store, command will not be run".format(
+                    list(out_paths.values())))
+                run = False
+                stats = self.stat_cache()
+                if stats is not None:
+                    stats.invalidate(out_paths.values())
+                if cache is not None:
+                    cache.record(key, outputs)
+            elif not self.staging:
+                # Never write into outputs restored as links to the store,
+                # staged outputs replace them instead
+                store.unlink(out_paths.values())
+        if cache is not None:
+            cache.count(self, not run)
+        if run:
+            if self.staging:
+                # The outputs are written to temporary files, moved
+                # to the output paths only if the command succeeds
+                with out_packets as temp_out:
+                    await self.produce_outputs(inputs_obj, temp_out, wildcards)
             else:
-                self.log.debug("All output files exist, command will not be run")
-                new_out = out_packets
-            await asyncio.wait(self.send_packets(out_packets.as_dict()))
-            await asyncio.sleep(0)
+                await self.produce_outputs(inputs_obj, out_packets, wildcards)
+            stats = self.stat_cache()
+            if stats is not None:
+                stats.invalidate(str(packet) for packet in out_packets.values())
+
+            # Check if the output files exist
+            missing_after = list_missing(out_packets, self.dag.workdir, stats)
+            if missing_after:
+                missing_err = "Following files are missing {}, check the command".format(
+                    [packet for packet in missing_after.values()])
+                self.log.error(missing_err)
+                raise FileNotExistingError(missing_err)
+            if cache is not None:
+                cache.record(key, outputs)
+            if store is not None and out_paths:
+                store.publish(store_key, out_paths)
+        else:
+            self.log.debug("All output files exist, command will not be run")
+            if cache is not None and not cache.known(outputs):
+                # Outputs produced before the cache was used
+                cache.record(key, outputs)
+        return out_packets
+
+    async def send_outputs(self, out_packets):
+        """
+        Sends the packets of the output files, the
+        `stream_ports` have sent theirs already.
+        """
+        futures = [asyncio.ensure_future(self.outputs[port].send_packet(packet))
+                   for port, packet in out_packets.as_dict().items()]
+        if futures:
+            await asyncio.wait(futures)
+
+    @log_schedule
+    async def __call__(self):
+        # Input packets being processed, oldest first
+        running = _coll.deque()
+        try:
+            while True:
+                # Wait for all upstram to be completed
+                received_packets = await self.receive_packets()
+                running.append(asyncio.ensure_future(self.process(received_packets)))
+                while running and (len(running) >= self.concurrency or running[0].done()):
+                    out_packets = await running.popleft()
+                    await self.send_outputs(out_packets)
+                await asyncio.sleep(0)
+        except StopAsyncIteration:
+            while running:
+                out_packets = await running.popleft()
+                await self.send_outputs(out_packets)
+            # The streams end with the inputs, once received downstream
+            for port in self.stream_ports:
+                await self.outputs[port].close()
+            raise
+        finally:
+            for task in running:
+                task.cancel()
 
 
 class Shell(FileOperator):
     """
     This component executes a shell script with inputs and outputs
     the command can contain normal ports and FilePorts
-    for input and output
+    for input and output.
+    Each command takes `cores` slots and `memory` bytes of the
+    :class:`SubprocessPool` of the graph while it runs.
+    The output of the command is not kept in memory: stderr is logged
+    line by line at debug level, keeping the last `stderr_tail` lines for the error message
+    if the command fails, and so is stdout, unless `stdout` names an
+    output port, which receives it while the command runs as
+    packets of up to `chunk_size` bytes between brackets.
     """
 
-    def __init__(self, name, cmd, **kwargs):
+    def __init__(self, name, cmd, cores=1, memory=None, stdout=None, chunk_size=2 ** 16, stderr_tail=20,
+                 **kwargs):
         super(Shell, self).__init__(name, **kwargs)
         self.cmd = cmd
+        self.cores = cores
+        self.memory = memory
+        self.stdout = stdout
+        self.chunk_size = chunk_size
+        self.stderr_tail = stderr_tail
         self.output_formatters = {}
         # Input ports may have wildcard expressions attached
         self.wildcard_expressions = {}
@@ -367,25 +719,98 @@ class Shell(FileOperator):
         #from the command
         [self.inputs.add(InputPort(name)) for name in new_ports['inputs']]
         [self.outputs.add(OutputPort(name)) for name in new_ports['outputs']]
+        if stdout is not None:
+            if self.concurrency != 1:
+                raise ValueError('The stdout of commands run at the same time cannot be sent to one port')
+            if stdout not in self.outputs:
+                self.outputs.add(OutputPort(stdout))
+            self.stream_ports.add(stdout)
 
 
 
+    def subprocess_pool(self):
+        """
+        Returns the :class:`SubprocessPool` of the innermost graph containing
+        this component that has one, else the pool of the outermost graph,
+        created with the default size. The `subprocesses` of a graph can
+        also be given as a number of slots.
+
+        :return: :class:`SubprocessPool` or None outside of a graph
+        """
+        graph = find_graph(self, 'subprocesses')
+        if graph is None:
+            return None
+        if not isinstance(graph.subprocesses, SubprocessPool):
+            graph.subprocesses = SubprocessPool(graph.subprocesses)
+        return graph.subprocesses
+
+    def command(self, input_packets, output_packets, wildcards):
+        return self.cmd.format(inputs=input_packets, outputs=output_packets, wildcards=wildcards)
+
+    async def log_lines(self, stream, name, tail=None):
+        """
+        Logs the lines of the `stream` of a command while it runs,
+        keeping the last ones in the deque `tail`, if given.
+        """
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # Longer than the buffer of the stream, which dropped it
+                line = b'[line too long]\n'
+            if not line:
+                return
+            line = line.decode('utf-8', 'replace').rstrip('\n')
+            self.log.debug('%s: %s', name, line)
+            if tail is not None:
+                tail.append(line)
+
+    async def send_stdout(self, stream):
+        """
+        Sends the stdout of a command as it is
+        written, between an open and a close bracket.
+        """
+        port = self.outputs[self.stdout]
+        await port.send_packet(IP.OpenBracket())
+        while True:
+            chunk = await stream.read(self.chunk_size)
+            if not chunk:
+                break
+            await port.send_packet(IP.InformationPacket(chunk, owner=self))
+        await port.send_packet(IP.CloseBracket())
+
     async def produce_outputs(self, input_packets, output_packets, wildcards):
-        formatted_cmd = self.cmd.format(inputs=input_packets, outputs=output_packets, wildcards=wildcards)
+        formatted_cmd = self.command(input_packets, output_packets, wildcards)
         self.log.info("Executing command {}".format(formatted_cmd))
         # Define stdout and stderr pipes
         stdout = asyncio.subprocess.PIPE
         stderr = asyncio.subprocess.PIPE
-        proc = await make_async_call(formatted_cmd, stderr, stdout)
-        stdout, stderr = await proc.communicate()
+        tail = _coll.deque(maxlen=self.stderr_tail)
+        pool = self.subprocess_pool()
+        reserved = await pool.acquire(self.cores, self.memory) if pool is not None else None
+        proc = None
+        try:
+            proc = await make_async_call(formatted_cmd, stderr, stdout)
+            if self.stdout is not None:
+                read_stdout = self.send_stdout(proc.stdout)
+            else:
+                read_stdout = self.log_lines(proc.stdout, 'stdout')
+            await asyncio.gather(read_stdout, self.log_lines(proc.stderr, 'stderr', tail))
+            await proc.wait()
+        finally:
+            if proc is not None and proc.returncode is None:
+                # Cancelled or failed to send the output
+                proc.kill()
+                await proc.wait()
+            if reserved is not None:
+                await pool.release(*reserved)
         if proc.returncode != 0:
-            fail_str = "running command '{}' failed with output: \n {}".format(formatted_cmd, stderr.strip())
+            fail_str = "running command '{}' failed with output: \n {}".format(formatted_cmd, '\n'.join(tail))
             e = CommandFailedError(self, fail_str)
             self.log.error(e)
             raise e
         else:
-            success_str = "Command successfully run, with output: {}".format(self.name, stdout)
-            self.log.info(success_str)
+            self.log.info("Command successfully run")
             return output_packets
 
 
@@ -0,0 +1,228 @@
+"""
+Content-addressed store of the files produced by :class:`pyperator.shell.FileOperator`
+components, shared by graphs running on different machines. When a component
+runs its command, the files it produced are published to the store under the
+hash of their contents, together with a manifest mapping the hash of the work,
+see :meth:`pyperator.shell.FileOperator.artifact_key`, to the hash of the file of each
+output port. A component that would run the same work elsewhere restores its
+outputs from the store instead. Where the store lives is decided by a backend:
+:class:`DirectoryBackend` keeps it in a directory, e.g. on a shared filesystem,
+and other backends, such as an object store, implement :class:`ArtifactBackend`.
+Use it with :code:`Multigraph('g', store='/shared/store')`.
+"""
+import json as _json
+import os as _os
+import shutil as _shutil
+import uuid as _uuid
+
+from pyperator import cache as _cache
+
+
+class ArtifactBackend(object):
+    """
+    Interface of the backends of an :class:`ArtifactStore`, storing
+    objects by name, like the buckets of an object store. Names are
+    relative paths made of hex digits and slashes.
+    """
+
+    def exists(self, name):
+        """
+        Returns True if the object `name` is stored.
+        """
+        raise NotImplementedError
+
+    def upload(self, path, name):
+        """
+        Stores the file at `path` as the object `name`.
+        """
+        raise NotImplementedError
+
+    def download(self, name, path):
+        """
+        Writes the object `name` to the file at `path`, replacing it
+        atomically. Returns False if the object is not stored.
+        """
+        raise NotImplementedError
+
+    def read(self, name):
+        """
+        Returns the bytes of the object `name`, or None if it is not stored.
+        """
+        raise NotImplementedError
+
+    def write(self, name, data):
+        """
+        Stores `data` as the object `name`.
+        """
+        raise NotImplementedError
+
+    def is_link(self, path, name):
+        """
+        Returns True if the file at `path` is the object `name` itself,
+        restored as a link, so that writing to the file would change the object.
+        """
+        return False
+
+
+def _temp_path(path):
+    return '{}.{}.tmp'.format(path, _uuid.uuid4().hex)
+
+
+class DirectoryBackend(ArtifactBackend):
+    """
+    This backend stores the objects as read-only files under the directory
+    `root`. Objects are restored as hard links, so that restoring does not copy
+    the file, or copied if `link` is False or the file cannot be linked, e.g.
+    because the store is on another filesystem.
+    """
+
+    def __init__(self, root, link=True):
+        self.root = root
+        self.link = link
+
+    def path(self, name):
+        return _os.path.join(self.root, *name.split('/'))
+
+    def exists(self, name):
+        return _os.path.isfile(self.path(name))
+
+    def _replace(self, name, write):
+        path = self.path(name)
+        _os.makedirs(_os.path.dirname(path), exist_ok=True)
+        temp_path = _temp_path(path)
+        try:
+            write(temp_path)
+            _os.chmod(temp_path, 0o444)
+            _os.replace(temp_path, path)
+        finally:
+            if _os.path.exists(temp_path):
+                _os.unlink(temp_path)
+
+    def upload(self, path, name):
+        # Copied, the produced file may be changed afterwards
+        self._replace(name, lambda temp_path: _shutil.copyfile(path, temp_path))
+
+    def download(self, name, path):
+        stored = self.path(name)
+        if not _os.path.isfile(stored):
+            return False
+        temp_path = _temp_path(path)
+        try:
+            linked = False
+            if self.link:
+                try:
+                    _os.link(stored, temp_path)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                _shutil.copyfile(stored, temp_path)
+            _os.replace(temp_path, path)
+        finally:
+            if _os.path.lexists(temp_path):
+                _os.unlink(temp_path)
+        return True
+
+    def is_link(self, path, name):
+        try:
+            return _os.path.samefile(path, self.path(name))
+        except OSError:
+            return False
+
+    def read(self, name):
+        try:
+            with open(self.path(name), 'rb') as stored:
+                return stored.read()
+        except OSError:
+            return None
+
+    def write(self, name, data):
+        def write_data(temp_path):
+            with open(temp_path, 'wb') as stored:
+                stored.write(data)
+        self._replace(name, write_data)
+
+
+class ArtifactStore(object):
+    """
+    This class publishes the outputs of components to the `backend` and restores
+    them from it. The contents of each file are stored once as
+    :code:`objects/<hash>` and the outputs of each work as :code:`keys/<hash of the work>`,
+    a JSON manifest of {output port: hash}. Restored and published files are counted.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = {'restored': 0, 'published': 0}
+
+    @staticmethod
+    def _object_name(digest):
+        return 'objects/{}/{}'.format(digest[:2], digest[2:])
+
+    @staticmethod
+    def _manifest_name(key):
+        return 'keys/{}/{}'.format(key[:2], key[2:])
+
+    def manifest(self, key):
+        """
+        Returns the {output port: hash} manifest of the work
+        with hash `key`, or None if it was not published.
+        """
+        data = self.backend.read(self._manifest_name(key))
+        if data is None:
+            return None
+        try:
+            return _json.loads(data.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def restore(self, key, outputs):
+        """
+        Restores the outputs of the work with hash `key` to the paths `outputs`,
+        a dict of {output port: path}. Returns False, without restoring
+        anything, unless all of them were published. The restored files
+        keep the modification time of the objects, the build cache of the
+        graph records them as up to date.
+        """
+        manifest = self.manifest(key)
+        if manifest is None or set(manifest) != set(outputs):
+            return False
+        if not all(self.backend.exists(self._object_name(digest)) for digest in manifest.values()):
+            return False
+        for port, path in outputs.items():
+            # The modification time is the one of the object, which may be
+            # linked elsewhere too and is not changed
+            if not self.backend.download(self._object_name(manifest[port]), str(path)):
+                return False
+        self.stats['restored'] += len(outputs)
+        return True
+
+    def unlink(self, paths):
+        """
+        Removes the files among `paths` that are objects of the store restored
+        as links, before a command writes to these paths. Other files are kept.
+        """
+        for path in paths:
+            try:
+                if _os.stat(str(path)).st_nlink < 2:
+                    continue
+            except OSError:
+                continue
+            if self.backend.is_link(str(path), self._object_name(_cache.hash_file(str(path)))):
+                _os.unlink(str(path))
+
+    def publish(self, key, outputs):
+        """
+        Publishes the files `outputs`, a dict of {output port: path},
+        as the outputs of the work with hash `key`.
+        """
+        manifest = {}
+        for port, path in outputs.items():
+            digest = _cache.hash_file(str(path))
+            name = self._object_name(digest)
+            if not self.backend.exists(name):
+                self.backend.upload(str(path), name)
+                self.stats['published'] += 1
+            manifest[port] = digest
+        # Written last, the objects it refers to are stored
+        self.backend.write(self._manifest_name(key), _json.dumps(manifest, sort_keys=True).encode('utf-8'))
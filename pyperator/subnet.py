@@ -15,10 +15,11 @@ class SubIn(Component):
 
 
     async def __call__(self):
-        while True:
-            pack = await self.inputs.IN.receive_packet()
-            await self.outputs.OUT.send_packet(pack.copy())
+        async for pack in self.inputs.IN:
+            await self.outputs.OUT.send_packet(self.forward_copy(pack))
             await asyncio.sleep(0)
+        # Forward the end of stream
+        await self.outputs.OUT.close()
 
 class SubOut(SubIn):
     """
@@ -49,33 +50,41 @@ class Subnet(Component):
         #Add nodes
 
         g = cls(graph.name)
-        #Copy the graph
-        #Add an input for each exported inport
-        for (in_name, in_port) in graph.inputs.items():
-            #Now add a SubIn
-            sub = SubIn('in_'+in_name)
-            graph.add_node(sub)
-            #Export the subin
-            g.inputs.export(sub.inputs.IN,in_name)
-            #connect subin and real port
-            graph.connect(sub.outputs.OUT, in_port)
-        for (out_name, out_port) in graph.outputs.items():
-            #Now add a SubIn
-            sub = SubIn('out_'+out_name)
-            graph.add_node(sub)
-            #Export the subin
-            g.outputs.export(sub.outputs.OUT,out_name)
-            #connect subin and real port
-            graph.connect(out_port,sub.inputs.IN)
+        # The boundary components belong to the inner graph only,
+        # not to the graph the subnet is being added to
+        with graph:
+            #Copy the graph
+            #Add an input for each exported inport
+            for (in_name, in_port) in graph.inputs.items():
+                #Now add a SubIn
+                sub = SubIn('in_'+in_name)
+                graph.add_node(sub)
+                #Export the subin
+                g.inputs.export(sub.inputs.IN,in_name)
+                #connect subin and real port
+                graph.connect(sub.outputs.OUT, in_port)
+            for (out_name, out_port) in graph.outputs.items():
+                #Now add a SubIn
+                sub = SubIn('out_'+out_name)
+                graph.add_node(sub)
+                #Export the subin
+                g.outputs.export(sub.outputs.OUT,out_name)
+                #connect subin and real port
+                graph.connect(out_port,sub.inputs.IN)
         g.nodes = graph._nodes
+        graph.subnet = g
         return g
 
 
     async def __call__(self):
+        # Nested subnets run their nodes like the graph running this one
+        run_node = getattr(self, '_run_node', None) or self.dag.run_node
         for node in self.nodes:
             self.log.info("Component {} is a subnet, it will add its nodes to the"
                           " current executor.".format(self.name))
-            self.dag.loop.create_task(node())
+            if isinstance(node, Subnet):
+                node._run_node = run_node
+            asyncio.ensure_future(run_node(node))
 
 
 
@@ -7,17 +7,33 @@ from pyperator.components import GeneratorSource, ShowInputs, BroadcastApplyFunc
 from pyperator import components
 from pyperator.nodes import Component
 import asyncio
+import logging
 from pyperator.utils import InputPort, OutputPort, FilePort, Wildcards
 from pyperator import IP
 import pyperator.subnet
+import pyperator.process
+import pyperator.policies
 
 import pyperator.decorators
+import pyperator.logging
+import pyperator.gui
+import pyperator.tracing
+import pyperator.profiling
+import pyperator.store
 
 import os
+import socket
+import unittest
+import json
 import uuid
 
 
 import tempfile
+import random
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 
 import networkx as nx
 
@@ -54,6 +70,1691 @@ class TestPacket(TestCase):
         b = a.copy()
         print(a,b)
 
+    def testSlots(self):
+        for packet in [IP.InformationPacket('a'), IP.EndOfStream(), IP.OpenBracket(), IP.CloseBracket(owner='c')]:
+            self.assertFalse(hasattr(packet, '__dict__'))
+
+    def testSharedMarkers(self):
+        self.assertIs(IP.EndOfStream(), IP.EndOfStream())
+        self.assertIs(IP.OpenBracket(), IP.OpenBracket())
+        self.assertIsNot(IP.OpenBracket(), IP.CloseBracket())
+        with self.assertRaises(ValueError):
+            IP.EndOfStream().owner = 'c'
+        owned = IP.OpenBracket(owner='c')
+        self.assertIsNot(owned, IP.OpenBracket())
+        self.assertEqual(owned.owner, 'c')
+        self.assertIsNone(IP.OpenBracket().owner)
+
+class TestZeroCopy(TestCase):
+
+    def testSharedCopy(self):
+        payload = bytearray(b'payload')
+        copied = IP.InformationPacket(payload).copy(share=True)
+        self.assertIs(copied.value.obj, payload)
+        with self.assertRaises(TypeError):
+            copied.value[0] = 0
+        writable = copied.writable_value()
+        writable[0] = 0
+        self.assertEqual(payload, bytearray(b'payload'))
+        self.assertIs(copied.writable_value(), writable)
+
+    def testEagerCopy(self):
+        payload = bytearray(b'payload')
+        copied = IP.InformationPacket(payload).copy(share=False)
+        self.assertIsNot(copied.value, payload)
+        self.assertEqual(copied.value, payload)
+        # The eager copy keeps the type of the payload
+        self.assertIsInstance(copied.value, bytearray)
+        copied.value[0] = 0
+        self.assertEqual(payload, bytearray(b'payload'))
+
+    def testDefaultCopy(self):
+        payload = bytearray(b'payload')
+        # The default copy refers to the same payload
+        self.assertIs(IP.InformationPacket(payload).copy().value, payload)
+        shared = IP.InformationPacket(payload).copy(share=True).copy()
+        self.assertIsInstance(shared.writable_value(), bytearray)
+        self.assertIsNot(shared.writable_value(), payload)
+
+    def testForwardCopy(self):
+        payload = bytearray(b'payload')
+        packet = IP.InformationPacket(payload)
+        outer = Multigraph('outer', log_level=logging.CRITICAL)
+        inner = Multigraph('inner', log_level=logging.CRITICAL)
+        outer.add_node(inner)
+        stage = pyperator.subnet.SubIn('stage')
+        inner.add_node(stage)
+        self.assertIs(stage.forward_copy(packet).value, payload)
+        # Sharing is enabled by a graph containing the component
+        outer.share_payloads = True
+        self.assertIs(stage.forward_copy(packet).value.obj, payload)
+        inner.share_payloads = False
+        self.assertIs(stage.forward_copy(packet).value, payload)
+        # Or by the component itself
+        stage.share_payloads = True
+        self.assertIsInstance(stage.forward_copy(packet).value, memoryview)
+
+    def testSubnetChain(self):
+        graph = Multigraph('chain', log_level=logging.CRITICAL)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        stages = [pyperator.subnet.SubIn('stage_{}'.format(i)) for i in range(10)]
+        graph.connect(source.outputs.OUT, stages[0].inputs.IN)
+        for previous, following in zip(stages[:-1], stages[1:]):
+            graph.connect(previous.outputs.OUT, following.inputs.IN)
+        graph.connect(stages[-1].outputs.OUT, sink.inputs.IN)
+        payload = bytearray(2 ** 20)
+
+        async def run():
+            tasks = [asyncio.ensure_future(stage()) for stage in stages]
+            tracemalloc.start()
+            await source.outputs.OUT.send_packet(IP.InformationPacket(payload).copy(share=True))
+            received = await sink.inputs.IN.receive_packet()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            [task.cancel() for task in tasks]
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return received, peak
+
+        loop = asyncio.new_event_loop()
+        received, peak = loop.run_until_complete(run())
+        loop.close()
+        #The payload crossed the chain without being duplicated
+        self.assertIs(received.value.obj, payload)
+        self.assertLess(peak, len(payload))
+
+
+class TestProcessExecutor(TestCase):
+
+    def run_pipeline(self, payload_size=0, **kwargs):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def numbers(self):
+            async with self.outputs.OUT:
+                for i in range(20):
+                    await self.outputs.OUT.send((i, b'x' * payload_size))
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def square(self):
+            async with self.outputs.OUT:
+                async for packet in self.inputs.IN:
+                    i, payload = packet.value
+                    await self.outputs.OUT.send((os.getpid(), i ** 2, len(payload)))
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            result_path = os.path.join(tempdir, 'result.txt')
+
+            @pyperator.decorators.inport('IN')
+            @pyperator.decorators.component
+            async def write(self):
+                with open(result_path, 'w') as result:
+                    async for packet in self.inputs.IN:
+                        result.write("{} {} {}\n".format(*packet.value))
+
+            executor = pyperator.process.ProcessExecutor(workers=2, **kwargs)
+            g = Multigraph('processes', log_level=logging.CRITICAL, executor=executor)
+            source = numbers('numbers')
+            squarer = square('square')
+            writer = write('write')
+            g.connect(source.outputs.OUT, squarer.inputs.IN)
+            g.connect(squarer.outputs.OUT, writer.inputs.IN)
+            executor.pin(source, 0)
+            executor.pin(squarer, 1)
+            executor.pin(writer, 0)
+            g()
+            with open(result_path) as result:
+                lines = [line.split() for line in result]
+        self.assertEqual([int(value) for pid, value, size in lines], [i ** 2 for i in range(20)])
+        self.assertEqual([int(size) for pid, value, size in lines], [payload_size] * 20)
+        #The squares were computed in another process
+        self.assertEqual(len(set(pid for pid, value, size in lines)), 1)
+        self.assertNotEqual(int(lines[0][0]), os.getpid())
+
+    def testPipeline(self):
+        self.run_pipeline()
+
+    def testSharedMemory(self):
+        connection = lambda size: pyperator.process.SharedMemoryConnection(size=size, slot_size=512)
+        self.run_pipeline(connection=connection)
+        #Packets larger than a slot are spilled
+        self.run_pipeline(payload_size=4096, connection=connection)
+
+    @unittest.skipIf(pyperator.process._shm is None, 'shared memory requires Python 3.8')
+    def testSpilledBlocks(self):
+        from multiprocessing import shared_memory
+        connection = pyperator.process.SharedMemoryConnection(size=4, slot_size=256)
+        for payload in (b'x' * 1024, b'x', b'x' * 1024):
+            connection._write(IP.InformationPacket(payload))
+        names = [connection._spilled_name(position) for position in range(3)]
+        self.assertIsNone(names[1])
+        # The first packet is read, the others are left by the reader
+        self.assertEqual(connection._read().value, b'x' * 1024)
+        connection.release()
+        for name in (names[0], names[2]):
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+
+    def testFailedWorker(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def failing(self):
+            raise ValueError('failed')
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def wait(self):
+            async for packet in self.inputs.IN:
+                pass
+
+        executor = pyperator.process.ProcessExecutor(workers=2)
+        g = Multigraph('failing', log_level=logging.CRITICAL, executor=executor)
+        source = failing('failing')
+        sink = wait('wait')
+        g.connect(source.outputs.OUT, sink.inputs.IN)
+        executor.pin(source, 1)
+        executor.pin(sink, 0)
+        start = time.time()
+        with self.assertRaises(pyperator.exceptions.ExecutorError):
+            g()
+        self.assertLess(time.time() - start, 5)
+
+    def testFailedComponent(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def failing(self):
+            await self.outputs.OUT.send(0)
+            raise ValueError('failed')
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def wait(self):
+            async for packet in self.inputs.IN:
+                pass
+
+        # Both components run on the same worker
+        executor = pyperator.process.ProcessExecutor(workers=1)
+        g = Multigraph('failing', log_level=logging.CRITICAL, executor=executor)
+        source = failing('failing')
+        sink = wait('wait')
+        g.connect(source.outputs.OUT, sink.inputs.IN)
+        start = time.time()
+        with self.assertRaises(pyperator.exceptions.ExecutorError):
+            g()
+        self.assertLess(time.time() - start, 5)
+
+    def testPlacement(self):
+        class A(Component):
+            pass
+
+        class B(Component):
+            pass
+
+        placement = pyperator.process.Placement()
+        # Components of different types run in parallel
+        nodes = [A('a'), B('b'), Component('c')]
+        self.assertEqual(sorted(placement.assign(nodes, 4).values()), [0, 1, 2])
+        # Instances of the same type are spread among equally loaded workers
+        a1, b1, a2, b2 = A('a1'), B('b1'), A('a2'), B('b2')
+        assignment = placement.assign([a1, b1, a2, b2], 2)
+        self.assertNotEqual(assignment[a1], assignment[a2])
+        self.assertNotEqual(assignment[b1], assignment[b2])
+        # Pinned components count in the load of their worker
+        placement.pin(b2, 0)
+        assignment = placement.assign([a1, a2, b2], 2)
+        self.assertEqual([assignment[a1], assignment[a2], assignment[b2]], [1, 0, 0])
+
+    def testLargePayloads(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def payloads(self):
+            async with self.outputs.OUT:
+                for i in range(10):
+                    await self.outputs.OUT.send(bytes([i]) * 2 ** 20)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def relay(self):
+            async with self.outputs.OUT:
+                async for packet in self.inputs.IN:
+                    await self.outputs.OUT.send(packet.value)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            result_path = os.path.join(tempdir, 'result.txt')
+
+            @pyperator.decorators.inport('IN')
+            @pyperator.decorators.component
+            async def write(self):
+                with open(result_path, 'w') as result:
+                    async for packet in self.inputs.IN:
+                        result.write("{} {}\n".format(packet.value[0], len(packet.value)))
+
+            executor = pyperator.process.ProcessExecutor(workers=2)
+            g = Multigraph('large', log_level=logging.CRITICAL, executor=executor)
+            source, relayer, writer = payloads('source'), relay('relay'), write('write')
+            g.connect(source.outputs.OUT, relayer.inputs.IN)
+            g.connect(relayer.outputs.OUT, writer.inputs.IN)
+            # Packets larger than the pipe buffer go both ways between the workers
+            executor.pin(source, 0)
+            executor.pin(relayer, 1)
+            executor.pin(writer, 0)
+            start = time.time()
+            g()
+            self.assertLess(time.time() - start, 30)
+            with open(result_path) as result:
+                lines = [line.split() for line in result]
+        self.assertEqual(lines, [[str(i), str(2 ** 20)] for i in range(10)])
+
+    def testPolicy(self):
+        executor = pyperator.process.ProcessExecutor(workers=2)
+        g = Multigraph('policy', log_level=logging.CRITICAL, executor=executor)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        g.connect(source.outputs.OUT, sink.inputs.IN, overflow='drop_newest')
+        executor.pin(source, 0)
+        executor.pin(sink, 1)
+        with self.assertRaises(pyperator.exceptions.ExecutorError):
+            executor.split(g)
+
+
+class TestPolicies(TestCase):
+
+    def run_apply(self, function, policy, values):
+        graph = Multigraph('apply', log_level=logging.CRITICAL)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        apply = BroadcastApplyFunction('apply', function, policy=policy)
+        apply.inputs.add(InputPort('x'))
+        apply.outputs.add(OutputPort('y'))
+        graph.connect(source.outputs.OUT, apply.inputs.x)
+        graph.connect(apply.outputs.y, sink.inputs.IN)
+
+        async def run():
+            task = asyncio.ensure_future(apply())
+            for value in values:
+                await source.outputs.OUT.send(value)
+            received = [(await sink.inputs.IN.receive_packet()).value for value in values]
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return received
+
+        loop = asyncio.new_event_loop()
+        received = loop.run_until_complete(run())
+        loop.close()
+        apply.shutdown_policy()
+        return received
+
+    def testThreadPoolOrder(self):
+        main_thread = threading.get_ident()
+
+        def slow(x=None):
+            time.sleep(0.05 * (x % 3))
+            return (x, threading.get_ident() != main_thread)
+
+        received = self.run_apply(slow, pyperator.policies.ThreadPool(4), list(range(12)))
+        self.assertEqual(received, [(i, True) for i in range(12)])
+
+    def testInline(self):
+        received = self.run_apply(lambda x=None: x + 1, pyperator.policies.Inline(), list(range(5)))
+        self.assertEqual(received, list(range(1, 6)))
+
+    def testComponentPolicy(self):
+        @pyperator.decorators.component(policy=pyperator.policies.ThreadPool(2))
+        async def threaded(self):
+            return await self.execute(threading.get_ident)
+
+        c = threaded('threaded')
+        loop = asyncio.new_event_loop()
+        ident = loop.run_until_complete(c())
+        loop.close()
+        c.shutdown_policy()
+        self.assertNotEqual(ident, threading.get_ident())
+
+    def testConcurrency(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def slow(x=None):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return x
+
+        class Wide(pyperator.policies.ThreadPool):
+            # More threads than calls allowed, to count the calls submitted
+            executor_type = staticmethod(lambda max_workers: ThreadPoolExecutor(8))
+
+        received = self.run_apply(slow, Wide(2), list(range(10)))
+        self.assertEqual(received, list(range(10)))
+        self.assertEqual(running[1], 2)
+
+    def testPerComponentPool(self):
+        policy = pyperator.policies.ThreadPool(2)
+
+        @pyperator.decorators.component(policy=policy)
+        async def threaded(self):
+            await self.execute(threading.get_ident)
+            self.pool = self._bound_policy[1]
+            self.executor = self.pool._executor
+
+        graph = Multigraph('pools', log_level=logging.CRITICAL)
+        a, b = threaded('a'), threaded('b')
+        graph.add_node(a)
+        graph.add_node(b)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        # Each component had its own pool, shut down with the graph
+        self.assertIsNot(a.executor, b.executor)
+        self.assertIsNone(policy._executor)
+        self.assertEqual([a.pool._executor, b.pool._executor], [None, None])
+        shared = pyperator.policies.ThreadPool(2, shared=True)
+        self.assertIs(shared.bind(), shared)
+
+
+class Delay(Component):
+
+    def __init__(self, name):
+        super(Delay, self).__init__(name)
+        self.inputs.add(InputPort('IN'))
+        self.outputs.add(OutputPort('OUT'))
+        # Currently and maximum running
+        self.running = [0, 0]
+
+    async def __call__(self):
+        async with self.outputs.OUT:
+            async for packet in self.inputs.IN:
+                self.running[0] += 1
+                self.running[1] = max(self.running)
+                await asyncio.sleep(random.uniform(0, 0.02))
+                self.running[0] -= 1
+                await self.outputs.OUT.send(packet.value * 2)
+
+
+class TestReplicas(TestCase):
+
+    def testOrder(self):
+        graph = Multigraph('replicas', log_level=logging.CRITICAL)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        delay = Delay('delay')
+        pool = graph.add_node(delay, replicas=4)
+        graph.connect(source.outputs.OUT, pool.inputs.IN)
+        graph.connect(pool.outputs.OUT, sink.inputs.IN)
+        self.assertEqual(len(pool.replicas), 4)
+        self.assertNotIn(delay, graph._nodes)
+        self.assertEqual(len(list(graph.iternodes())), 2 + 4 + 2)
+
+        async def run():
+            tasks = [asyncio.ensure_future(node()) for node in pool.iternodes()]
+            async def produce():
+                for value in range(20):
+                    await source.outputs.OUT.send(value)
+                await source.outputs.OUT.close()
+            producer = asyncio.ensure_future(produce())
+            received = [packet.value async for packet in sink.inputs.IN]
+            await producer
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return received
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        received = loop.run_until_complete(run())
+        loop.close()
+        self.assertEqual(received, [2 * i for i in range(20)])
+        # The counter is shared by the (shallow) copies:
+        # several replicas were running at the same time
+        self.assertGreater(delay.running[1], 1)
+
+
+class TestPort(TestCase):
+
+    def testFanIn(self):
+        graph = Multigraph('fanin', log_level=logging.CRITICAL)
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        graph.add_node(sink)
+        sources = []
+        for i in range(4):
+            source = Component('source_{}'.format(i))
+            source.outputs.add(OutputPort('OUT'))
+            graph.connect(source.outputs.OUT, sink.inputs.IN)
+            sources.append(source)
+
+        async def produce(source):
+            for i in range(50):
+                await source.outputs.OUT.send_packet(IP.InformationPacket((source.name, i)))
+
+        async def consume():
+            return [(await sink.inputs.IN.receive_packet()).value for i in range(200)]
+
+        async def run():
+            received, *_ = await asyncio.gather(consume(), *[produce(source) for source in sources])
+            return received
+
+        loop = asyncio.new_event_loop()
+        received = loop.run_until_complete(run())
+        loop.close()
+        #Every packet is received, in order for each connection
+        for source in sources:
+            self.assertEqual([i for name, i in received if name == source.name], list(range(50)))
+        self.assertTrue(sink.inputs.IN.inbox.empty())
+
+    def testSendReceiveMany(self):
+        graph = Multigraph('batch', log_level=logging.CRITICAL)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+
+        async def produce():
+            await source.outputs.OUT.send_many([IP.InformationPacket(i) for i in range(250)])
+            await source.outputs.OUT.close()
+
+        async def consume():
+            batches = []
+            try:
+                while True:
+                    batches.append([p.value for p in await sink.inputs.IN.receive_many(max_n=64)])
+            except StopAsyncIteration:
+                return batches
+
+        async def run():
+            batches, _ = await asyncio.gather(consume(), produce())
+            return batches
+
+        loop = asyncio.new_event_loop()
+        batches = loop.run_until_complete(run())
+        loop.close()
+        self.assertEqual(sum(batches, []), list(range(250)))
+        self.assertTrue(all(len(batch) <= 64 for batch in batches))
+        self.assertFalse(sink.inputs.IN.open)
+
+    def testReceiveManyFailure(self):
+        graph = Multigraph('failure', log_level=logging.CRITICAL)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('DISCONNECTED'))
+        sink.inputs.add(InputPort('IN'))
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+
+        async def run():
+            with self.assertRaises(pyperator.exceptions.PortDisconnectedError):
+                await sink.inputs.receive_many()
+            await source.outputs.OUT.send(0)
+            await asyncio.sleep(0.01)
+            # The packet was left to the next receiver
+            return await sink.inputs.IN.receive_many()
+
+        loop = asyncio.new_event_loop()
+        packets = loop.run_until_complete(run())
+        loop.close()
+        self.assertEqual([packet.value for packet in packets], [0])
+
+    def testForeignPacket(self):
+        graph = Multigraph('owned', log_level=logging.CRITICAL)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+        packet = IP.InformationPacket(0, owner=sink)
+        loop = asyncio.new_event_loop()
+        with self.assertRaises(pyperator.exceptions.PacketOwnedError):
+            loop.run_until_complete(source.outputs.OUT.send_packet(packet))
+        with self.assertRaises(pyperator.exceptions.PacketOwnedError):
+            loop.run_until_complete(source.outputs.OUT.send_many([IP.InformationPacket(1), packet]))
+        loop.close()
+        self.assertTrue(sink.inputs.IN.inbox.empty())
+
+    def testReceiveManyTimeout(self):
+        graph = Multigraph('timeout', log_level=logging.CRITICAL)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+        loop = asyncio.new_event_loop()
+        packets = loop.run_until_complete(sink.inputs.receive_many(timeout=0.01))
+        loop.close()
+        self.assertEqual(packets, {'IN': []})
+
+
+class TestCapacity(TestCase):
+
+    def build(self, **kwargs):
+        graph = Multigraph('capacity', log_level=logging.CRITICAL, **kwargs)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        graph.add_node(source)
+        graph.add_node(sink)
+        return graph, source, sink
+
+    def fill(self, source, sink, n):
+        """
+        Sends `n` packets and the end of stream, the
+        receiver only runs when the sender blocks
+        """
+        async def produce():
+            for i in range(n):
+                await source.outputs.OUT.send(i)
+            await source.outputs.OUT.send_packet(IP.EndOfStream())
+
+        async def consume():
+            return [packet.value async for packet in sink.inputs.IN]
+
+        async def run():
+            received, _ = await asyncio.gather(consume(), produce())
+            return received
+
+        loop = asyncio.new_event_loop()
+        received = loop.run_until_complete(run())
+        loop.close()
+        return received
+
+    def testSize(self):
+        graph, source, sink = self.build(capacity=5)
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+        graph.connect(source.outputs.OUT, sink.inputs.IN, size=7)
+        source.outputs.OUT >> (sink.inputs.IN, 3)
+        source.outputs.OUT >> sink.inputs.IN
+        self.assertEqual([conn.queue.maxsize for conn in source.outputs.OUT.connections], [5, 7, 3, 5])
+
+    def testUnbounded(self):
+        graph, source, sink = self.build(capacity=5)
+        graph.connect(source.outputs.OUT, sink.inputs.IN, size=0)
+        self.assertEqual(source.outputs.OUT.connections[0].queue.maxsize, 0)
+        # Nothing blocks the sender
+        self.assertEqual(self.fill(source, sink, 200), list(range(200)))
+        graph, source, sink = self.build(capacity=5)
+        source.outputs.OUT.connect(sink.inputs.IN, size=0)
+        self.assertEqual(source.outputs.OUT.connections[0].queue.maxsize, 0)
+
+    def testDropNewest(self):
+        graph, source, sink = self.build(overflow='drop_newest')
+        graph.connect(source.outputs.OUT, sink.inputs.IN, size=3)
+        self.assertEqual(self.fill(source, sink, 10), [0, 1, 2])
+        self.assertEqual(source.outputs.OUT.connections[0].dropped, 7)
+
+    def testDropOldest(self):
+        graph, source, sink = self.build()
+        graph.connect(source.outputs.OUT, sink.inputs.IN, size=3, overflow='drop_oldest')
+        # The end of stream is not dropped but pushes out a packet
+        self.assertEqual(self.fill(source, sink, 10), [8, 9])
+        self.assertFalse(sink.inputs.IN.open)
+        self.assertTrue(sink.inputs.IN.inbox.empty())
+
+    def testSpill(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            graph, source, sink = self.build(workdir=workdir, overflow='spill')
+            graph.connect(source.outputs.OUT, sink.inputs.IN, size=3)
+            conn = source.outputs.OUT.connections[0]
+            segments = []
+
+            async def produce():
+                for i in range(1000):
+                    await source.outputs.OUT.send(i)
+                # The producer was never blocked
+                segments.extend(os.listdir(workdir))
+                self.assertEqual(conn.spilled, 997)
+                await source.outputs.OUT.close()
+
+            async def consume():
+                return [packet.value async for packet in sink.inputs.IN]
+
+            async def run():
+                received, _ = await asyncio.gather(consume(), produce())
+                return received
+
+            loop = asyncio.new_event_loop()
+            received = loop.run_until_complete(run())
+            loop.close()
+            self.assertEqual(received, list(range(1000)))
+            self.assertEqual(len(segments), 1)
+            self.assertEqual(os.listdir(workdir), [])
+
+    def testSpillFailure(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def produce(self):
+            async with self.outputs.OUT:
+                for i in range(1000):
+                    await self.outputs.OUT.send(i)
+                self.segments.extend(os.listdir(self.dag.workdir))
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def consume(self):
+            await self.inputs.IN.receive_packet()
+            # Wait for the producer to spill the rest
+            await asyncio.sleep(0.01)
+            raise pyperator.exceptions.ComponentError('failed', self)
+
+        with tempfile.TemporaryDirectory() as workdir:
+            graph = Multigraph('spill_failure', log_level=logging.CRITICAL, workdir=workdir, overflow='spill')
+            source, sink = produce('source'), consume('sink')
+            source.segments = []
+            graph.connect(source.outputs.OUT, sink.inputs.IN, size=3)
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            with self.assertRaises(pyperator.exceptions.ComponentError):
+                graph()
+            self.assertEqual(len(source.segments), 1)
+            # The spilled packets were never read
+            self.assertEqual(os.listdir(workdir), [])
+
+    def testUnknownPolicy(self):
+        graph, source, sink = self.build()
+        with self.assertRaises(ValueError):
+            graph.connect(source.outputs.OUT, sink.inputs.IN, overflow='explode')
+
+
+class Loud(object):
+    """
+    A value counting how many times it is formatted
+    """
+    formatted = 0
+
+    def __str__(self):
+        Loud.formatted += 1
+        return 'loud'
+
+
+class TestLogging(TestCase):
+
+    def transfer(self, level):
+        Loud.formatted = 0
+        graph = Multigraph('logging', log_level=level)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+
+        async def run():
+            for i in range(10):
+                await source.outputs.OUT.send(Loud())
+                await sink.inputs.IN.receive()
+
+        loop = asyncio.new_event_loop()
+        with self.assertLogs(graph.log, logging.DEBUG) as logs:
+            # assertLogs lowers the level, restore it
+            graph.log.setLevel(level)
+            graph.log.warning('start')
+            loop.run_until_complete(run())
+        loop.close()
+        return logs.output
+
+    def testDeferred(self):
+        self.transfer(logging.WARNING)
+        self.assertEqual(Loud.formatted, 0)
+        output = self.transfer(logging.DEBUG)
+        self.assertGreaterEqual(Loud.formatted, 20)
+        self.assertTrue(any('Sending' in line for line in output))
+
+    def testProduction(self):
+        pyperator.logging.set_production()
+        try:
+            output = self.transfer(logging.DEBUG)
+        finally:
+            pyperator.logging.set_production(False)
+        self.assertEqual(Loud.formatted, 0)
+        self.assertFalse(any('Sending' in line for line in output))
+
+    def testSink(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'graph.log')
+            for i in range(3):
+                logger = pyperator.logging.setup_custom_logger('sink_test', level=logging.INFO, file=path)
+            self.assertEqual(len(logger.handlers), 1)
+            self.assertEqual(len(pyperator.logging._sinks['sink_test'].handlers), 2)
+            pyperator.logging._sinks['sink_test'].handlers[0].setLevel(logging.CRITICAL)
+            for i in range(100):
+                logger.getChild('c').info('message %d', i)
+            pyperator.logging.shutdown('sink_test')
+            with open(path) as log_file:
+                lines = log_file.readlines()
+        self.assertEqual(len(lines), 100)
+        self.assertTrue(lines[-1].endswith('sink_test.c - message 99\n'))
+
+    def testSinkDrops(self):
+        release = threading.Event()
+
+        class Slow(logging.Handler):
+            messages = []
+
+            def emit(self, record):
+                release.wait()
+                self.messages.append(record.getMessage())
+
+        sink = pyperator.logging.LogSink(capacity=2)
+        sink.add_handler(Slow())
+        logger = logging.getLogger('sink_drops')
+        logger.propagate = False
+        logger.addHandler(sink.queue_handler)
+        logger.warning('first')
+        # Wait for the thread to be blocked on the first record
+        while not sink._queue.empty():
+            time.sleep(0.001)
+        for i in range(10):
+            logger.warning('queued %d', i)
+        release.set()
+        sink.stop()
+        self.assertEqual(Slow.messages, ['first', 'queued 0', 'queued 1', '8 log records were dropped'])
+
+    def testCachedChild(self):
+        graph = Multigraph('cached', log_level=logging.CRITICAL)
+        c = Component('c')
+        c.inputs.add(InputPort('IN'))
+        graph.add_node(c)
+        self.assertIs(c.inputs.IN.log, c.inputs.IN.log)
+        self.assertEqual(c.inputs.IN.log.name, 'cached.c.IN')
+
+
+class TestMetrics(TestCase):
+
+    def testSnapshot(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def fast(self):
+            async with self.outputs.OUT:
+                for i in range(50):
+                    await self.outputs.OUT.send(b'x' * 10)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def slow(self):
+            async for packet in self.inputs.IN:
+                await asyncio.sleep(0.002)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'metrics.jsonl')
+            graph = Multigraph('metrics', log_level=logging.CRITICAL, capacity=5,
+                               metrics_file=path, metrics_interval=0.02)
+            source = fast('fast')
+            sink = slow('slow')
+            graph.connect(source.outputs.OUT, sink.inputs.IN)
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            graph()
+            with open(path) as metrics_file:
+                lines = [json.loads(line) for line in metrics_file]
+        snapshot = graph.snapshot()
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(lines[-1]['arcs'], snapshot['arcs'])
+        components = {c['name']: c for c in snapshot['components']}
+        self.assertEqual(components['slow']['ports']['IN']['packets'], 50)
+        self.assertEqual(components['fast']['ports']['OUT']['bytes'], 500)
+        # The source waited for the sink and the sink did not wait for the source
+        self.assertGreater(components['fast']['blocked_send'], 0.05)
+        self.assertGreater(components['slow']['computing'], 0.05)
+        arc, = snapshot['arcs']
+        self.assertEqual((arc['source'], arc['destination']), ('fast.OUT', 'slow.IN'))
+        self.assertEqual((arc['depth'], arc['capacity'], arc['high_water']), (0, 5, 5))
+        self.assertEqual(arc['blocked'], components['fast']['blocked_send'])
+
+    def testDisabled(self):
+        graph = Multigraph('no_metrics', log_level=logging.CRITICAL)
+        with self.assertRaises(ValueError):
+            graph.snapshot()
+
+
+class TestGUI(TestCase):
+
+    @unittest.skipIf(pyperator.gui.web is None, 'aiohttp is not installed')
+    def testPush(self):
+        import aiohttp
+        with socket.socket() as free:
+            free.bind(('127.0.0.1', 0))
+            port = free.getsockname()[1]
+        gui = pyperator.gui.GUI(port=port, interval=0.01)
+        graph = Multigraph('gui', log_level=logging.CRITICAL, capacity=4, gui=gui)
+        source = Component('source')
+        source.outputs.add(OutputPort('OUT'))
+        sink = Component('sink')
+        sink.inputs.add(InputPort('IN'))
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+
+        async def run():
+            await gui.start()
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect('http://127.0.0.1:{}/ws'.format(port)) as ws:
+                    # Fill the connection without receiving
+                    for i in range(4):
+                        await source.outputs.OUT.send(i)
+                    first = json.loads((await ws.receive()).data)
+                    second = json.loads((await ws.receive()).data)
+            await gui.stop()
+            return first, second
+
+        loop = asyncio.new_event_loop()
+        first, second = loop.run_until_complete(run())
+        loop.close()
+        nodes = {node['name']: node for node in second['nodes']}
+        self.assertEqual(nodes['sink']['saturation'], 1.0)
+        self.assertEqual(nodes['source']['packets'], 4)
+        self.assertEqual(second['arcs'][0]['fill'], 1.0)
+        self.assertEqual(sink.color, pyperator.gui.saturation_color(1.0))
+        self.assertIn(sink.color, second['dot'])
+
+
+class TestTracing(TestCase):
+
+    def testCopy(self):
+        packet = IP.InformationPacket(b'payload')
+        packet._trace = pyperator.tracing.TraceContext(0, 0.0)
+        self.assertIs(packet.copy()._trace, packet._trace)
+        self.assertIs(packet.copy(share=False)._trace, packet._trace)
+        import pickle
+        self.assertEqual(pickle.loads(pickle.dumps(packet))._trace.trace_id, 0)
+
+    def testCriticalPath(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def source(self):
+            async with self.outputs.OUT:
+                for i in range(10):
+                    await self.outputs.OUT.send(i)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def relay(self):
+            async with self.outputs.OUT:
+                async for packet in self.inputs.IN:
+                    await self.outputs.OUT.send_packet(packet.copy())
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def slow(self):
+            async with self.outputs.OUT:
+                async for packet in self.inputs.IN:
+                    await asyncio.sleep(0.001)
+                    # A new packet continues the trace of the received one
+                    await self.outputs.OUT.send(packet.value * 2)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def sink(self):
+            async for packet in self.inputs.IN:
+                pass
+
+        tracer = pyperator.tracing.Tracer(sample=2)
+        graph = Multigraph('tracing', log_level=logging.CRITICAL, tracer=tracer)
+        a, b, c, d = source('a'), relay('b'), slow('c'), sink('d')
+        graph.connect(a.outputs.OUT, b.inputs.IN)
+        graph.connect(b.outputs.OUT, c.inputs.IN)
+        graph.connect(c.outputs.OUT, d.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        report = tracer.report()
+        paths = {tuple(path['path']): path for path in report['paths']}
+        full = paths[('a.OUT', 'b.IN', 'c.IN', 'd.IN')]
+        self.assertEqual(full['count'], 5)
+        self.assertGreater(full['p50'], 0.001)
+        self.assertEqual(len(paths), 3)
+        critical = report['critical_path']
+        self.assertEqual([hop['destination'] for hop in critical], ['b.IN', 'c.IN', 'd.IN'])
+        # The time is spent in the slow component
+        self.assertGreater(critical[2]['processing'], 0.001)
+        latency = sum(hop['processing'] + hop['waiting'] for hop in critical)
+        self.assertAlmostEqual(latency, tracer.slowest()[0].latency)
+
+    def testFanOut(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def source(self):
+            async with self.outputs.OUT:
+                for i in range(10):
+                    await self.outputs.OUT.send(i)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def relay(self):
+            async with self.outputs.OUT:
+                async for packet in self.inputs.IN:
+                    await self.outputs.OUT.send_packet(packet.copy())
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def sink(self):
+            async for packet in self.inputs.IN:
+                pass
+
+        tracer = pyperator.tracing.Tracer()
+        graph = Multigraph('fan_out', log_level=logging.CRITICAL, tracer=tracer)
+        src, a, b, c = source('src'), sink('a'), relay('b'), sink('c')
+        # Both branches receive the same packets
+        graph.connect(src.outputs.OUT, a.inputs.IN)
+        graph.connect(src.outputs.OUT, b.inputs.IN)
+        graph.connect(b.outputs.OUT, c.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        counts = {path: histogram.count for path, histogram in tracer.histograms.items()}
+        self.assertEqual(counts, {('src.OUT', 'a.IN'): 10, ('src.OUT', 'b.IN'): 10,
+                                  ('src.OUT', 'b.IN', 'c.IN'): 10})
+
+    def testReordered(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def source(self):
+            async with self.outputs.OUT:
+                for i in range(3):
+                    await self.outputs.OUT.send(i)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def reverse(self):
+            async with self.outputs.OUT:
+                buffered = [packet async for packet in self.inputs.IN]
+                for packet in reversed(buffered):
+                    await self.outputs.OUT.send_packet(packet.copy())
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def sink(self):
+            async for packet in self.inputs.IN:
+                self.traces.append((packet.value, packet._trace.trace_id))
+
+        tracer = pyperator.tracing.Tracer()
+        graph = Multigraph('reordered', log_level=logging.CRITICAL, tracer=tracer)
+        a, b, c = source('a'), reverse('b'), sink('c')
+        c.traces = []
+        graph.connect(a.outputs.OUT, b.inputs.IN)
+        graph.connect(b.outputs.OUT, c.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        # Each packet keeps its own trace
+        self.assertEqual(c.traces, [(2, 2), (1, 1), (0, 0)])
+
+
+class TestProfiling(TestCase):
+
+    def testSubnet(self):
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def source(self):
+            async with self.outputs.OUT:
+                for i in range(20):
+                    await self.outputs.OUT.send(i)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.outport('OUT')
+        @pyperator.decorators.component
+        async def burn(self):
+            async with self.outputs.OUT:
+                async for packet in self.inputs.IN:
+                    total = 0
+                    for i in range(50000):
+                        total += i
+                    await self.outputs.OUT.send(total)
+
+        @pyperator.decorators.inport('IN')
+        @pyperator.decorators.component
+        async def sink(self):
+            async for packet in self.inputs.IN:
+                pass
+
+        with Multigraph('inner', log_level=logging.CRITICAL) as inner:
+            b = burn('burn')
+            inner.inputs.export(b.inputs.IN, 'IN')
+            inner.outputs.export(b.outputs.OUT, 'OUT')
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'profile.folded')
+            profiler = pyperator.profiling.Profiler(path, interval=0.001)
+            with Multigraph('outer', log_level=logging.CRITICAL, profiler=profiler) as graph:
+                subnet = pyperator.subnet.Subnet.from_graph(inner)
+                source('source').outputs.OUT >> subnet.inputs.IN
+                subnet.outputs.OUT >> sink('sink').inputs.IN
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            graph()
+            with open(path) as profile_file:
+                lines = profile_file.read().splitlines()
+        totals = profiler.inclusive()
+        self.assertGreater(totals[('outer', 'inner', 'burn')], 10 * totals[('outer', 'sink')])
+        self.assertGreaterEqual(totals[('outer', 'inner')], totals[('outer', 'inner', 'burn')])
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('outer;'))
+            self.assertGreater(int(count), 0)
+        # The sampled stacks continue into the functions of the component
+        self.assertTrue(any(line.startswith('outer;inner;burn;') for line in lines))
+
+
+@pyperator.decorators.outport('OUT')
+@pyperator.decorators.component
+async def Numbers(self):
+    async with self.outputs.OUT:
+        for i in range(self.n_packets):
+            await self.outputs.OUT.send(i)
+
+
+@pyperator.decorators.inport('IN')
+@pyperator.decorators.component
+async def Collect(self):
+    async for packet in self.inputs.IN:
+        self.received.append(packet.value)
+
+
+class TestSubnetStreams(TestCase):
+
+    def numbers(self, name, n_packets):
+        source = Numbers(name)
+        source.n_packets = n_packets
+        return source
+
+    def collect(self, name):
+        sink = Collect(name)
+        sink.received = []
+        return sink
+
+    def testSubInEndOfStream(self):
+        graph = Multigraph('relay', log_level=logging.CRITICAL)
+        source = self.numbers('source', 5)
+        relay = pyperator.subnet.SubIn('relay')
+        sink = self.collect('sink')
+        graph.connect(source.outputs.OUT, relay.inputs.IN)
+        graph.connect(relay.outputs.OUT, sink.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        # Finishes once the end of stream reaches the sink
+        graph()
+        self.assertEqual(sink.received, list(range(5)))
+        self.assertFalse(relay.outputs.OUT.open)
+
+    def testBoundary(self):
+        with Multigraph('inner', log_level=logging.CRITICAL) as inner:
+            relay = pyperator.subnet.SubIn('relay')
+            inner.inputs.export(relay.inputs.IN, 'IN')
+            inner.outputs.export(relay.outputs.OUT, 'OUT')
+        with Multigraph('outer', log_level=logging.CRITICAL) as graph:
+            source = self.numbers('source', 10)
+            sink = self.collect('sink')
+            subnet = pyperator.subnet.Subnet.from_graph(inner)
+            source.outputs.OUT >> subnet.inputs.IN
+            subnet.outputs.OUT >> sink.inputs.IN
+        # The boundary components are created in the inner graph
+        boundary = [node for node in inner.iternodes() if node is not relay]
+        self.assertEqual(sorted(node.name for node in boundary), ['in_IN', 'out_OUT'])
+        self.assertTrue(all(node.dag is inner for node in boundary))
+        self.assertIs(inner.subnet, subnet)
+        self.assertEqual(set(graph.iternodes()), {source, sink, subnet})
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        # Each packet went through the boundary once
+        self.assertEqual(sink.received, list(range(10)))
+
+    def testNested(self):
+        with Multigraph('level_0', log_level=logging.CRITICAL) as inner:
+            relay = pyperator.subnet.SubIn('relay')
+            inner.inputs.export(relay.inputs.IN, 'IN')
+            inner.outputs.export(relay.outputs.OUT, 'OUT')
+        with Multigraph('level_1', log_level=logging.CRITICAL) as outer:
+            subnet = pyperator.subnet.Subnet.from_graph(inner)
+            outer.inputs.export(subnet.inputs.IN, 'IN')
+            outer.outputs.export(subnet.outputs.OUT, 'OUT')
+        with Multigraph('nested', log_level=logging.CRITICAL) as graph:
+            source = self.numbers('source', 50)
+            sink = self.collect('sink')
+            subnet = pyperator.subnet.Subnet.from_graph(outer)
+            source.outputs.OUT >> subnet.inputs.IN
+            subnet.outputs.OUT >> sink.inputs.IN
+        # The boundary components only run inside the subnet
+        self.assertEqual(set(graph.iternodes()), {source, sink, subnet})
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        self.assertEqual(sink.received, list(range(50)))
+
+    def testNestedScheduling(self):
+        with Multigraph('level_0', log_level=logging.CRITICAL) as inner:
+            relay = pyperator.subnet.SubIn('relay')
+            inner.inputs.export(relay.inputs.IN, 'IN')
+            inner.outputs.export(relay.outputs.OUT, 'OUT')
+        with Multigraph('level_1', log_level=logging.CRITICAL) as outer:
+            subnet = pyperator.subnet.Subnet.from_graph(inner)
+            outer.inputs.export(subnet.inputs.IN, 'IN')
+            outer.outputs.export(subnet.outputs.OUT, 'OUT')
+        with Multigraph('nested', log_level=logging.CRITICAL, metrics=True) as graph:
+            source = self.numbers('source', 5)
+            sink = self.collect('sink')
+            subnet = pyperator.subnet.Subnet.from_graph(outer)
+            source.outputs.OUT >> subnet.inputs.IN
+            subnet.outputs.OUT >> sink.inputs.IN
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        # The innermost components are run by the outermost graph
+        components = {node['name']: node for node in graph.snapshot()['components']}
+        self.assertIsNotNone(components['relay']['computing'])
+        self.assertEqual(components['relay']['ports']['IN']['packets'], 5)
+
+    def testSplit(self):
+        graph = Multigraph('split', log_level=logging.CRITICAL)
+        product = components.Product('product')
+        product.inputs.add(InputPort('IN1'))
+        product.inputs.add(InputPort('IN2'))
+        split = components.Split('split')
+        split.outputs.add(OutputPort('OUT1'))
+        split.outputs.add(OutputPort('OUT2'))
+        graph.connect(self.numbers('a', 3).outputs.OUT, product.inputs.IN1)
+        graph.connect(self.numbers('b', 3).outputs.OUT, product.inputs.IN2)
+        graph.connect(product.outputs.OUT, split.inputs.IN)
+        sinks = [self.collect('sink_1'), self.collect('sink_2')]
+        graph.connect(split.outputs.OUT1, sinks[0].inputs.IN)
+        graph.connect(split.outputs.OUT2, sinks[1].inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        # Finishes once the split closes its outputs
+        graph()
+        self.assertEqual(sinks[0].received, [0, 0, 0, 1, 1, 1, 2, 2, 2])
+        self.assertEqual(sinks[1].received, [0, 1, 2] * 3)
+
+    def testSplitEmpty(self):
+        graph = Multigraph('split_empty', log_level=logging.CRITICAL)
+        split = components.Split('split')
+        split.outputs.add(OutputPort('OUT1'))
+        split.outputs.add(OutputPort('OUT2'))
+        graph.connect(self.numbers('source', 0).outputs.OUT, split.inputs.IN)
+        sinks = [self.collect('sink_1'), self.collect('sink_2')]
+        graph.connect(split.outputs.OUT1, sinks[0].inputs.IN)
+        graph.connect(split.outputs.OUT2, sinks[1].inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        # All the outputs are closed, even without substreams
+        graph()
+        self.assertEqual([sink.received for sink in sinks], [[], []])
+        self.assertFalse(any(port.open for port in split.outputs.values()))
+
+
+class TestArcIndex(TestCase):
+
+    def testSubnet(self):
+        with Multigraph('inner', log_level=logging.CRITICAL) as inner:
+            relay = pyperator.subnet.SubIn('relay')
+            inner.inputs.export(relay.inputs.IN, 'IN')
+            inner.outputs.export(relay.outputs.OUT, 'OUT')
+        with Multigraph('outer', log_level=logging.CRITICAL) as graph:
+            source = Numbers('source')
+            sink = Collect('sink')
+            subnet = pyperator.subnet.Subnet.from_graph(inner)
+            source.outputs.OUT >> subnet.inputs.IN
+            subnet.outputs.OUT >> sink.inputs.IN
+        self.assertTrue(graph.hasarc(source, subnet))
+        self.assertTrue(graph.hasarc(subnet, sink, 'OUT', 'IN'))
+        self.assertFalse(graph.hasarc(source, sink))
+        self.assertEqual(list(graph.adjacent(source)), [subnet])
+        # The arcs inside the subnet are only in its graph
+        self.assertEqual(len(list(graph.iterarcs())), 2)
+        self.assertEqual(len(list(inner.iterarcs())), 2)
+
+    def testReplicas(self):
+        graph = Multigraph('replicas', log_level=logging.CRITICAL)
+        source = Numbers('source')
+        sink = Collect('sink')
+        pool = graph.add_node(pyperator.subnet.SubIn('relay'), replicas=2)
+        graph.connect(source.outputs.OUT, pool.inputs.IN)
+        graph.connect(pool.outputs.OUT, sink.inputs.IN)
+        self.assertTrue(graph.hasarc(source, pool, 'OUT', 'IN'))
+        self.assertTrue(graph.hasarc(pool, sink))
+        # Dispatch, two replicas and merge
+        self.assertEqual(len(list(graph.iternodes())), 6)
+        self.assertEqual(len(list(graph.iterarcs())), 6)
+        late = Collect('late')
+        graph.add_node(late)
+        self.assertIn(late, list(graph.iternodes()))
+
+
+@pyperator.decorators.inport('IN')
+@pyperator.decorators.outport('OUT')
+@pyperator.decorators.component
+async def Tag(self):
+    async with self.outputs.OUT:
+        async for packet in self.inputs.IN:
+            await asyncio.sleep(0.001)
+            await self.outputs.OUT.send((self.name, packet.value))
+
+
+@pyperator.decorators.component
+async def Swap(self):
+    while len(self.sink.received) < 50:
+        await asyncio.sleep(0.001)
+    await self.dag.replace(self.old, self.new)
+    self.swapped = len(self.sink.received)
+
+
+@pyperator.decorators.component
+async def Remove(self):
+    while len(self.sink.received) < 100:
+        await asyncio.sleep(0.001)
+    await self.dag.remove_node(self.node)
+
+
+class TestRewiring(TestCase):
+
+    def testDisconnect(self):
+        graph = Multigraph('disconnect', log_level=logging.CRITICAL)
+        source = Numbers('source')
+        sink = Collect('sink')
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+        self.assertEqual(len(graph.disconnect(source, sink, 'OUT', 'IN')), 1)
+        self.assertFalse(graph.hasarc(source, sink))
+        self.assertFalse(source.outputs.OUT.is_connected)
+        self.assertFalse(sink.inputs.IN.is_connected)
+
+    def testMoveArc(self):
+        graph = Multigraph('move', log_level=logging.CRITICAL)
+        source = Numbers('source')
+        old = Collect('old')
+        new = Collect('new')
+        graph.connect(source.outputs.OUT, old.inputs.IN)
+
+        async def send():
+            for i in range(3):
+                await source.outputs.OUT.send(i)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        asyncio.get_event_loop().run_until_complete(send())
+        graph.move_arc(source.outputs.OUT, old.inputs.IN, new.inputs.IN)
+        self.assertTrue(graph.hasarc(source, new, 'OUT', 'IN'))
+        self.assertFalse(graph.hasarc(source, old))
+        self.assertTrue(old.inputs.IN.inbox.empty())
+        # The buffered packets are received by the new port
+        self.assertEqual([new.inputs.IN.inbox.get_nowait().value for i in range(3)], [0, 1, 2])
+
+    def testReplace(self):
+        with Multigraph('replace', log_level=logging.CRITICAL) as graph:
+            source = Numbers('source')
+            source.n_packets = 500
+            old = Tag('old')
+            sink = Collect('sink')
+            sink.received = []
+            source.outputs.OUT >> old.inputs.IN
+            old.outputs.OUT >> sink.inputs.IN
+            swap = Swap('swap')
+            swap.sink = sink
+            swap.old = old
+        # Started when swapped in
+        swap.new = Tag('new')
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        self.assertFalse(graph.hasnode(old))
+        self.assertTrue(graph.hasarc(swap.new, sink))
+        # No packet is lost or duplicated
+        self.assertEqual(sorted(value for name, value in sink.received), list(range(500)))
+        self.assertLess(swap.swapped, 500)
+        self.assertEqual({name for name, value in sink.received}, {'old', 'new'})
+
+    def testRemoveNode(self):
+        with Multigraph('remove', log_level=logging.CRITICAL) as graph:
+            source = Numbers('source')
+            source.n_packets = 300
+            first = Tag('first')
+            second = Tag('second')
+            sink = Collect('sink')
+            sink.received = []
+            source.outputs.OUT >> first.inputs.IN
+            source.outputs.OUT >> second.inputs.IN
+            first.outputs.OUT >> sink.inputs.IN
+            second.outputs.OUT >> sink.inputs.IN
+            remove = Remove('remove')
+            remove.sink = sink
+            remove.node = first
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        self.assertFalse(graph.hasnode(first))
+        received = {name: [value for sender, value in sink.received if sender == name] for name in ['first', 'second']}
+        # The removed node received the packets sent before its removal
+        self.assertEqual(received['first'], list(range(len(received['first']))))
+        self.assertLess(len(received['first']), 300)
+        self.assertEqual(received['second'], list(range(300)))
+
+
+class TestCompile(TestCase):
+
+    def chain(self, overflow='block'):
+        graph = Multigraph('compile', log_level=logging.CRITICAL)
+        source = Numbers('source')
+        first = Tag('first')
+        second = Tag('second')
+        sink = Collect('sink')
+        graph.connect(source.outputs.OUT, first.inputs.IN)
+        graph.connect(first.outputs.OUT, second.inputs.IN)
+        graph.connect(second.outputs.OUT, sink.inputs.IN)
+        return graph, (source, first, second, sink)
+
+    def testLevels(self):
+        graph, (source, first, second, sink) = self.chain()
+        compiled = graph.compile()
+        self.assertEqual(compiled.levels, [[source], [first], [second], [sink]])
+        self.assertEqual(compiled.cycles, [])
+        # Cached until the graph changes
+        self.assertIs(graph.compile(), compiled)
+        graph.connect(source.outputs.OUT, sink.inputs.IN)
+        self.assertIsNot(graph.compile(), compiled)
+
+    def testDisconnected(self):
+        graph, (source, first, second, sink) = self.chain()
+        graph.disconnect(first, second)
+        with self.assertRaises(pyperator.exceptions.GraphValidationError) as raised:
+            graph()
+        self.assertEqual(len(raised.exception.problems), 1)
+        self.assertIn('Input port IN of second', raised.exception.problems[0])
+
+    def testCycle(self):
+        graph, (source, first, second, sink) = self.chain()
+        feedback = Tag('feedback')
+        graph.connect(second.outputs.OUT, feedback.inputs.IN)
+        graph.connect(feedback.outputs.OUT, first.inputs.IN)
+        with self.assertRaises(pyperator.exceptions.GraphValidationError) as raised:
+            graph.compile()
+        self.assertIn('feedback -> first -> second', raised.exception.problems[0])
+        # A connection that never blocks breaks the deadlock
+        graph.disconnect(feedback, first)
+        graph.connect(feedback.outputs.OUT, first.inputs.IN, overflow='spill')
+        compiled = graph.compile()
+        self.assertEqual(len(compiled.cycles), 1)
+        self.assertEqual(compiled.levels, [[source], [feedback, first, second], [sink]])
+
+
+@pyperator.decorators.outport('OUT')
+@pyperator.decorators.component
+async def Paths(self):
+    async with self.outputs.OUT:
+        for path in self.paths:
+            await self.outputs.OUT.send(path)
+
+
+class TestSubprocessPool(TestCase):
+
+    def testSlots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            graph = Multigraph('pool', log_level=logging.CRITICAL, workdir=directory + os.sep, subprocesses=2)
+            source = Paths('paths')
+            source.paths = [os.path.join(directory, str(i)) for i in range(6)]
+            for path in source.paths:
+                open(path, 'w').close()
+            shell = pyperator.shell.Shell('shell', 'sleep 0.1 && cp {inputs.IN} {outputs.OUT}', concurrency=4)
+            shell.DynamicFormatter('OUT', '{inputs.IN}.out')
+            graph.connect(source.outputs.OUT, shell.inputs.IN)
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            graph()
+            pool = shell.subprocess_pool()
+            self.assertIs(pool, graph.subprocesses)
+            self.assertEqual(pool.peak, 2)
+            self.assertEqual(pool.running, 0)
+            self.assertTrue(all(os.path.exists(path + '.out') for path in source.paths))
+
+    def testAdmission(self):
+        pool = pyperator.shell.SubprocessPool(slots=4, memory=100)
+        order = []
+
+        async def command(name, cores, memory):
+            reserved = await pool.acquire(cores, memory)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            await pool.release(*reserved)
+
+        async def run():
+            await asyncio.gather(command('a', 2, 60), command('b', 2, 60), command('c', 8, 10))
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        asyncio.get_event_loop().run_until_complete(run())
+        # b does not fit in the memory left by a, c takes the whole pool
+        self.assertEqual(pool.peak, 1)
+        self.assertEqual(sorted(order), ['a', 'b', 'c'])
+
+
+class TestBuildCache(TestCase):
+
+    def run_graph(self, directory, inputs):
+        graph = Multigraph('cache', log_level=logging.CRITICAL, workdir=directory + os.sep, cache=True)
+        source = Paths('paths')
+        source.paths = inputs
+        shell = pyperator.shell.Shell('shell', 'cat {inputs.IN} > {outputs.OUT} && echo run >> ' +
+                                      os.path.join(directory, 'runs'), check_older=True)
+        shell.DynamicFormatter('OUT', '{inputs.IN}.out')
+        graph.connect(source.outputs.OUT, shell.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        with open(os.path.join(directory, 'runs')) as runs:
+            return len(runs.readlines()), graph.build_cache.report()['shell']
+
+    def testContents(self):
+        with tempfile.TemporaryDirectory() as directory:
+            inputs = [os.path.join(directory, str(i)) for i in range(3)]
+            for path in inputs:
+                with open(path, 'w') as input_file:
+                    input_file.write(path)
+            runs, stats = self.run_graph(directory, inputs)
+            self.assertEqual((runs, stats['misses']), (3, 3))
+            # Newer inputs with the same contents do not run the command again
+            later = time.time() + 10
+            for path in inputs:
+                os.utime(path, (later, later))
+            runs, stats = self.run_graph(directory, inputs)
+            self.assertEqual((runs, stats['hits']), (3, 3))
+            with open(inputs[0], 'w') as input_file:
+                input_file.write('changed')
+            runs, stats = self.run_graph(directory, inputs)
+            self.assertEqual((runs, stats['hits'], stats['misses']), (4, 2, 1))
+            with open(inputs[0] + '.out') as output_file:
+                self.assertEqual(output_file.read(), 'changed')
+
+
+class Bucket(pyperator.store.ArtifactBackend):
+    """
+    Stand-in of an object store bucket, keeping the objects in memory.
+    """
+
+    def __init__(self):
+        self.objects = {}
+
+    def exists(self, name):
+        return name in self.objects
+
+    def upload(self, path, name):
+        with open(path, 'rb') as uploaded:
+            self.objects[name] = uploaded.read()
+
+    def download(self, name, path):
+        if name not in self.objects:
+            return False
+        with open(path, 'wb') as downloaded:
+            downloaded.write(self.objects[name])
+        return True
+
+    def read(self, name):
+        return self.objects.get(name)
+
+    def write(self, name, data):
+        self.objects[name] = data
+
+
+class TestArtifactStore(TestCase):
+
+    def run_graph(self, workdir, store, runs):
+        os.makedirs(workdir, exist_ok=True)
+        path = os.path.join(workdir, 'input')
+        with open(path, 'w') as input_file:
+            input_file.write('contents')
+        graph = Multigraph('store', log_level=logging.CRITICAL, workdir=workdir + os.sep, store=store)
+        source = Paths('paths')
+        source.paths = [path]
+        shell = pyperator.shell.Shell('shell', 'cat {inputs.IN} > {outputs.OUT} && echo run >> ' + runs)
+        shell.DynamicFormatter('OUT', '{inputs.IN}.out')
+        graph.connect(source.outputs.OUT, shell.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        with open(runs) as runs_file, open(path + '.out') as output_file:
+            return len(runs_file.readlines()), output_file.read()
+
+    def testBackends(self):
+        for backend in (Bucket(), None):
+            with tempfile.TemporaryDirectory() as directory:
+                if backend is None:
+                    backend = pyperator.store.DirectoryBackend(os.path.join(directory, 'store'))
+                store = pyperator.store.ArtifactStore(backend)
+                runs = os.path.join(directory, 'runs')
+                # Another machine runs the same work
+                self.assertEqual(self.run_graph(os.path.join(directory, 'a'), store, runs), (1, 'contents'))
+                self.assertEqual(self.run_graph(os.path.join(directory, 'b'), store, runs), (1, 'contents'))
+                self.assertEqual(store.stats, {'restored': 1, 'published': 1})
+                if isinstance(backend, pyperator.store.DirectoryBackend):
+                    # Restored as a link to the store
+                    self.assertEqual(os.stat(os.path.join(directory, 'b', 'input.out')).st_nlink, 2)
+
+    def testUnlink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = pyperator.store.ArtifactStore(pyperator.store.DirectoryBackend(os.path.join(directory, 'store')))
+            produced, restored, other = (os.path.join(directory, name) for name in ('produced', 'restored', 'other'))
+            for path in (produced, other):
+                with open(path, 'w') as output_file:
+                    output_file.write('contents')
+            store.publish('0' * 64, {'OUT': produced})
+            stored = os.path.join(directory, 'store', 'objects')
+            stored = os.path.join(stored, os.listdir(stored)[0])
+            stored = os.path.join(stored, os.listdir(stored)[0])
+            mtime = os.stat(stored).st_mtime_ns
+            self.assertTrue(store.restore('0' * 64, {'OUT': restored}))
+            self.assertEqual(os.stat(stored).st_mtime_ns, mtime)
+            # Only the links to the store are removed
+            os.link(other, other + '.link')
+            store.unlink([produced, restored, other])
+            self.assertEqual(sorted(os.listdir(directory)), ['other', 'other.link', 'produced', 'store'])
+
+
+class TestStaging(TestCase):
+
+    def run_command(self, directory, cmd):
+        with open(os.path.join(directory, 'input'), 'w') as input_file:
+            input_file.write('contents')
+        graph = Multigraph('staging', log_level=logging.CRITICAL, workdir=directory + os.sep)
+        source = Paths('paths')
+        source.paths = [os.path.join(directory, 'input')]
+        shell = pyperator.shell.Shell('shell', cmd, staging=True)
+        shell.DynamicFormatter('OUT', '{inputs.IN}.txt')
+        graph.connect(source.outputs.OUT, shell.inputs.IN)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        graph()
+        return sorted(os.listdir(directory))
+
+    def testCommit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # The extension of the output is kept
+            files = self.run_command(directory, 'test {outputs.OUT.suffix} = .txt && cat {inputs.IN} > {outputs.OUT}')
+            self.assertEqual(files, ['input', 'input.txt'])
+            with open(os.path.join(directory, 'input.txt')) as output_file:
+                self.assertEqual(output_file.read(), 'contents')
+
+    def testFailure(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(pyperator.exceptions.CommandFailedError):
+                self.run_command(directory, 'cat {inputs.IN} > {outputs.OUT} && exit 1')
+            self.assertEqual(os.listdir(directory), ['input'])
+
+
+class TestShellOutput(TestCase):
+
+    def testStdout(self):
+        with tempfile.TemporaryDirectory() as directory:
+            graph = Multigraph('stdout', log_level=logging.CRITICAL, workdir=directory + os.sep)
+            source = Paths('paths')
+            source.paths = ['1', '2']
+            shell = pyperator.shell.Shell('shell', 'seq {inputs.IN} 1000', stdout='STDOUT', chunk_size=100)
+            sink = Collect('sink')
+            sink.received = []
+            graph.connect(source.outputs.OUT, shell.inputs.IN)
+            graph.connect(shell.outputs.STDOUT, sink.inputs.IN)
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            graph()
+            # One substream of chunks for each command
+            substreams = b''.join(chunk or b'|' for chunk in sink.received).split(b'||')
+            expected = [''.join('{}\n'.format(i) for i in range(start, 1001)).encode() for start in (1, 2)]
+            self.assertEqual(substreams, [b'|' + expected[0], expected[1] + b'|'])
+            self.assertTrue(all(len(chunk) <= 100 for chunk in sink.received if chunk))
+
+    def testStdoutStore(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = pyperator.store.ArtifactStore(pyperator.store.DirectoryBackend(os.path.join(directory, 'store')))
+            graph = Multigraph('stdout', log_level=logging.CRITICAL, workdir=directory + os.sep, store=store)
+            source = Paths('paths')
+            source.paths = ['1']
+            shell = pyperator.shell.Shell('shell', 'echo {inputs.IN}', stdout='STDOUT')
+            sink = Collect('sink')
+            sink.received = []
+            graph.connect(source.outputs.OUT, shell.inputs.IN)
+            graph.connect(shell.outputs.STDOUT, sink.inputs.IN)
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            graph()
+            # Without output files there is nothing to publish
+            self.assertEqual(b''.join(chunk for chunk in sink.received if chunk), b'1\n')
+            self.assertEqual(store.stats, {'restored': 0, 'published': 0})
+
+    def testStderrTail(self):
+        with tempfile.TemporaryDirectory() as directory:
+            graph = Multigraph('stderr', log_level=logging.CRITICAL, workdir=directory + os.sep)
+            source = Paths('paths')
+            source.paths = ['1']
+            shell = pyperator.shell.Shell('shell', 'seq {inputs.IN} 1000 >&2 && exit 1', stderr_tail=2)
+            graph.connect(source.outputs.OUT, shell.inputs.IN)
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            with self.assertLogs(shell.log, logging.DEBUG) as logs:
+                with self.assertRaises(pyperator.exceptions.CommandFailedError) as raised:
+                    graph()
+            self.assertTrue(str(raised.exception).endswith('\n 999\n1000'))
+            # Each line is logged at debug level, the tail with the error
+            levels = {record.levelno for record in logs.records if record.getMessage().endswith('stderr: 1000')}
+            self.assertEqual(levels, {logging.DEBUG})
+            self.assertTrue(any(record.levelno == logging.ERROR and record.getMessage().endswith('\n 999\n1000')
+                                for record in logs.records))
+
+
+class TestStatCache(TestCase):
+
+    def testListing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, str(i)) for i in range(10)]
+            for path in paths[:5]:
+                open(path, 'w').close()
+            stats = pyperator.shell.StatCache()
+            stats.scan_after = 2
+            self.assertEqual([stats.exists(path) for path in paths], [True] * 5 + [False] * 5)
+            self.assertIsNotNone(stats._listings[directory])
+            # Written files are checked again
+            open(paths[-1], 'w').close()
+            self.assertFalse(stats.exists(paths[-1]))
+            stats.invalidate([paths[-1]])
+            self.assertTrue(stats.exists(paths[-1]))
+
+    def testModified(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, name) for name in ('old', 'new', 'out')]
+            for path, mtime in zip(paths, (0, 20, 10)):
+                open(path, 'w').close()
+                os.utime(path, (mtime, mtime))
+            in_packets = pyperator.shell.PacketRegister({'A': IP.InformationPacket(paths[0]),
+                                                         'B': IP.InformationPacket(paths[1])})
+            out_packets = pyperator.shell.PacketRegister({'OUT': IP.InformationPacket(paths[2])})
+            for stats in (None, pyperator.shell.StatCache()):
+                new_ancestors, to_redo = pyperator.shell.list_modified(out_packets, in_packets, stats)
+                self.assertEqual([str(packet) for packet in new_ancestors], [paths[1]])
+                self.assertEqual(list(to_redo), ['OUT'])
+
+
 class TestWildcards(TestCase):
 
     def TestEscape(self):
@@ -608,7 +2309,8 @@ class TestDecorator(TestCase):
             return 1
 
     def test_component(self):
-        @pyperator.decorators.inport('c')
+        # Never received, the graph is only valid if it is optional
+        @pyperator.decorators.inport('c', optional=True)
         @pyperator.decorators.outport('c')
         @pyperator.decorators.inport('a')
         @pyperator.decorators.component
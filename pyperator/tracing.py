@@ -0,0 +1,285 @@
+"""
+Packet-level tracing of a :class:`pyperator.DAG.Multigraph`. A traced
+:class:`pyperator.IP.InformationPacket` carries a :class:`TraceContext` with
+the time its trace started and the list of hops it went through, each with the
+time the packet was put in the connection and the time it was received.
+The context survives :meth:`pyperator.IP.InformationPacket.copy`, and a packet
+created by a component inherits the context of the last traced packet that
+component received, so that a record can be followed from the source to the end of the graph.
+
+Traces start at the components that send without receiving (sources); one packet out of
+`sample` is traced, so that tracing can stay on in production.
+The :class:`Tracer` keeps a latency histogram for each path and the slowest
+traces, from which :meth:`Tracer.critical_path` reports where the time went.
+Use it with :code:`Multigraph('g', tracer=Tracer(sample=100))`.
+Only the components running in the process of the graph are traced.
+"""
+import heapq as _heapq
+import itertools as _itertools
+import math as _math
+import time as _time
+import weakref as _weakref
+
+from pyperator.IP import MarkerPacket
+
+# Marks a component that has not received any packet yet
+_SOURCE = object()
+
+
+class Hop(object):
+    """
+    A packet going through a connection
+    from port `source` to port `destination`.
+    """
+    __slots__ = ('source', 'destination', 'enqueued', 'dequeued')
+
+    def __init__(self, source, destination, enqueued, dequeued):
+        self.source = source
+        self.destination = destination
+        self.enqueued = enqueued
+        self.dequeued = dequeued
+
+    @property
+    def waiting(self):
+        return self.dequeued - self.enqueued
+
+    def __reduce__(self):
+        return (Hop, (self.source, self.destination, self.enqueued, self.dequeued))
+
+    def __repr__(self):
+        return 'Hop({} -> {}, waited {:.6f} s)'.format(self.source, self.destination, self.waiting)
+
+
+class TraceContext(object):
+    """
+    The trace of a packet: the time the trace started, the
+    hops completed so far and, while the packet is in a connection,
+    the port that sent it and when. Contexts are never modified,
+    each hop makes a new one.
+    """
+    __slots__ = ('trace_id', 'origin', 'hops', 'sent_from', 'sent_at', '__weakref__')
+
+    def __init__(self, trace_id, origin, hops=(), sent_from=None, sent_at=None):
+        self.trace_id = trace_id
+        self.origin = origin
+        self.hops = hops
+        self.sent_from = sent_from
+        self.sent_at = sent_at
+
+    def sent(self, port, now):
+        return TraceContext(self.trace_id, self.origin, self.hops, port, now)
+
+    def received(self, port, now):
+        hop = Hop(self.sent_from, port, self.sent_at, now)
+        return TraceContext(self.trace_id, self.origin, self.hops + (hop,))
+
+    @property
+    def path(self):
+        """
+        The ports the packet went through, starting from the source.
+        """
+        if not self.hops:
+            return ()
+        return (self.hops[0].source,) + tuple(hop.destination for hop in self.hops)
+
+    @property
+    def latency(self):
+        """
+        Time from the start of the trace to the last hop.
+        """
+        if not self.hops:
+            return 0.0
+        return self.hops[-1].dequeued - self.origin
+
+    def __reduce__(self):
+        return (TraceContext, (self.trace_id, self.origin, self.hops, self.sent_from, self.sent_at))
+
+    def __repr__(self):
+        return 'TraceContext({}, {} hops)'.format(self.trace_id, len(self.hops))
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of latencies with buckets growing by powers
+    of two, starting from `resolution` seconds.
+    """
+
+    def __init__(self, resolution=1e-6):
+        self.resolution = resolution
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        if latency > self.resolution:
+            bucket = int(_math.ceil(_math.log2(latency / self.resolution)))
+        else:
+            bucket = 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def upper_bound(self, bucket):
+        return self.resolution * 2 ** bucket
+
+    def percentile(self, q):
+        """
+        Returns the upper bound of the bucket
+        containing the `q` percentile.
+        """
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    def as_dict(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else None,
+                'max': self.max,
+                'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99),
+                'buckets': {self.upper_bound(b): n for b, n in sorted(self.buckets.items())}}
+
+
+class Tracer(object):
+    """
+    This class traces one packet out of `sample` sent by the sources of a
+    graph and records a :class:`LatencyHistogram` of the end-to-end latency of every
+    path, from the source to each port reached, and the `keep` slowest traces.
+    """
+
+    def __init__(self, sample=1, keep=10):
+        if sample < 1:
+            raise ValueError('sample must be at least 1, not {}'.format(sample))
+        self.sample = sample
+        self.keep = keep
+        self.histograms = {}
+        self._slowest = []
+        self._ids = _itertools.count()
+        self._origins = 0
+
+    def attach(self, graph):
+        """
+        Makes the ports of the components of `graph` report to this tracer.
+        """
+        # Imported here to avoid a circular import
+        from pyperator.process import iter_owned
+        for node in iter_owned(graph):
+            for register in (node.inputs, node.outputs):
+                for port_name, port in register.items():
+                    if port.component is node:
+                        port.tracer = self
+
+    @staticmethod
+    def _label(port):
+        return '{}.{}'.format(port.component, port.name)
+
+    def start(self, now):
+        """
+        Returns a new :class:`TraceContext` for
+        one origin out of `sample`, else None.
+        """
+        self._origins += 1
+        if (self._origins - 1) % self.sample:
+            return None
+        return TraceContext(next(self._ids), now)
+
+    @staticmethod
+    def _received(component):
+        """
+        Returns the contexts of the packets received by `component`, by the
+        context they were sent with. Received packets are not modified:
+        with a fan-out, all the receivers get the same packet.
+        """
+        received = component.__dict__.get('_trace_received')
+        if received is None:
+            received = component._trace_received = _weakref.WeakKeyDictionary()
+        return received
+
+    def on_send(self, port, packet):
+        """
+        Called by `port` before sending `packet`. A traced packet continues its
+        own trace, even if the component buffered or reordered it; a new packet
+        continues the trace of the last packet received by the component.
+        """
+        if isinstance(packet, MarkerPacket):
+            return
+        now = _time.perf_counter()
+        context = packet._trace
+        if context is None:
+            context = getattr(port.component, '_trace_context', _SOURCE)
+            if context is _SOURCE:
+                context = self.start(now)
+        else:
+            # Include the hop the component received the packet through
+            context = self._received(port.component).get(context, context)
+        if context is not None:
+            packet._trace = context.sent(self._label(port), now)
+
+    def on_receive(self, port, packet):
+        """
+        Called by `port` after receiving `packet`.
+        """
+        if isinstance(packet, MarkerPacket):
+            return
+        context = packet._trace
+        if context is None or context.sent_from is None:
+            port.component._trace_context = None
+            return
+        received = context.received(self._label(port), _time.perf_counter())
+        self._received(port.component)[context] = received
+        port.component._trace_context = received
+        self.record(received)
+
+    def record(self, context):
+        path = context.path
+        latency = context.latency
+        histogram = self.histograms.get(path)
+        if histogram is None:
+            histogram = self.histograms[path] = LatencyHistogram()
+        histogram.add(latency)
+        entry = (latency, context.trace_id, context)
+        if len(self._slowest) < self.keep:
+            _heapq.heappush(self._slowest, entry)
+        elif latency > self._slowest[0][0]:
+            _heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """
+        Returns the slowest traces, slowest first.
+        """
+        return [context for latency, trace_id, context in sorted(self._slowest, reverse=True)]
+
+    def critical_path(self):
+        """
+        Returns the hops of the slowest trace, each
+        with the time the packet waited in the connection and
+        the time the sending component spent on it before sending.
+
+        :return: list of dict, empty if nothing was traced
+        """
+        slowest = self.slowest()
+        if not slowest:
+            return []
+        context = slowest[0]
+        report = []
+        previous = context.origin
+        for hop in context.hops:
+            report.append({'source': hop.source, 'destination': hop.destination,
+                           'processing': hop.enqueued - previous, 'waiting': hop.waiting})
+            previous = hop.dequeued
+        return report
+
+    def report(self):
+        """
+        Returns the latency histograms of all paths and the critical path.
+        """
+        return {'paths': [dict(path=list(path), **histogram.as_dict())
+                          for path, histogram in sorted(self.histograms.items())],
+                'critical_path': self.critical_path()}
@@ -1,12 +1,21 @@
 import asyncio
+import collections as _coll
 import logging
+import mmap as _mmap
+import os as _os
+import pickle as _pickle
 import re as _re
+import struct as _struct
+import tempfile as _tempfile
+import time as _time
 from collections import OrderedDict as _od
 from collections import namedtuple as nt
 import abc as _abc
 
 
 import pyperator.exceptions
+import pyperator.logging as _log
+from pyperator.metrics import payload_size
 from pyperator.IP import InformationPacket, EndOfStream
 from pyperator.exceptions import PortNotExistingError, PortDisconnectedError, OutputOnlyError, InputOnlyError, \
     PortClosedError, PortAlreadyConnectedError, PortAlreadyExistingError
@@ -77,6 +86,16 @@ class Default(dict):
 
 
 class ConnectionInterface(metaclass=_abc.ABCMeta):
+    # Counters read by :mod:`pyperator.metrics`:
+    # packets sent through the connection, excluding the end of stream
+    packets = 0
+    # maximum number of packets waiting in the connection
+    high_water = 0
+    # time the sender spent waiting for room in the connection
+    blocked = 0.0
+    # payload bytes of one packet out of 16
+    sampled = 0
+    sampled_bytes = 0
 
     @_abc.abstractmethod
     def receive(self):
@@ -86,6 +105,52 @@ class ConnectionInterface(metaclass=_abc.ABCMeta):
     def send(self, packet):
         pass
 
+    def full(self):
+        return False
+
+    def depth(self):
+        """
+        Returns the number of packets waiting in the connection
+        """
+        return 0
+
+    def capacity(self):
+        """
+        Returns the maximum number of packets waiting
+        in the connection, None if unlimited
+        """
+        return None
+
+    def count(self, packet):
+        """
+        Counts a packet sent through the connection.
+        """
+        if not packet.is_eos:
+            self.packets += 1
+            if self.packets & 15 == 1:
+                self.sampled += 1
+                self.sampled_bytes += payload_size(packet.value)
+
+    def payload_bytes(self):
+        """
+        Returns an estimate of the payload bytes
+        sent through the connection.
+        """
+        if self.sampled:
+            return int(self.sampled_bytes * self.packets / self.sampled)
+        return 0
+
+    async def join(self):
+        pass
+
+    def release(self):
+        """
+        Frees the resources held by the connection (pipes,
+        shared memory, spill files) after the graph has run,
+        including when it failed or was cancelled.
+        """
+        pass
+
 class Connection(ConnectionInterface):
     """
     This class represent a limited capacity
@@ -102,13 +167,323 @@ class Connection(ConnectionInterface):
             self.queue.task_done()
             return packet
 
+    def receive_nowait(self):
+        packet = self.queue.get_nowait()
+        self.queue.task_done()
+        return packet
+
+    def full(self):
+        return self.queue.full()
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def capacity(self):
+        return self.queue.maxsize
+
+    async def join(self):
+        await self.queue.join()
+
     async def send(self, packet):
         if self.destination:
             if self.destination.open:
-                await self.queue.put(packet)
+                if self.queue.full():
+                    start = _time.perf_counter()
+                    await self.queue.put(packet)
+                    self.blocked += _time.perf_counter() - start
+                else:
+                    self.queue.put_nowait(packet)
+                self.destination.inbox.notify(self)
+                self.count(packet)
+                if self.queue.qsize() > self.high_water:
+                    self.high_water = self.queue.qsize()
             else:
                 raise PortClosedError()
 
+    async def send_many(self, packets):
+        """
+        Puts a batch of packets in the connection,
+        only suspending the sender when the capacity
+        of the connection is reached.
+        """
+        if self.destination:
+            if self.destination.open:
+                for packet in packets:
+                    if self.queue.full():
+                        start = _time.perf_counter()
+                        await self.queue.put(packet)
+                        self.blocked += _time.perf_counter() - start
+                    else:
+                        self.queue.put_nowait(packet)
+                    self.destination.inbox.notify(self)
+                    self.count(packet)
+                if self.queue.qsize() > self.high_water:
+                    self.high_water = self.queue.qsize()
+            else:
+                raise PortClosedError()
+
+class DropNewestConnection(Connection):
+    """
+    A connection that never blocks the sender: when
+    it is full, the packet being sent is dropped.
+    The end of stream is never dropped.
+    """
+    def __init__(self, size=100):
+        super(DropNewestConnection, self).__init__(size=size)
+        self.dropped = 0
+
+    async def send(self, packet):
+        if self.destination:
+            if self.destination.open:
+                if self.queue.full() and not packet.is_eos:
+                    self.dropped += 1
+                    packet.drop()
+                else:
+                    await super(DropNewestConnection, self).send(packet)
+            else:
+                raise PortClosedError(self.destination)
+
+    async def send_many(self, packets):
+        for packet in packets:
+            await self.send(packet)
+
+
+class DropOldestConnection(DropNewestConnection):
+    """
+    A connection that never blocks the sender: when it is full,
+    the oldest packet waiting in it is dropped to make room
+    for the packet being sent, so that the receiver always gets the most recent
+    packets. The end of stream is never dropped.
+    """
+
+    async def send(self, packet):
+        if self.destination:
+            if self.destination.open:
+                if self.queue.full():
+                    oldest = self.queue.get_nowait()
+                    self.queue.task_done()
+                    self.dropped += 1
+                    oldest.drop()
+                    # The announcement of the dropped packet in
+                    # the inbox is used to receive this one
+                    self.queue.put_nowait(packet)
+                    self.count(packet)
+                else:
+                    await super(DropOldestConnection, self).send(packet)
+            else:
+                raise PortClosedError(self.destination)
+
+
+class _Segment(object):
+    """
+    A file of fixed size mapped in memory, where pickled
+    packets are appended as length-prefixed records.
+    """
+    _LENGTH = _struct.Struct('<Q')
+
+    def __init__(self, workdir, size):
+        fd, self.path = _tempfile.mkstemp(prefix='.pyperator_spill_', suffix='.seg', dir=workdir)
+        try:
+            _os.ftruncate(fd, size)
+            self.map = _mmap.mmap(fd, size)
+        finally:
+            _os.close(fd)
+        self.write_position = 0
+        self.read_position = 0
+
+    def fits(self, data):
+        return self.write_position + self._LENGTH.size + len(data) <= len(self.map)
+
+    def append(self, data):
+        self._LENGTH.pack_into(self.map, self.write_position, len(data))
+        start = self.write_position + self._LENGTH.size
+        self.map[start:start + len(data)] = data
+        self.write_position = start + len(data)
+
+    def pop(self):
+        length, = self._LENGTH.unpack_from(self.map, self.read_position)
+        start = self.read_position + self._LENGTH.size
+        self.read_position = start + length
+        return self.map[start:start + length]
+
+    @property
+    def exhausted(self):
+        return self.read_position == self.write_position
+
+    def remove(self):
+        self.map.close()
+        _os.remove(self.path)
+
+
+class SpillConnection(Connection):
+    """
+    A connection that never blocks the sender: the first `size` packets
+    are kept in memory, further packets are pickled and appended
+    to memory mapped segment files of `segment_size` bytes in the workdir
+    of the graph. Spilled packets are read back in order as the
+    receiver makes room in memory and the segments are deleted once they
+    have been read. Use it to let a fast producer finish while a slow consumer
+    drains its output, without keeping the whole stream in memory.
+    The owner of the spilled packets is not preserved.
+    """
+
+    def __init__(self, size=100, segment_size=16 * 1024 ** 2):
+        super(SpillConnection, self).__init__(size=size)
+        self.segment_size = segment_size
+        self._segments = _coll.deque()
+        self.spilled = 0
+
+    @property
+    def workdir(self):
+        dag = getattr(self.source.component, 'dag', None) if self.source else None
+        return getattr(dag, 'workdir', None) or '.'
+
+    def _spill(self, packet):
+        data = _pickle.dumps(packet, protocol=_pickle.HIGHEST_PROTOCOL)
+        if not self._segments or not self._segments[-1].fits(data):
+            size = max(self.segment_size, len(data) + _Segment._LENGTH.size)
+            self._segments.append(_Segment(self.workdir, size))
+        self._segments[-1].append(data)
+        self.spilled += 1
+
+    def _unspill(self):
+        segment = self._segments[0]
+        packet = _pickle.loads(segment.pop())
+        if segment.exhausted and (len(self._segments) > 1 or not segment.fits(b'')):
+            self._segments.popleft().remove()
+        self.spilled -= 1
+        return packet
+
+    def full(self):
+        return False
+
+    def depth(self):
+        return self.queue.qsize() + self.spilled
+
+    async def send(self, packet):
+        if self.destination:
+            if self.destination.open:
+                # Once packets are on disk, keep
+                # spilling to preserve the order
+                if self.spilled or self.queue.full():
+                    self._spill(packet)
+                else:
+                    self.queue.put_nowait(packet)
+                self.destination.inbox.notify(self)
+                self.count(packet)
+                if self.depth() > self.high_water:
+                    self.high_water = self.depth()
+            else:
+                raise PortClosedError(self.destination)
+
+    async def send_many(self, packets):
+        for packet in packets:
+            await self.send(packet)
+
+    async def receive(self):
+        packet = await self.queue.get()
+        self._refill()
+        self.queue.task_done()
+        return packet
+
+    def receive_nowait(self):
+        if self.queue.empty() and self.spilled:
+            return self._unspill()
+        packet = self.queue.get_nowait()
+        # Refill before marking the packet as done so
+        # that the queue cannot be joined while packets are on disk
+        self._refill()
+        self.queue.task_done()
+        return packet
+
+    def _refill(self):
+        while self.spilled and not self.queue.full():
+            self.queue.put_nowait(self._unspill())
+
+    async def join(self):
+        # The queue is only joined once the spilled packets
+        # have been read back, see :meth:`receive_nowait`
+        await self.queue.join()
+        self.release()
+
+    def release(self):
+        while self._segments:
+            self._segments.popleft().remove()
+
+
+def _update_index(port1, port2, method):
+    # Updates the arcs of the innermost graph containing both
+    # components, see :meth:`pyperator.DAG.Multigraph._index_arc`
+    graph = getattr(port1.component, 'dag', None)
+    while graph is not None:
+        update = getattr(graph, method, None)
+        if update is not None and update(port1, port2):
+            return
+        graph = getattr(getattr(graph, 'subnet', None) or graph, 'dag', None)
+
+
+#: Connection classes implementing the overflow policies that can
+#: be selected when connecting two ports, see :meth:`Port.connect`
+overflow_policies = {'block': Connection,
+                     'drop_newest': DropNewestConnection,
+                     'drop_oldest': DropOldestConnection,
+                     'spill': SpillConnection}
+
+
+class Inbox(object):
+    """
+    This class merges all the :class:`pyperator.utils.Connection`
+    ending in the same port. Every packet put in a connection
+    is announced exactly once to the inbox of the destination, so
+    that the port can pick up packets in order of arrival
+    with a single wait, independently of the number of
+    upstream connections. Because the packet is only
+    removed from the connection after the announcement
+    has been received, no packet can be lost.
+    """
+
+    def __init__(self):
+        self._ready = asyncio.Queue()
+        # Time spent waiting for packets
+        self.blocked = 0.0
+
+    def notify(self, conn):
+        self._ready.put_nowait(conn)
+
+    async def get(self):
+        if self._ready.empty():
+            start = _time.perf_counter()
+            conn = await self._ready.get()
+            self.blocked += _time.perf_counter() - start
+        else:
+            conn = self._ready.get_nowait()
+        return conn.receive_nowait()
+
+    def get_nowait(self):
+        conn = self._ready.get_nowait()
+        return conn.receive_nowait()
+
+    def withdraw(self, conn):
+        """
+        Removes the announcements of the packets waiting
+        in `conn` and returns their number.
+        """
+        kept = []
+        withdrawn = 0
+        while not self._ready.empty():
+            announced = self._ready.get_nowait()
+            if announced is conn:
+                withdrawn += 1
+            else:
+                kept.append(announced)
+        for announced in kept:
+            self._ready.put_nowait(announced)
+        return withdrawn
+
+    def empty(self):
+        return self._ready.empty()
+
+
 class IIPConnection(ConnectionInterface):
 
     def __init__(self, value):
@@ -121,6 +496,30 @@ class IIPConnection(ConnectionInterface):
         raise NotImplementedError
 
 
+class EndOfStreamConnection(ConnectionInterface):
+    """
+    This connection delivers a single end of stream to `destination`, it is used
+    to stop a component removed from a running graph. `on_end` is
+    called when the end of stream is received.
+    """
+
+    def __init__(self, destination, on_end=None):
+        self.source = None
+        self.destination = destination
+        self.on_end = on_end
+
+    async def receive(self):
+        return self.receive_nowait()
+
+    def receive_nowait(self):
+        if self.on_end is not None:
+            on_end, self.on_end = self.on_end, None
+            on_end()
+        return EndOfStream()
+
+    async def send(self, packet):
+        raise NotImplementedError
+
 
 class PortInterface(metaclass=_abc.ABCMeta):
     """
@@ -155,7 +554,8 @@ class Port(PortInterface):
     If several ports are connected to this
     port simultaneously, they will all send packets to it in a unordered manner and the port
     will not be able to distinguish from which component the packets are 
-    being sent (see `noflo`_ ).
+    being sent (see `noflo`_ ). Packets are delivered in order of arrival
+    through the :class:`pyperator.utils.Inbox` of the port.
     
     For output ports, if several port are connected to the same source, the packets will be replicated
     to all sinks.
@@ -167,8 +567,12 @@ class Port(PortInterface):
         self.name = name
         self.component = component
         self.connections = []
+        self.inbox = Inbox()
         self.open = True
         self._iip = None
+        # Set to a :class:`pyperator.tracing.Tracer`
+        # when the graph traces packets
+        self.tracer = None
         #if set to true, the port must be connected
         #before the component can be used
         self.optional=optional
@@ -177,7 +581,7 @@ class Port(PortInterface):
     @property
     def log(self):
         if self.component:
-            return self.component.log.getChild(self.name)
+            return _log.get_child(self.component.log, self.name)
 
 
     def set_initial_packet(self, value):
@@ -185,11 +589,29 @@ class Port(PortInterface):
         conn = IIPConnection(packet)
         conn.destination = self
         self.connections.append(conn)
-        self._iip = True
+        self._iip = conn
+        # The graph has to be validated again
+        changed = getattr(getattr(self.component, 'dag', None), '_changed', None)
+        if changed is not None:
+            changed()
+
+    def replicate(self):
+        """
+        Returns an unconnected port of the same type and
+        with the same name, carrying the same initial packet.
+
+        :return: :class:`pyperator.utils.Port`
+        """
+        port = type(self)(self.name, optional=self.optional)
+        if self._iip:
+            port.set_initial_packet(self._iip.value.value)
+        return port
 
     def kickstart(self):
         packet = InformationPacket(None)
-        self.queue.put_nowait(packet)
+        conn = self.connections[0]
+        conn.queue.put_nowait(packet)
+        self.inbox.notify(conn)
         self.log.debug('Kickstarting port {}'.format(self.component, self.name))
 
     async def receive(self):
@@ -211,9 +633,15 @@ class Port(PortInterface):
         to connect two ports as
         :code:`a >> b`, equivalent to :code:`a.connect(b)`
 
+        The capacity and the overflow policy of the connection can be given
+        as :code:`a >> (b, size)` or :code:`a >> (b, size, overflow)`.
+
         :param other: :class:`pyperator.utils.port`
         :return: None
         """
+        if isinstance(other, tuple) and other and isinstance(other[0], Port):
+            self.connect(*other)
+            return
         try:
             self.connect(other)
         except:
@@ -241,26 +669,86 @@ class Port(PortInterface):
     def is_connected(self):
         return len(self.connections)>0
 
-    def connect(self, other_port, size=100):
-        new_conn = Connection(size=size)
+    def connect(self, other_port, size=None, overflow=None):
+        """
+        Connects this port to `other_port`.
+
+        :param other_port: :class:`pyperator.utils.Port`
+        :param size: capacity of the connection, 0 for an unbounded one, by default
+            the `capacity` of the graph of the component or 100
+        :param overflow: what happens when the connection is full, one of the keys of
+            :data:`overflow_policies`: 'block' the sender (the default), 'drop_newest'
+            or 'drop_oldest' packet, or 'spill' to disk. By default the `overflow` of the graph of the component
+        """
+        dag = getattr(self.component, 'dag', None)
+        if size is None:
+            size = getattr(dag, 'capacity', 100)
+        overflow = overflow or getattr(dag, 'overflow', 'block')
+        try:
+            connection_type = overflow_policies[overflow]
+        except KeyError:
+            raise ValueError('Unknown overflow policy {}, use one of {}'.format(overflow, list(overflow_policies)))
+        new_conn = connection_type(size=size)
         new_conn.source = self
         new_conn.destination = other_port
         self.connections.append(new_conn)
         other_port.connections.append(new_conn)
+        _update_index(self, other_port, '_index_arc')
+
+    def disconnect(self, other_port):
+        """
+        Removes the connections from this port to `other_port`. The packets
+        already sent through them can still be received by `other_port`
+        as long as it has other connections.
+
+        :param other_port: :class:`pyperator.utils.Port`
+        :return: list of the removed connections
+        """
+        removed = [conn for conn in self.connections if conn.destination is other_port]
+        # New lists, a sender may be iterating the old one
+        self.connections = [conn for conn in self.connections if conn not in removed]
+        other_port.connections = [conn for conn in other_port.connections if conn not in removed]
+        if removed:
+            _update_index(self, other_port, '_unindex_arc')
+        return removed
+
+    def reconnect(self, other_port, new_port):
+        """
+        Moves the connections from this port to `other_port` so that they
+        end in `new_port` instead, together with the packets buffered in them
+        and not yet received by `other_port`. This does not suspend, so
+        that no packet can be sent or received during the move.
+
+        :param other_port: :class:`pyperator.utils.Port`
+        :param new_port: :class:`pyperator.utils.Port`
+        :return: list of the moved connections
+        """
+        moved = [conn for conn in self.connections if conn.destination is other_port]
+        for conn in moved:
+            buffered = other_port.inbox.withdraw(conn)
+            other_port.connections = [other for other in other_port.connections if other is not conn]
+            conn.destination = new_port
+            new_port.connections = new_port.connections + [conn]
+            for i in range(buffered):
+                new_port.inbox.notify(conn)
+        if moved:
+            _update_index(self, other_port, '_unindex_arc')
+            _update_index(self, new_port, '_index_arc')
+        return moved
 
     async def send_packet(self, packet):
         if self.is_connected and not self.optional:
             if packet.owner == self.component or packet.owner == None:
+                if _log.trace_packets and self.log.isEnabledFor(logging.DEBUG):
+                    self.log.debug("Sending %s from port %s", packet, self.name)
+                if self.tracer is not None:
+                    self.tracer.on_send(self, packet)
                 for conn in self.connections:
-                    self.log.debug(
-                        "Sending {} from port {}".format(str(packet), self.name))
-                    if conn.queue.full():
-                        self.log.error('Component {}: the queue between {} and {}'.format(self.component.name, conn.source.name, conn.destination.name))
                     await conn.send(packet)
             else:
                 error_message = "Packet {} is not owned by this component, copy it first".format(str(packet), self.name)
                 e = pyperator.exceptions.PacketOwnedError(error_message)
-                self.log.ex(e)
+                self.log.error(e)
                 raise e
         else:
             if not self.optional:
@@ -276,18 +764,49 @@ class Port(PortInterface):
         packet = InformationPacket(data, owner=self.component)
         await self.send_packet(packet)
 
+    async def send_many(self, packets):
+        """
+        Sends a batch of packets to all connections at once.
+        The ownership of the packets is checked
+        as in :meth:`send_packet`.
+
+        :param packets: list of :class:`pyperator.IP.InformationPacket`
+        """
+        if self.is_connected and not self.optional:
+            for packet in packets:
+                if not (packet.owner == self.component or packet.owner == None):
+                    error_message = "Packet {} is not owned by the component of port {}, copy it first".format(str(packet), self.name)
+                    e = pyperator.exceptions.PacketOwnedError(error_message)
+                    self.log.error(e)
+                    raise e
+            if _log.trace_packets:
+                self.log.debug("Sending %d packets from port %s", len(packets), self.name)
+            if self.tracer is not None:
+                for packet in packets:
+                    self.tracer.on_send(self, packet)
+            for conn in self.connections:
+                await conn.send_many(packets)
+        else:
+            for packet in packets:
+                await self.send_packet(packet)
+
     async def receive_packet(self):
-        if self.is_connected:
+        # A closed port may have been disconnected after the end of stream
+        if self.is_connected or not self.open:
             if self.open:
-                self.log.debug("Receiving at {}".format(self.name))
-                #First come first serve receiving
-                done, pending = await asyncio.wait([conn.receive() for conn in self.connections], return_when=asyncio.FIRST_COMPLETED)
-                #The first packet is taken
-                packet= done.pop().result()
-                #Cancel all other tasks
-                [task.cancel() for task in pending]
-                self.log.debug(
-                    "Received {} from {}".format(packet, self.name))
+                trace = _log.trace_packets and self.log.isEnabledFor(logging.DEBUG)
+                if trace:
+                    self.log.debug("Receiving at %s", self.name)
+                if self._iip:
+                    #Initial packets are always available
+                    packet = await self._iip.receive()
+                else:
+                    #First come first serve receiving
+                    packet = await self.inbox.get()
+                    if self.tracer is not None:
+                        self.tracer.on_receive(self, packet)
+                if trace:
+                    self.log.debug("Received %s from %s", packet, self.name)
                 # if self._iip:
                 #     await self.close()
                 if packet.is_eos:
@@ -304,6 +823,53 @@ class Port(PortInterface):
             self.log.error(e)
             raise e
 
+    async def receive_many(self, max_n=None, timeout=None):
+        """
+        Receives a batch of packets. The port waits up to
+        `timeout` seconds for the first packet and then returns it together
+        with all the packets that are already available, up to `max_n`.
+        When the end of stream is received, the packets preceding it
+        are returned and the port is closed; if there are none,
+        :class:`StopAsyncIteration` is raised.
+
+        :param max_n: maximum number of packets to return, unlimited if None
+        :param timeout: time to wait for the first packet, unlimited if None
+        :return: list of :class:`pyperator.IP.InformationPacket`, empty on timeout
+        """
+        if self.is_connected or not self.open:
+            if self.open:
+                if self._iip:
+                    return [await self._iip.receive()]
+                try:
+                    first = await asyncio.wait_for(self.inbox.get(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+                packets = []
+                packet = first
+                while True:
+                    if packet.is_eos:
+                        await self.close()
+                        if packets:
+                            break
+                        stop_message = "Stopping because {} was received".format(packet)
+                        self.log.info(stop_message)
+                        raise StopAsyncIteration(stop_message)
+                    if self.tracer is not None:
+                        self.tracer.on_receive(self, packet)
+                    packets.append(packet)
+                    if (max_n and len(packets) >= max_n) or self.inbox.empty():
+                        break
+                    packet = self.inbox.get_nowait()
+                if _log.trace_packets:
+                    self.log.debug("Received %d packets from %s", len(packets), self.name)
+                return packets
+            else:
+                raise StopAsyncIteration("stopp")
+        else:
+            e = PortDisconnectedError(self, 'disc')
+            self.log.error(e)
+            raise e
+
     def __aiter__(self):
         return self
 
@@ -355,10 +921,8 @@ class OutputPort(Port):
         raise OutputOnlyError(self)
 
     async def close(self):
-        packet = EndOfStream()
-        packet.owner = self.component
-        await self.send_packet(packet)
-        await asyncio.wait([conn.queue.join() for conn in self.connections], return_when=asyncio.ALL_COMPLETED)
+        await self.send_packet(EndOfStream())
+        await asyncio.gather(*[conn.join() for conn in self.connections])
         self.open = False
         self.log.debug("Closing {}".format(self.name))
 
@@ -428,7 +992,7 @@ class PortRegister:
         yield from self.ports.items()
 
     def values(self):
-        return set(self.ports.values())
+        return self.ports.values()
 
     def keys(self):
         return self.ports.keys()
@@ -466,6 +1030,27 @@ class PortRegister:
         except StopAsyncIteration as e:
             raise StopAsyncIteration
 
+    async def receive_many(self, max_n=None, timeout=None):
+        """
+        Receives a batch of packets from every open port,
+        see :meth:`pyperator.utils.Port.receive_many`.
+
+        :return: dict of {port_name: list of packets}
+        """
+        futures = {}
+        for p in self.values():
+            if p.open:
+                futures[p.name] = asyncio.ensure_future(p.receive_many(max_n=max_n, timeout=timeout))
+        try:
+            batches = await asyncio.gather(*futures.values())
+        except BaseException:
+            # The other ports must not take packets that nobody will get
+            for future in futures.values():
+                future.cancel()
+            await asyncio.gather(*futures.values(), return_exceptions=True)
+            raise
+        return dict(zip(futures, batches))
+
     def send_packets(self, packets):
         futures = []
         for p in self.values():
@@ -473,6 +1058,19 @@ class PortRegister:
             futures.append(asyncio.ensure_future(p.send_packet(packet)))
         return futures
 
+    def send_many(self, packets):
+        """
+        Sends a batch of packets to each port,
+        see :meth:`pyperator.utils.Port.send_many`.
+
+        :param packets: dict of {port_name: list of packets}
+        :return: list of futures
+        """
+        futures = []
+        for p in self.values():
+            futures.append(asyncio.ensure_future(p.send_many(packets.get(p.name, []))))
+        return futures
+
     def all_closed(self):
         return all([not p.open for p in self.values()])
 